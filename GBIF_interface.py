@@ -22,6 +22,9 @@ import urllib.parse
 import util 
 import global_settings as gs
 from models import taxon
+from request_handler import RequestHandler, RetryPolicy
+from request_metrics import RequestMetrics
+from cassette import getCassette
 
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
@@ -36,6 +39,9 @@ class GBIFInterface():
     """
     # Create a session for storing cookies 
     self.spSession = requests.Session() 
+    self.metrics = RequestMetrics()
+    self.requestHandler = RequestHandler(self.spSession, RetryPolicy(**gs.settings.get('retry', {})), self.metrics, 
+                                         getCassette(gs.settings.get('cassette')))
     self.baseURL = 'https://api.gbif.org/v1/'
 
   def fetchObject(self, object_name, id):
@@ -43,7 +49,7 @@ class GBIFInterface():
     ...
     """
     # fetch API object 
-    response = self.spSession.get(self.baseURL + f'{object_name}/{id}/', verify=False)
+    response = self.requestHandler.request('GET', self.baseURL + f'{object_name}/{id}/', verify=False)
 
     # If succesful, load into json object 
     if response.status_code < 299:
@@ -84,7 +90,7 @@ class GBIFInterface():
     urlString = self.baseURL + f'{object_name}/?kingdom={kingdom}&name={name}&limit=999'
     util.logger.debug(urlString)
     try:
-      response = self.spSession.get(urlString)    
+      response = self.requestHandler.request('GET', urlString)    
       # If succesful, load response into json object 
       if response.status_code < 299:
         response_text = json.loads(response.text)
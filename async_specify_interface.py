@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+  Created on October 16, 2026
+  @author: Fedor Alexander Steeman, NHMD
+  Copyright 2026 Natural History Museum of Denmark (NHMD)
+  Licensed under the Apache License, Version 2.0 (the "License");
+  you may not use this file except in compliance with the License.
+  You may obtain a copy of the License at
+  http://www.apache.org/licenses/LICENSE-2.0
+  Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the specific language governing permissions and limitations under the License.
+
+  PURPOSE: Asynchronous interface to the Specify API with a bounded number of requests in flight
+"""
+
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+# Internal Dependencies
+import specify_interface
+
+class AsyncSpecifyInterface():
+  """
+  The asynchronous Specify Interface offers the same methods as SpecifyInterface as coroutines,
+  so that tools can overlap the network latency of many API calls, e.g. by using asyncio.gather.
+  The calls are delegated to the wrapped SpecifyInterface instance, thereby sharing its session cookies and CSRF token.
+  At most 'maxConcurrency' requests are in flight at any time; further calls wait for a free slot.
+
+  Example usage:
+
+    asp = AsyncSpecifyInterface(sp, maxConcurrency=8)
+    taxa = asp.run(asp.gather(*[asp.getSpecifyObject('taxon', id) for id in ids]))
+  """
+
+  def __init__(self, specifyInterface=None, maxConcurrency=8) -> None:
+    """
+    CONSTRUCTOR
+    CONTRACT
+      specifyInterface (SpecifyInterface) : Logged in Specify interface to share session with. A new one is created if omitted.
+      maxConcurrency   (Integer)          : Maximum number of requests in flight at the same time
+    """
+    self.sp = specifyInterface if specifyInterface else specify_interface.SpecifyInterface()
+    self.maxConcurrency = maxConcurrency
+    self.sp.setPoolSize(maxConcurrency)
+    self.executor = ThreadPoolExecutor(max_workers=maxConcurrency, thread_name_prefix='sp7api')
+    self.semaphore = None
+    self.loop = None
+
+  @property
+  def csrfToken(self):
+    return self.sp.csrfToken
+
+  async def call(self, method, *args, **kwargs):
+    """
+    Run a blocking SpecifyInterface method in the worker pool once a slot is available
+    CONTRACT
+      method (function) : Bound method of the wrapped SpecifyInterface instance
+      RETURNS the result of the method
+    """
+    loop = asyncio.get_running_loop()
+    if self.loop is not loop:
+      # Semaphores are bound to the event loop they are used in
+      self.loop = loop
+      self.semaphore = asyncio.Semaphore(self.maxConcurrency)
+
+    async with self.semaphore:
+      return await loop.run_in_executor(self.executor, functools.partial(method, *args, **kwargs))
+
+  async def getSpecifyObjects(self, objectName, limit=100, offset=0, filters={}, sort='') -> dict:
+    """
+    Asynchronous version of SpecifyInterface.getSpecifyObjects
+    """
+    return await self.call(self.sp.getSpecifyObjects, objectName, limit, offset, filters, sort)
+
+  async def getSpecifyObject(self, objectName, objectId):
+    """
+    Asynchronous version of SpecifyInterface.getSpecifyObject
+    """
+    return await self.call(self.sp.getSpecifyObject, objectName, objectId)
+
+  async def putSpecifyObject(self, objectName, objectId, specifyObject):
+    """
+    Asynchronous version of SpecifyInterface.putSpecifyObject
+    """
+    return await self.call(self.sp.putSpecifyObject, objectName, objectId, specifyObject)
+
+  async def postSpecifyObject(self, objectName, specifyObject):
+    """
+    Asynchronous version of SpecifyInterface.postSpecifyObject
+    """
+    return await self.call(self.sp.postSpecifyObject, objectName, specifyObject)
+
+  async def deleteSpecifyObject(self, objectName, objectId):
+    """
+    Asynchronous version of SpecifyInterface.deleteSpecifyObject
+    """
+    return await self.call(self.sp.deleteSpecifyObject, objectName, objectId)
+
+  async def mergeTreeNodes(self, tree_name, source_id, target_id):
+    """
+    Asynchronous version of SpecifyInterface.mergeTreeNodes
+    """
+    return await self.call(self.sp.mergeTreeNodes, tree_name, source_id, target_id)
+
+  async def moveTreeNode(self, tree_name, source_id, target_id):
+    """
+    Asynchronous version of SpecifyInterface.moveTreeNode
+    """
+    return await self.call(self.sp.moveTreeNode, tree_name, source_id, target_id)
+
+  async def gather(self, *coroutines, return_exceptions=False):
+    """
+    Await several calls concurrently and return their results in the order given
+    """
+    return await asyncio.gather(*coroutines, return_exceptions=return_exceptions)
+
+  def run(self, coroutine):
+    """
+    Convenience method for running a coroutine to completion from synchronous code, e.g. tools
+    """
+    return asyncio.run(coroutine)
+
+  def close(self):
+    """
+    Shut down the worker pool
+    """
+    self.executor.shutdown(wait=True)
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""
+  Created on October 16, 2026
+  @author: Fedor Alexander Steeman, NHMD
+  Copyright 2026 Natural History Museum of Denmark (NHMD)
+  Licensed under the Apache License, Version 2.0 (the "License");
+  you may not use this file except in compliance with the License.
+  You may obtain a copy of the License at
+  http://www.apache.org/licenses/LICENSE-2.0
+  Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the specific language governing permissions and limitations under the License.
+
+  PURPOSE: Benchmark application startup, i.e. loading the tool kit and selecting a tool,
+           constructing every tool up front (eager) versus only the selected tool (lazy).
+
+  Run from the repository root: python benchmarks/benchmark_startup.py [latency in seconds] [tool number]
+"""
+
+import os
+import sys
+import time
+
+# Make the application modules importable when run from the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+os.chdir(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from benchmark_tools import startServer
+
+def benchmarkStartup(latency, choice, eager):
+    """
+    Benchmark loading the tool kit and getting the selected tool ready for use
+    CONTRACT
+        latency (float)  : Seconds of latency injected per request
+        choice (Integer) : Index of the tool selected in the tool kit
+        eager (bool)     : Whether all tools are constructed up front as before, or only the selected tool
+    """
+    server, cfg = startServer(latency)
+    try:
+        server.resetCounts()
+        start = time.time()
+        cfg.loadTools()
+        if eager:
+            for _, descriptor in cfg.toolKit:
+                descriptor.load(cfg.sp)
+        name, descriptor = cfg.toolKit[choice]
+        descriptor.load(cfg.sp)
+        elapsed = time.time() - start
+        calls = sum(server.requestCounts.values())
+        print(f"{'Eager' if eager else 'Lazy'} startup selecting '{name}': {elapsed:.2f}s, {calls} requests")
+        return elapsed
+    finally:
+        server.stop()
+
+
+# Benchmark execution entry point
+if __name__ == "__main__":
+    latency = float(sys.argv[1]) if len(sys.argv) > 1 else 0.05
+    choice = int(sys.argv[2]) - 1 if len(sys.argv) > 2 else 0
+
+    # Lazy first, so that its timing includes importing the selected tool module
+    lazy = benchmarkStartup(latency, choice, False)
+    eager = benchmarkStartup(latency, choice, True)
+    print(f"Startup time saved: {eager - lazy:.2f}s")
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+  Created on October 16, 2026
+  @author: Fedor Alexander Steeman, NHMD
+  Copyright 2026 Natural History Museum of Denmark (NHMD)
+  Licensed under the Apache License, Version 2.0 (the "License");
+  you may not use this file except in compliance with the License.
+  You may obtain a copy of the License at
+  http://www.apache.org/licenses/LICENSE-2.0
+  Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the specific language governing permissions and limitations under the License.
+
+  PURPOSE: Benchmark tool throughput against the local fake Specify7 server with injected latency.
+
+  Run from the repository root: python benchmarks/benchmark_tools.py [latency in seconds] [number of rows]
+"""
+
+import os
+import sys
+import time
+
+# Make the application modules importable when run from the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+import configuration
+import specify_fake_server
+import tools.mass_add_storage_nodes
+
+def startServer(latency):
+    """
+    Start fake Specify7 server with the given default latency and log in to it
+    CONTRACT
+        latency (float) : Seconds of latency injected per request
+        RETURNS tuple of the server and the configuration handler holding the Specify interface
+    """
+    server = specify_fake_server.FakeSpecifyServer(latency={'*': latency})
+    server.start()
+    cfg = configuration.ConfigurationHandler()
+    cfg.applyConfiguration({'mode': 'benchmark', 'domain': server.baseURL, 'collection': 'KUFishvoucher',
+                            'username': server.username, 'password': server.password})
+    return server, cfg
+
+def storageRows(count):
+    """
+    Generate storage rows of boxes spread over a few cabinets under the same building and room
+    """
+    headers = ['Building', 'Room', 'Cabinet', 'Box']
+    rows = [{'Building': 'Main Site', 'Room': 'General Collection', 'Cabinet': f'Cabinet {i % 5}', 'Box': f'Box {i}'}
+            for i in range(count)]
+    return headers, rows
+
+def report(name, server, elapsed, rows):
+    """
+    Print the outcome of a benchmark
+    """
+    calls = sum(server.requestCounts.values())
+    print(f"{name}: {rows} rows in {elapsed:.2f}s ({rows / elapsed:.1f} rows/s), {calls} requests")
+    for endpoint, count in sorted(server.requestCounts.items()):
+        print(f"  {endpoint:<8} {count}")
+
+def benchmarkMassAddStorageNodes(latency, count):
+    """
+    Benchmark MassAddStorageNodeTool processing generated rows
+    """
+    server, cfg = startServer(latency)
+    try:
+        tool = tools.mass_add_storage_nodes.MassAddStorageNodeTool(cfg.sp)
+        headers, rows = storageRows(count)
+        server.resetCounts()
+        start = time.time()
+        for row in rows:
+            tool.processRow(headers, row)
+        report('MassAddStorageNodeTool', server, time.time() - start, count)
+    finally:
+        server.stop()
+
+
+# Benchmark execution entry point
+if __name__ == "__main__":
+    latency = float(sys.argv[1]) if len(sys.argv) > 1 else 0.01
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+
+    benchmarkMassAddStorageNodes(latency, count)
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""
+  Created on October 16, 2026
+  @author: Fedor Alexander Steeman, NHMD
+  Copyright 2026 Natural History Museum of Denmark (NHMD)
+  Licensed under the Apache License, Version 2.0 (the "License");
+  you may not use this file except in compliance with the License.
+  You may obtain a copy of the License at
+  http://www.apache.org/licenses/LICENSE-2.0
+  Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the specific language governing permissions and limitations under the License.
+
+  PURPOSE: Record/replay of HTTP request/response pairs ("cassettes") for reproducible performance runs without network access
+"""
+
+import os
+import gzip
+import json
+import time
+import atexit
+import hashlib
+import threading
+import requests
+from requests.structures import CaseInsensitiveDict
+from requests.cookies import cookiejar_from_dict
+from collections import deque
+
+# Internal Dependencies
+import util
+
+class CassetteMiss(requests.RequestException):
+    """
+    Raised in replay mode for a request that was not recorded
+    """
+
+class Cassette():
+    """
+    A cassette holds the request/response pairs of a run as gzip compressed JSON lines.
+    In 'record' mode every request is sent and its response (or connection error) and latency is written to the cassette.
+    In 'replay' mode the responses are served from the cassette in recorded order without network access,
+    optionally waiting the recorded latencies. Requests are matched on method, URL and a hash of the request body.
+    When the same request was made several times, the responses are replayed in the order recorded
+    and the last one is repeated once they are used up.
+    NOTE Request bodies (containing passwords at login) are only stored as hash and cookie values are not stored at all.
+    """
+
+    def __init__(self, path, mode='replay', latency=False) -> None:
+        """
+        CONSTRUCTOR
+        CONTRACT
+            path (String)     : Path of the cassette file, e.g. 'cassettes/run.jsonl.gz'
+            mode (String)     : 'record' or 'replay'
+            latency (boolean) : Whether to wait the recorded latency before serving a replayed response
+        """
+        if mode not in ('record', 'replay'):
+            raise Exception(f"Invalid cassette mode: {mode}")
+        self.path = path
+        self.mode = mode
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.file = None
+
+        if mode == 'record':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self.file = gzip.open(path, 'wt', encoding='utf-8')
+            atexit.register(self.close)
+        else:
+            self.load()
+
+    def load(self):
+        """
+        Read the recorded entries into queues per request key
+        """
+        with gzip.open(self.path, 'rt', encoding='utf-8') as file:
+            for line in file:
+                entry = json.loads(line)
+                self.entries.setdefault((entry['method'], entry['url'], entry['body']), deque()).append(entry)
+        util.logger.info(f'Loaded {sum(len(queue) for queue in self.entries.values())} recorded responses from {self.path}')
+
+    def send(self, session, method, url, **kwargs):
+        """
+        Send a request through the session while recording it, or serve its recorded response
+        CONTRACT
+            session (requests.Session) : Session to send the request with (record mode)
+            method (String)            : HTTP method
+            url (String)               : URL of the request
+            kwargs                     : Further arguments of requests.Session.request
+            RETURNS response (requests.Response)
+            RAISES requests.ConnectionError if the recorded request failed without response, CassetteMiss if not recorded
+        """
+        body, size = requestBody(method, url, kwargs)
+        if self.mode == 'replay':
+            return self.replay(method, url, body)
+
+        start = time.perf_counter()
+        try:
+            response = session.request(method, url, **kwargs)
+        except requests.RequestException as e:
+            self.write({'method': method, 'url': url, 'body': body, 'size': size, 'latency': time.perf_counter() - start,
+                        'error': e.__class__.__name__})
+            raise
+        self.write({'method': method, 'url': url, 'body': body, 'size': size, 'latency': time.perf_counter() - start,
+                    'status': response.status_code, 'reason': response.reason,
+                    'contentType': response.headers.get('Content-Type', ''),
+                    'cookies': sorted(response.cookies.keys()), 'content': response.text})
+        return response
+
+    def replay(self, method, url, body):
+        """
+        Serve the next recorded response for the request
+        """
+        with self.lock:
+            queue = self.entries.get((method, url, body))
+            if not queue:
+                raise CassetteMiss(f'No recorded response for {method} {url}')
+            entry = queue.popleft() if len(queue) > 1 else queue[0]
+
+        if self.latency:
+            time.sleep(entry['latency'])
+
+        if 'error' in entry:
+            raise requests.ConnectionError(f"Recorded {entry['error']} for {method} {url}")
+
+        response = requests.Response()
+        response.status_code = entry['status']
+        response.reason = entry['reason']
+        response.url = url
+        response.encoding = 'utf-8'
+        response._content = entry['content'].encode('utf-8')
+        response.headers = CaseInsensitiveDict({'Content-Type': entry['contentType']} if entry['contentType'] else {})
+        response.cookies = cookiejar_from_dict({name: 'replayed' for name in entry['cookies']})
+        response.request = requests.Request(method, url).prepare()
+        response.request.headers['Content-Length'] = str(entry['size'])
+        return response
+
+    def write(self, entry):
+        with self.lock:
+            if self.file is not None:
+                self.file.write(json.dumps(entry, separators=(',', ':')) + '\n')
+
+    def close(self):
+        """
+        Finish writing the cassette file
+        """
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+def requestBody(method, url, kwargs):
+    """
+    Get the hash identifying the body of a request ('' if it has none) and the size of the body
+    """
+    request = requests.Request(method, url, data=kwargs.get('data'), json=kwargs.get('json')).prepare()
+    if not request.body:
+        return '', 0
+    body = request.body if isinstance(request.body, bytes) else request.body.encode('utf-8')
+    return hashlib.sha1(body).hexdigest(), len(body)
+
+cassettes = {}
+
+def getCassette(settings):
+    """
+    Get the cassette configured by the 'cassette' setting, shared by all API interfaces using the same file
+    CONTRACT
+        settings (dict) : Cassette settings with 'path', 'mode' ('record' or 'replay') and optionally 'latency' (boolean),
+                          or None if no cassette is used
+        RETURNS cassette (Cassette) or None
+    """
+    if not settings:
+        return None
+    path = settings['path']
+    if path not in cassettes:
+        cassettes[path] = Cassette(path, settings.get('mode', 'replay'), settings.get('latency', False))
+    return cassettes[path]
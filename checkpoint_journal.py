@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""
+  Created on October 16, 2026
+  @author: Fedor Alexander Steeman, NHMD
+  Copyright 2026 Natural History Museum of Denmark (NHMD)
+  Licensed under the Apache License, Version 2.0 (the "License");
+  you may not use this file except in compliance with the License.
+  You may obtain a copy of the License at
+  http://www.apache.org/licenses/LICENSE-2.0
+  Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the specific language governing permissions and limitations under the License.
+
+  PURPOSE: Append-only journal of the rows completed and objects created by a tool run, for resuming it after a crash
+"""
+
+import os
+import json
+import hashlib
+import datetime
+import threading
+from pathlib import Path
+
+# Internal Dependencies
+import util
+
+class CheckpointJournal():
+    """
+    Journal of a tool run on a data file, identified by the tool, the hash of the file's content and the Specify server
+    and collection written to, so that a changed file is never resumed with the journal of another version, nor a run
+    against one database (e.g. test) with the rows and objects of another (e.g. production). Every row completed and
+    every object created is appended as a JSON line. Lines are written to disk in batches (flushed and fsynced), so a
+    crash loses at most the last batch, whose rows are then simply processed again. A restarted run skips the rows
+    completed and tools re-use the objects created instead of looking them up again. Once a run completes without
+    failures the journal is removed.
+    """
+
+    def __init__(self, toolName, filePath, baseURL, collectionName, directory=None, batchSize=100) -> None:
+        """
+        CONSTRUCTOR
+        CONTRACT
+            toolName (String)  : Name of the tool, e.g. its class name
+            filePath (String)  : Path of the data file
+            baseURL (String)   : URL of the Specify server written to
+            collectionName (String) : Name of the collection written to
+            directory (String) : Folder of the journals. Default: 'journals' in the user documents folder
+            batchSize (Integer): Number of lines written at a time
+        """
+        self.toolName = toolName
+        self.filePath = filePath
+        self.batchSize = max(1, int(batchSize))
+        self.fileHash = fileHash(filePath)
+        self.baseURL = baseURL
+        self.collectionName = collectionName
+        target = hashlib.sha256(f'{baseURL}\n{collectionName}'.encode('utf-8')).hexdigest()
+        directory = Path(directory) if directory else Path(util.getUserPath()).joinpath('journals')
+        self.path = directory.joinpath(f'{toolName}_{self.fileHash[:16]}_{target[:8]}.jsonl')
+        self.lock = threading.Lock()
+        self.buffer = []
+        self.completed = set()  # numbers of the rows completed
+        self.created = []       # objects created (dict)
+        self.load()
+
+    def load(self):
+        """
+        Read the journal left by an earlier run, if any; a line cut off by a crash is ignored
+        RAISES Exception if the journal was written for another server or collection
+        """
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        resumed = self.path.exists()
+        if resumed:
+            with open(self.path, 'r', encoding='utf-8') as file:
+                for line in file:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    if 'journal' in entry: self.checkTarget(entry)
+                    if 'row' in entry: self.completed.add(entry['row'])
+                    if 'created' in entry: self.created.append(entry['created'])
+
+        self.file = open(self.path, 'a+', encoding='utf-8')
+        if resumed:
+            # Start on a new line after a line cut off
+            self.file.seek(0, os.SEEK_END)
+            if self.file.tell() > 0:
+                self.file.seek(self.file.tell() - 1)
+                if self.file.read(1) != '\n': self.file.write('\n')
+            util.logger.info(f'Resuming from journal {self.path}: {len(self.completed)} rows completed, {len(self.created)} objects created')
+        else:
+            self.append({'journal': self.toolName, 'datafile': str(self.filePath), 'sha256': self.fileHash,
+                         'baseURL': self.baseURL, 'collection': self.collectionName,
+                         'started': datetime.datetime.now().isoformat(timespec='seconds')})
+            self.flush()
+
+    def checkTarget(self, header):
+        """
+        Check that the header line of a journal read is for the same server and collection as this run
+        """
+        if (header.get('baseURL'), header.get('collection')) != (self.baseURL, self.collectionName):
+            raise Exception(f"Journal {self.path} was written for collection {header.get('collection')} at {header.get('baseURL')}, "
+                            f"not {self.collectionName} at {self.baseURL}")
+
+    @property
+    def resumed(self):
+        return bool(self.completed or self.created)
+
+    def pending(self, rows):
+        """
+        Yield the rows not yet completed, each numbered by its position in the data file (see JournalRow)
+        """
+        for number, row in enumerate(rows, start=1):
+            if number not in self.completed:
+                yield JournalRow(row, number)
+
+    def complete(self, number):
+        """
+        Record a row as completed
+        """
+        self.append({'row': number})
+
+    def create(self, obj):
+        """
+        Record an object created, as returned by the API
+        """
+        self.append({'created': obj})
+
+    def append(self, entry):
+        with self.lock:
+            self.buffer.append(json.dumps(entry))
+            if len(self.buffer) >= self.batchSize:
+                self.flushLocked()
+
+    def flush(self):
+        """
+        Write the buffered lines to disk
+        """
+        with self.lock:
+            self.flushLocked()
+
+    def flushLocked(self):
+        if not self.buffer: return
+        self.file.write('\n'.join(self.buffer) + '\n')
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.buffer = []
+
+    def close(self, completed=False):
+        """
+        Write the remaining lines and close the journal; remove it if the run completed without failures
+        """
+        self.flush()
+        self.file.close()
+        if completed:
+            self.path.unlink(missing_ok=True)
+            util.logger.info(f'Run completed, removed journal {self.path}')
+
+    def __str__(self) -> str:
+        return f'CheckpointJournal: {self.path} ({len(self.completed)} rows completed)'
+
+class JournalRow(dict):
+    """
+    Row of a data file carrying its number in the file, so that it can be recorded as completed
+    """
+
+    def __init__(self, row, number) -> None:
+        super().__init__(row)
+        self.number = number
+
+def fileHash(filePath):
+    """
+    Get the SHA-256 hash of a file's content
+    """
+    digest = hashlib.sha256()
+    with open(filePath, 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""
+  Created on October 16, 2026
+  @author: Fedor Alexander Steeman, NHMD
+  Copyright 2026 Natural History Museum of Denmark (NHMD)
+  Licensed under the Apache License, Version 2.0 (the "License");
+  you may not use this file except in compliance with the License.
+  You may obtain a copy of the License at
+  http://www.apache.org/licenses/LICENSE-2.0
+  Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the specific language governing permissions and limitations under the License.
+
+  PURPOSE: Adaptive limit on the number of requests in flight, following server latency and overload signals
+"""
+
+import threading
+
+# Internal Dependencies
+import util
+from request_metrics import percentile
+
+class AdaptiveConcurrencyLimiter():
+    """
+    Limits the number of requests in flight using additive increase/multiplicative decrease (AIMD):
+    After every window of successful requests the p95 latency of the window is compared to the lowest p95 seen (baseline).
+    While it stays within the tolerance of the baseline the limit grows by one; when it rises beyond, the limit is cut
+    by the backoff factor. Overload signals (429/5xx responses and timeouts) cut the limit right away.
+    Requests that were already in flight at the time of a cut do not cut the limit again, so that a burst of errors
+    from the same overload only counts once.
+    The baseline slowly follows a persistently higher latency, so that the limit can recover once the server settles.
+    """
+
+    def __init__(self, initialLimit=4, minLimit=1, maxLimit=32, backoffFactor=0.5, latencyTolerance=2.0, window=20) -> None:
+        """
+        CONSTRUCTOR
+        CONTRACT
+            initialLimit (Integer)   : Number of requests allowed in flight at the start
+            minLimit (Integer)       : Lowest limit
+            maxLimit (Integer)       : Highest limit
+            backoffFactor (float)    : Factor the limit is multiplied with when backing off
+            latencyTolerance (float) : Factor by which the p95 latency may exceed the baseline before backing off
+            window (Integer)         : Number of successful requests between adjustments
+        """
+        self.limit = max(minLimit, min(initialLimit, maxLimit))
+        self.minLimit = minLimit
+        self.maxLimit = maxLimit
+        self.backoffFactor = backoffFactor
+        self.latencyTolerance = latencyTolerance
+        self.window = window
+
+        self.inFlight = 0
+        self.latencies = []
+        self.baseline = None
+        self.epoch = 0  # Incremented with every cut of the limit
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        """
+        Wait until a request may be sent
+        CONTRACT
+            RETURNS ticket to be handed back on release
+        """
+        with self.condition:
+            while self.inFlight >= self.limit:
+                self.condition.wait()
+            self.inFlight += 1
+            return self.epoch
+
+    def release(self, ticket, latency, overloaded=False):
+        """
+        Register the completion of a request and adjust the limit
+        CONTRACT
+            ticket (Integer)     : Ticket received on acquire
+            latency (float)      : Seconds the request took
+            overloaded (boolean) : Whether the response signals overload (429/5xx, timeout)
+        """
+        with self.condition:
+            self.inFlight -= 1
+            if overloaded:
+                if ticket == self.epoch:
+                    self.decrease('overload')
+            elif ticket == self.epoch:
+                # Latencies of requests sent before the last cut do not reflect the current limit
+                self.latencies.append(latency)
+                if len(self.latencies) >= self.window:
+                    self.adjust()
+            self.condition.notify_all()
+
+    def adjust(self):
+        """
+        Compare the p95 latency of the last window to the baseline and grow or cut the limit accordingly
+        """
+        p95 = percentile(sorted(self.latencies), 0.95)
+        self.latencies = []
+        if self.baseline is None or p95 < self.baseline:
+            self.baseline = p95
+
+        if p95 > self.baseline * self.latencyTolerance:
+            self.decrease(f'p95 latency {p95 * 1000:.0f} ms vs baseline {self.baseline * 1000:.0f} ms')
+            # Follow persistently higher latency slowly
+            self.baseline += (p95 - self.baseline) * 0.1
+        elif self.limit < self.maxLimit:
+            self.limit += 1
+
+    def decrease(self, reason):
+        """
+        Cut the limit by the backoff factor
+        """
+        limit = max(self.minLimit, int(self.limit * self.backoffFactor))
+        util.logger.info(f'Concurrency limit {self.limit} -> {limit} ({reason})')
+        self.limit = limit
+        self.epoch += 1
+        self.latencies = []
+
+    def __str__(self) -> str:
+        return f'AdaptiveConcurrencyLimiter: limit {self.limit}, {self.inFlight} in flight'
@@ -18,7 +18,9 @@ import importlib
 
 #Internal Dependencies
 import specify_interface
+import session_store
 import global_settings as app
+import util
 
 class ConfigurationHandler():
     """
@@ -45,6 +47,30 @@ class ConfigurationHandler():
         with open(f"config/config{mode}.json", "r") as file:
             config = json.load(file)
 
+        self.applyConfiguration(config)
+
+    def applyConfiguration(self, config):
+        """
+        Applies configuration settings and logs in to the Specify7 API of the configured domain. 
+        Allows for passing the configuration directly, e.g. when running against a local fake Specify7 server. 
+        Optionally the logged in session is persisted to a local file ('persistSession': true) and resumed in later runs 
+        at the cost of a single verification call, falling back to a full login if it has expired. 
+        CONTRACT 
+            config (dict) : Configuration as found in the config files ('mode', 'domain', 'collection', 'username', 'password')
+                            and optionally 'persistSession' (boolean), 'sessionFile' (path of the session file),
+                            'retry' (arguments of request_handler.RetryPolicy, e.g. {"maxAttempts": 6}),
+                            'cassette' (e.g. {"mode": "record", "path": "cassettes/run.jsonl.gz"}, see cassette.py)
+                            'adaptiveConcurrency' (arguments of concurrency_limiter.AdaptiveConcurrencyLimiter, e.g. {"maxLimit": 16})
+                            'parallelRows' (boolean; process data file rows in parallel for tools declaring concurrency)
+                            'skipFailedRows' (boolean; carry on with the next row when a row fails, see Sp7ApiTool.handleRows)
+                            'treeIndex' (boolean; tree tools load the whole tree once and look up existing nodes in memory)
+                            'levelConcurrency' (number of nodes of the same tree level resolved at a time by tools planning their paths)
+                            'metadataCache' (e.g. {"ttl": 86400, "refresh": false}; persist collection, discipline and tree definitions, see metadata_cache.py)
+                            'database' (e.g. {"name": "db", "in_memory": false}; local SQLite mirror of Specify tables, see data_access.py)
+                            'mirrorLookups' (boolean; tree tools look up existing nodes in the local mirror, see mirror_sync.py)
+                            'checkpoint' (e.g. {"batchSize": 100}; journal the rows completed for resuming a run, see checkpoint_journal.py)
+                            and 'pipeline' (e.g. {"queueSize": 100, "workers": {"resolve": 4}}; stream data file rows through staged workers, see pipeline.py)
+        """
         if config:
             self.mode = config['mode']
             app.settings['baseURL'] = config['domain']
@@ -52,25 +78,69 @@ class ConfigurationHandler():
             app.settings['userName'] = config['username']
             app.settings['password'] =  config['password']
             app.settings['csrfToken'] = ''  # CSRF token is empty at this point
+            app.settings['persistSession'] = config.get('persistSession', False)
+            app.settings['retry'] = config.get('retry', {})
+            app.settings['cassette'] = config.get('cassette')
+            app.settings['adaptiveConcurrency'] = config.get('adaptiveConcurrency')
+            app.settings['parallelRows'] = config.get('parallelRows', False)
+            app.settings['skipFailedRows'] = config.get('skipFailedRows', False)
+            app.settings['treeIndex'] = config.get('treeIndex', False)
+            app.settings['levelConcurrency'] = config.get('levelConcurrency', 1)
+            app.settings['metadataCache'] = config.get('metadataCache')
+            app.settings['database'] = {**app.settings.get('database', {}), **config.get('database', {})}
+            app.settings['mirrorLookups'] = config.get('mirrorLookups', False)
+            app.settings['checkpoint'] = config.get('checkpoint')
+            app.settings['pipeline'] = config.get('pipeline')
         else:
             raise Exception("Configuration error!") 
                 
         self.sp = specify_interface.SpecifyInterface()
 
+        store = None
+        if app.settings['persistSession']:
+            store = session_store.SessionStore(config.get('sessionFile'))
+            if self.resumeSession(store):
+                return
+
         collections = self.sp.getInitialCollections()
 
         app.settings['collectionId'] = collections.get(app.settings['collectionName'], None)
 
-        self.sp.login(app.settings['userName'], 
-                      app.settings['password'], 
-                      app.settings['collectionId'],
-                      self.sp.getCSRFToken())
-        pass
+        token = self.sp.login(app.settings['userName'], 
+                              app.settings['password'], 
+                              app.settings['collectionId'],
+                              self.sp.getCSRFToken())
+        
+        if store and token != '':
+            store.save(app.settings['baseURL'], app.settings['collectionName'], token, 
+                       self.sp.exportCookies(), app.settings['collectionId'])
+
+    def resumeSession(self, store):
+        """
+        Attempt to resume the session persisted for the configured domain and collection. 
+        CONTRACT 
+            store (session_store.SessionStore) : Store of persisted sessions
+            RETURNS boolean to indicate whether the session was resumed 
+        """
+        session = store.load(app.settings['baseURL'], app.settings['collectionName'])
+        if session is None: 
+            return False
+
+        if self.sp.resumeSession(session['csrfToken'], session['cookies']):
+            app.settings['collectionId'] = session['collectionId']
+            util.logger.debug('Resumed persisted Specify session')
+            return True
+        
+        util.logger.debug('Persisted Specify session has expired; logging in anew')
+        store.remove(app.settings['baseURL'], app.settings['collectionName'])
+        return False
 
     def loadTools(self):
         """
         Load tools dynamically from a JSON configuration file.
         The tools json must specify the name, class and module of the tool. 
+        Tools are registered as lightweight descriptors; a tool is only imported and constructed 
+        (logging in and fetching its metadata) once it is selected for use (see ToolDescriptor.load). 
         """
 
         with open("tools.json", "r") as file:
@@ -80,9 +150,48 @@ class ConfigurationHandler():
 
         if tools:
             for tool in tools:
-                module = importlib.import_module(tool["module"])
-                class_ = getattr(module, tool["class"])
-                instance = class_(self.sp)
-                self.toolKit.append((tool["name"], instance))
+                descriptor = ToolDescriptor(tool["name"], tool["module"], tool["class"])
+                if any(registered.key == descriptor.key for _, registered in self.toolKit):
+                    util.logger.debug(f"Skipping duplicate tool entry: {descriptor.name}")
+                    continue
+                self.toolKit.append((descriptor.name, descriptor))
         else:
-            raise Exception("No tools loaded...")
\ No newline at end of file
+            raise Exception("No tools loaded...")
+
+class ToolDescriptor():
+    """
+    Lightweight registration of a tool that defers importing its module and constructing it until requested.
+    """
+
+    def __init__(self, name, module, class_name) -> None:
+        """
+        CONSTRUCTOR
+        CONTRACT
+            name (String)       : Display name of the tool 
+            module (String)     : Name of the module containing the tool class, e.g. 'tools.merge_taxon_pairs'
+            class_name (String) : Name of the tool class 
+        """
+        self.name = name
+        self.module = module
+        self.class_name = class_name
+        self.instance = None
+
+    @property
+    def key(self):
+        return (self.module, self.class_name)
+
+    def load(self, specifyInterface):
+        """
+        Import and construct the tool, or return the instance constructed earlier. 
+        CONTRACT
+            specifyInterface (specify_interface.SpecifyInterface) : specify interface class instance injected into the tool
+            RETURNS tool instance 
+        """
+        if self.instance is None:
+            module = importlib.import_module(self.module)
+            class_ = getattr(module, self.class_name)
+            self.instance = class_(specifyInterface)
+        return self.instance
+
+    def __str__(self) -> str:
+        return f'{self.name} ({self.module}.{self.class_name})'
@@ -0,0 +1,431 @@
+# -*- coding: utf-8 -*-
+"""
+  Created on October 16, 2026
+  @author: Fedor Alexander Steeman, NHMD
+  Copyright 2026 Natural History Museum of Denmark (NHMD)
+  Licensed under the Apache License, Version 2.0 (the "License");
+  you may not use this file except in compliance with the License.
+  You may obtain a copy of the License at
+  http://www.apache.org/licenses/LICENSE-2.0
+  Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the specific language governing permissions and limitations under the License.
+
+  PURPOSE: Local SQLite store mirroring the Specify7 tables used by the tools, for querying them without API calls
+"""
+
+import json
+import sqlite3
+import threading
+from pathlib import Path
+
+# Internal Dependencies
+import util
+import global_settings as app
+from models.tree_index import uriId
+
+# Columns per mirrored table besides the local primary key 'id', the Specify primary key 'spid',
+# the last modification time in Specify and the full API object as JSON
+TABLES = {
+    'taxon':       ['name', 'fullname', 'author', 'parentid', 'parentfullname', 'rankid', 'treedefid', 'treedefitemid',
+                    'collectionid', 'isaccepted', 'acceptedid', 'idnumber', 'taxonnrsource'],
+    'storage':     ['name', 'fullname', 'parentid', 'parentfullname', 'rankid', 'treedefid', 'treedefitemid', 'collectionid'],
+    'treedefitem': ['tree', 'name', 'rankid', 'treedefid', 'parentid'],
+    'collection':  ['name', 'institutionid', 'taxontreedefid', 'disciplineid', 'visible', 'catalognrlength', 'usetaxonnumbers'],
+    'discipline':  ['name', 'taxontreedefid'],
+}
+
+# Columns identifying a mirrored Specify object; tree definition items of all trees share one table
+KEYS = {'treedefitem': ('tree', 'spid')}
+
+# Indexed columns per table; names are indexed case-insensitively, as they are queried (see getRows)
+INDEXES = {
+    'taxon':       [('parentid',), ('fullname COLLATE NOCASE',), ('rankid',), ('name COLLATE NOCASE',)],
+    'storage':     [('parentid',), ('fullname COLLATE NOCASE',), ('rankid',), ('name COLLATE NOCASE',)],
+    'treedefitem': [('treedefid', 'rankid'), ('name COLLATE NOCASE',)],
+}
+
+class DataAccess():
+    """
+    Local SQLite database holding a mirror of the Specify7 tables used by the tools (taxon, storage, tree definition items,
+    collection and discipline) along with the records saved by the models (see models/model.py).
+    Objects fetched from the API are stored with their main fields as columns (indexed on parent, full name, rank id
+    and name) and in full as JSON, so that read-heavy tools can query them locally instead of through the API.
+    Depending on the 'database' setting the database is kept in a file in the user documents folder or in memory only.
+    """
+
+    def __init__(self, databaseName=None, inMemory=None) -> None:
+        """
+        CONSTRUCTOR
+        CONTRACT
+            databaseName (String) : Name of the database file without extension. Default: as set in the 'database' setting
+            inMemory (boolean)    : Whether to keep the database in memory only. Default: as set in the 'database' setting
+        """
+        settings = app.settings.get('database', {})
+        self.databaseName = databaseName or settings.get('name', 'db')
+        inMemory = settings.get('in_memory', False) if inMemory is None else inMemory
+        self.path = ':memory:' if inMemory else str(Path(util.getUserPath()).joinpath(f'{self.databaseName}.sqlite3'))
+        if not inMemory:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+
+        # One connection shared by all threads, serialized by a lock
+        self.lock = threading.RLock()
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        if not inMemory:
+            self.connection.execute('PRAGMA journal_mode=WAL')
+        self.createTables()
+
+    def createTables(self):
+        """
+        Create the tables and indexes, if not present
+        """
+        with self.lock, self.connection:
+            for table, columns in TABLES.items():
+                definitions = ', '.join(f'{column} {columnType(column)}' for column in columns)
+                self.connection.execute(f'CREATE TABLE IF NOT EXISTS {table} (id INTEGER PRIMARY KEY AUTOINCREMENT, '
+                                        f'spid INTEGER, {definitions}, timestampmodified TEXT, json TEXT)')
+                key = KEYS.get(table, ('spid',))
+                self.connection.execute(f'CREATE UNIQUE INDEX IF NOT EXISTS ux_{table}_key ON {table} ({", ".join(key)})')
+                for index in INDEXES.get(table, []):
+                    name = '_'.join(column.replace(' COLLATE NOCASE', '_nocase') for column in index)
+                    self.connection.execute(f'CREATE INDEX IF NOT EXISTS ix_{table}_{name} ON {table} ({", ".join(index)})')
+            # Progress of synchronizing the mirror per object type (see mirror_sync.py)
+            self.connection.execute('CREATE TABLE IF NOT EXISTS syncstate (sptype TEXT PRIMARY KEY, watermark TEXT, '
+                                    'syncedat REAL, reconciledat REAL)')
+
+    # Generic record functions as used by the models
+
+    def insertRow(self, table, fields):
+        """
+        Insert a record
+        CONTRACT
+            table (String) : Name of the table
+            fields (dict)  : Column names as keys and values, optionally as SQL literals (see Model.getFieldsAsDict)
+            RETURNS the inserted record (sqlite3.Row)
+        """
+        values = self.columnValues(table, fields)
+        # Let the database assign the local primary key, unless given 
+        if not values.get('id'): values.pop('id', None)
+        with self.lock, self.connection:
+            cursor = self.connection.execute(f'INSERT INTO {table} ({", ".join(values)}) VALUES ({", ".join("?" * len(values))})',
+                                             list(values.values()))
+            return self.getRowOnId(table, cursor.lastrowid)
+
+    def saveRow(self, table, fields):
+        """
+        Insert a record, or update the record of the same Specify object, e.g. as mirrored (see upsertObjects). 
+        The mirrored API object (JSON) of an updated record is updated with the columns written (see updateJson). 
+        CONTRACT
+            table (String) : Name of the table
+            fields (dict)  : Column names as keys and values, optionally as SQL literals (see Model.getFieldsAsDict)
+            RETURNS the inserted or updated record (sqlite3.Row)
+        """
+        values = self.columnValues(table, fields)
+        if values.get('spid') is None or KEYS.get(table, ('spid',)) != ('spid',):
+            return self.insertRow(table, fields)
+        values.pop('id', None)
+        updates = ', '.join(f'{column} = excluded.{column}' for column in values if column != 'spid')
+        with self.lock, self.connection:
+            self.connection.execute(f'INSERT INTO {table} ({", ".join(values)}) VALUES ({", ".join("?" * len(values))}) '
+                                    f'ON CONFLICT (spid) DO ' + (f'UPDATE SET {updates}' if updates else 'NOTHING'),
+                                    list(values.values()))
+            record = self.getRows(table, {'spid': values['spid']}, 1)[0]
+            return self.updateJson(table, record, values)
+
+    def updateRow(self, table, id, fields):
+        """
+        Update the record with the given local primary key, along with its mirrored API object (see updateJson)
+        CONTRACT
+            RETURNS the updated record (sqlite3.Row) or None if absent
+        """
+        values = self.columnValues(table, fields)
+        values.pop('id', None)
+        with self.lock, self.connection:
+            if values:
+                self.connection.execute(f'UPDATE {table} SET {", ".join(f"{column} = ?" for column in values)} WHERE id = ?',
+                                        list(values.values()) + [id])
+            record = self.getRowOnId(table, id)
+            return self.updateJson(table, record, values) if record is not None else None
+
+    def updateJson(self, table, record, values):
+        """
+        Bring the mirrored API object (JSON) of a record in line with the column values written by a model, 
+        so that queries on the columns do not return the object as it was before (see getObjects)
+        CONTRACT
+            record (sqlite3.Row) : The record written
+            values (dict)        : Column names and plain values written
+            RETURNS the record (sqlite3.Row), as updated
+        """
+        if not record['json'] or 'json' in values:
+            return record
+        obj = json.loads(record['json'])
+        fields = objectFields(table, values, record['tree'] if table == 'treedefitem' else None)
+        if all(obj.get(field) == value for field, value in fields.items()):
+            return record
+        obj.update(fields)
+        with self.lock, self.connection:
+            self.connection.execute(f'UPDATE {table} SET json = ? WHERE id = ?', (json.dumps(obj), record['id']))
+            return self.getRowOnId(table, record['id'])
+
+    def getRowOnId(self, table, id):
+        """
+        Get the record with the given local primary key, or None if absent
+        """
+        with self.lock:
+            return self.connection.execute(f'SELECT * FROM {table} WHERE id = ?', (id,)).fetchone()
+
+    def deleteRowOnId(self, table, id):
+        """
+        Delete the record with the given local primary key
+        CONTRACT
+            RETURNS boolean to indicate whether a record was deleted
+        """
+        with self.lock, self.connection:
+            return self.connection.execute(f'DELETE FROM {table} WHERE id = ?', (id,)).rowcount > 0
+
+    def getRows(self, table, filters={}, limit=None, sort='id'):
+        """
+        Query records on exact values of their columns. 
+        Text values are compared case-insensitively like the Specify database does (MySQL collation). 
+        NOTE SQLite only folds the case of ASCII letters 
+        CONTRACT
+            table (String)  : Name of the table
+            filters (dict)  : Column names and values to match, e.g. {'parentid': 12, 'name': 'Shelf 1'}
+            limit (Integer) : Maximum number of records. Default: all
+            sort (String)   : Column to order by (prefixed by '-' for descending order)
+            RETURNS list of records (sqlite3.Row)
+        """
+        self.checkColumns(table, list(filters) + [sort.lstrip('-')])
+        where = ' AND '.join(f'{column} IS ? COLLATE NOCASE' if isinstance(value, str) else f'{column} IS ?' 
+                             for column, value in filters.items()) or '1'
+        order = f'{sort.lstrip("-")} {"DESC" if sort.startswith("-") else "ASC"}'
+        query = f'SELECT * FROM {table} WHERE {where} ORDER BY {order}' + (f' LIMIT {int(limit)}' if limit else '')
+        with self.lock:
+            return self.connection.execute(query, list(filters.values())).fetchall()
+
+    # Mirroring of Specify objects
+
+    def upsertObjects(self, sptype, objects):
+        """
+        Insert or update objects fetched from the Specify API, matched on their Specify primary key
+        CONTRACT
+            sptype (String) : API name of the objects, e.g. 'taxon', 'storage', 'taxontreedefitem' or 'collection'
+            objects (list)  : Objects (dict) as returned by the API
+            RETURNS number of objects stored
+        """
+        table = mirrorTable(sptype)
+        rows = [mirrorColumns(sptype, obj) for obj in objects]
+        if not rows: return 0
+        columns = list(rows[0])
+        key = KEYS.get(table, ('spid',))
+        updates = ', '.join(f'{column} = excluded.{column}' for column in columns if column not in key)
+        statement = (f'INSERT INTO {table} ({", ".join(columns)}) VALUES ({", ".join("?" * len(columns))}) '
+                     f'ON CONFLICT ({", ".join(key)}) DO UPDATE SET {updates}')
+        with self.lock, self.connection:
+            self.connection.executemany(statement, [[row[column] for column in columns] for row in rows])
+        return len(rows)
+
+    def deleteObjects(self, sptype, spids):
+        """
+        Delete mirrored objects by their Specify primary keys
+        CONTRACT
+            RETURNS number of objects deleted
+        """
+        table = mirrorTable(sptype)
+        tree = sptype[:-len('treedefitem')] if table == 'treedefitem' else None
+        deleted = 0
+        with self.lock, self.connection:
+            for spid in spids:
+                if tree is None:
+                    deleted += self.connection.execute(f'DELETE FROM {table} WHERE spid = ?', (int(spid),)).rowcount
+                else:
+                    deleted += self.connection.execute(f'DELETE FROM {table} WHERE tree = ? AND spid = ?', (tree, int(spid))).rowcount
+        return deleted
+
+    def getObjects(self, sptype, filters={}, limit=None, sort='spid'):
+        """
+        Query mirrored objects on their columns, returning them as the API would
+        CONTRACT
+            sptype (String) : API name of the objects, e.g. 'taxon'
+            filters (dict)  : Column names and values to match, e.g. {'fullname': 'Gadus morhua', 'rankid': 220}
+            RETURNS list of objects (dict)
+        """
+        table = mirrorTable(sptype)
+        if table == 'treedefitem':
+            filters = {'tree': sptype[:-len('treedefitem')], **filters}
+        return [json.loads(row['json']) for row in self.getRows(table, filters, limit, sort) if row['json']]
+
+    def count(self, sptype):
+        """
+        Get the number of mirrored objects of a type; records only saved by the models are not counted
+        """
+        table = mirrorTable(sptype)
+        filters = {'tree': sptype[:-len('treedefitem')]} if table == 'treedefitem' else {}
+        where = ' AND '.join(f'{column} = ?' for column in filters) or '1'
+        with self.lock:
+            return self.connection.execute(f'SELECT COUNT(*) FROM {table} WHERE {where} AND spid IS NOT NULL AND json IS NOT NULL',
+                                           list(filters.values())).fetchone()[0]
+
+    def getSpids(self, sptype, low=None, high=None):
+        """
+        Get the Specify primary keys of the mirrored objects of a type, optionally within a range
+        CONTRACT
+            sptype (String) : API name of the objects, e.g. 'taxon'
+            low (Integer)   : Lowest primary key included. Default: no lower bound
+            high (Integer)  : Primary key above the range (excluded). Default: no upper bound
+            RETURNS sorted list of primary keys (Integer)
+        """
+        table = mirrorTable(sptype)
+        conditions = {'spid IS NOT NULL AND json IS NOT NULL': None}
+        if table == 'treedefitem': conditions['tree = ?'] = sptype[:-len('treedefitem')]
+        if low is not None: conditions['spid >= ?'] = int(low)
+        if high is not None: conditions['spid < ?'] = int(high)
+        values = [value for value in conditions.values() if value is not None]
+        with self.lock:
+            rows = self.connection.execute(f'SELECT spid FROM {table} WHERE {" AND ".join(conditions)} ORDER BY spid', values)
+            return [row[0] for row in rows.fetchall()]
+
+    def getSyncState(self, sptype):
+        """
+        Get the synchronization state of an object type: the 'watermark' (timestamp of the latest modification mirrored)
+        and the times of the last synchronization ('syncedat') and deletion reconciliation ('reconciledat'), or None
+        """
+        with self.lock:
+            row = self.connection.execute('SELECT * FROM syncstate WHERE sptype = ?', (sptype,)).fetchone()
+            return dict(row) if row is not None else None
+
+    def setSyncState(self, sptype, **state):
+        """
+        Record (part of) the synchronization state of an object type, e.g. setSyncState('taxon', watermark='2026-10-16T12:00:00')
+        """
+        unknown = [key for key in state if key not in ('watermark', 'syncedat', 'reconciledat')]
+        if unknown:
+            raise ValueError(f'Unknown synchronization state: {", ".join(unknown)}')
+        with self.lock, self.connection:
+            self.connection.execute('INSERT OR IGNORE INTO syncstate (sptype) VALUES (?)', (sptype,))
+            if state:
+                self.connection.execute(f'UPDATE syncstate SET {", ".join(f"{key} = ?" for key in state)} WHERE sptype = ?',
+                                        list(state.values()) + [sptype])
+
+    # Helper functions
+
+    def columnValues(self, table, fields):
+        """
+        Get the fields of a record that the table has columns for, as plain values. Fields of the generic base model 
+        not applying to a table (e.g. 'fullname' for a discipline) are left out. 
+        """
+        if table not in TABLES:
+            raise ValueError(f'Unknown table: {table}')
+        known = set(TABLES[table]) | {'id', 'spid', 'timestampmodified', 'json'}
+        values = {column: literalValue(value) for column, value in fields.items() if column in known}
+        # Records not (yet) in Specify have primary key 0; stored as NULL, since the Specify primary key is unique
+        if values.get('spid') == 0: values['spid'] = None
+        return values
+
+    def checkColumns(self, table, columns):
+        if table not in TABLES:
+            raise ValueError(f'Unknown table: {table}')
+        known = set(TABLES[table]) | {'id', 'spid', 'timestampmodified', 'json'}
+        unknown = [column for column in columns if column not in known]
+        if unknown:
+            raise ValueError(f'Unknown column(s) of table {table}: {", ".join(unknown)}')
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+    def __str__(self) -> str:
+        return f'DataAccess: {self.path}'
+
+def columnType(column):
+    if column in ('name', 'fullname', 'author', 'parentfullname', 'tree', 'idnumber', 'taxonnrsource'):
+        return 'TEXT'
+    return 'INTEGER'
+
+def literalValue(value):
+    """
+    Convert a value given as SQL literal (e.g. '"Gadus"', '12' or 'None', see Model.getFieldsAsDict) to a plain value
+    """
+    if not isinstance(value, str):
+        return value
+    if len(value) > 1 and value[0] == value[-1] and value[0] in '"\'':
+        return value[1:-1]
+    if value == 'None':
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        return value
+
+def mirrorTable(sptype):
+    """
+    Get the table mirroring objects of the given API name
+    """
+    if sptype.endswith('treedefitem'):
+        return 'treedefitem'
+    if sptype not in TABLES:
+        raise ValueError(f'Objects of type {sptype} are not mirrored')
+    return sptype
+
+def mirrorColumns(sptype, obj):
+    """
+    Map an object as returned by the API to the columns of its mirror table
+    """
+    table = mirrorTable(sptype)
+    row = {column: None for column in TABLES[table]}
+    row.update(spid=int(obj['id']), timestampmodified=obj.get('timestampmodified'), json=json.dumps(obj))
+    row['name'] = obj.get('collectionname') if table == 'collection' else obj.get('name')
+    if table in ('taxon', 'storage'):
+        row.update(fullname=obj.get('fullname'), parentid=uriId(obj.get('parent')), rankid=obj.get('rankid'),
+                   treedefid=uriId(obj.get('definition')), treedefitemid=uriId(obj.get('definitionitem')))
+        if table == 'taxon':
+            row.update(author=obj.get('author'), isaccepted=obj.get('isaccepted'), acceptedid=uriId(obj.get('acceptedtaxon')))
+    elif table == 'treedefitem':
+        row.update(tree=sptype[:-len('treedefitem')], rankid=obj.get('rankid'), treedefid=uriId(obj.get('treedef')),
+                   parentid=uriId(obj.get('parent')))
+    elif table == 'collection':
+        row.update(disciplineid=uriId(obj.get('discipline')))
+    elif table == 'discipline':
+        row.update(taxontreedefid=uriId(obj.get('taxontreedef')))
+    return row
+
+def objectFields(table, values, tree=None):
+    """
+    Map column values of a mirror table to the fields of the API object they were taken from (the reverse of mirrorColumns). 
+    Columns not taken from the API object are left out; a primary key of 0 stands for no object, as in the models. 
+    """
+    sptype = f'{tree}treedefitem' if table == 'treedefitem' else table
+    references = {'parentid': ('parent', sptype), 'acceptedid': ('acceptedtaxon', 'taxon')}
+    if table in ('taxon', 'storage'):
+        references.update(treedefid=('definition', f'{table}treedef'), treedefitemid=('definitionitem', f'{table}treedefitem'))
+    elif table == 'treedefitem':
+        references.update(treedefid=('treedef', f'{tree}treedef'))
+    elif table == 'collection':
+        references = {'disciplineid': ('discipline', 'discipline')}
+    elif table == 'discipline':
+        references = {'taxontreedefid': ('taxontreedef', 'taxontreedef')}
+    plain = {'taxon': ('name', 'fullname', 'rankid', 'author', 'isaccepted'), 'storage': ('name', 'fullname', 'rankid'),
+             'treedefitem': ('name', 'rankid'), 'discipline': ('name',)}.get(table, ())
+
+    fields = {}
+    for column, value in values.items():
+        if column in references:
+            field, reference = references[column]
+            fields[field] = f'/api/specify/{reference}/{value}/' if value else None
+        elif column == 'isaccepted':
+            fields[column] = None if value is None else bool(value)
+        elif column in plain:
+            fields[column] = value
+        elif column == 'name' and table == 'collection':
+            fields['collectionname'] = value
+    return fields
+
+databases = {}
+
+def getDataAccess(databaseName=None):
+    """
+    Get the local database of the given name (default: as set in the 'database' setting), shared by all its users
+    """
+    databaseName = databaseName or app.settings.get('database', {}).get('name', 'db')
+    if databaseName not in databases:
+        databases[databaseName] = DataAccess(databaseName)
+    return databases[databaseName]
@@ -25,10 +25,14 @@ class Main():
     Main starting point of the application.
     """
 
-    def __init__(self, mode) -> None:
+    def __init__(self, mode, toolArgs=None) -> None:
         """
         Initialize main class 
+        CONTRACT 
+            mode (String)    : Name of the configuration mode 
+            toolArgs (dict)  : Further arguments passed to the tool, e.g. {'plan': True} or {'apply': 'output/plan.jsonl'}
         """
+        self.toolArgs = toolArgs or {}
         util.buildLogger()
         util.logger.debug(f"__init__ , {mode}")
 
@@ -49,10 +53,14 @@ class Main():
         print("Selected collection:", app.settings['collectionName'])
 
         self.selectTool()
-        self.selectDatafile()
+
+        # Applying a plan takes the plan file instead of a data file 
+        args = dict(self.toolArgs)
+        if not args.get('apply'):
+            self.selectDatafile()
+            args['filename'] = self.filename
 
         print("Running tool...")
-        args = {'filename' : self.filename}
         self.tool_instance.runTool(args)  # Assuming each tool has a run method
 
         print("*** Finished running tool ***")
@@ -105,8 +113,9 @@ class Main():
             choice = int(entry) - 1
 
             if 0 <= choice < len(self.cfg.toolKit):
-                tool_name, self.tool_instance = self.cfg.toolKit[choice]
+                tool_name, tool_descriptor = self.cfg.toolKit[choice]
                 print(f"\nSelected tool: {tool_name}")
+                self.tool_instance = tool_descriptor.load(self.cfg.sp)
             else:
                 print("Invalid choice. Please try again.")
                 self.selectTool()
@@ -118,9 +127,25 @@ if __name__ == "__main__":
     Start main execution thread.
     """
 
+    # Optionally fetch the cached metadata anew (see metadata_cache.py) 
+    arguments = sys.argv[1:]
+    if '--refresh-metadata' in arguments:
+        arguments.remove('--refresh-metadata')
+        app.settings['refreshMetadata'] = True
+
+    # Optionally only plan a tree import, or apply a plan made before (see TreeNodeTool.runTool) 
+    toolArgs = {}
+    if '--plan' in arguments:
+        arguments.remove('--plan')
+        toolArgs['plan'] = True
+    if '--apply' in arguments:
+        index = arguments.index('--apply')
+        toolArgs['apply'] = arguments[index + 1]
+        del arguments[index:index + 2]
+
     # Check if run mode parameter has been passed 
-    mode = sys.argv[1] if len(sys.argv) > 1 else ""
+    mode = arguments[0] if len(arguments) > 0 else ""
 
     # Initialize according to mode, if any set at all
-    main = Main(mode)
+    main = Main(mode, toolArgs)
     
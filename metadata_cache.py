@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+  Created on October 16, 2026
+  @author: Fedor Alexander Steeman, NHMD
+  Copyright 2026 Natural History Museum of Denmark (NHMD)
+  Licensed under the Apache License, Version 2.0 (the "License");
+  you may not use this file except in compliance with the License.
+  You may obtain a copy of the License at
+  http://www.apache.org/licenses/LICENSE-2.0
+  Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the specific language governing permissions and limitations under the License.
+
+  PURPOSE: Local cache persisting rarely changing Specify7 metadata (collection, discipline, tree definitions) between runs
+"""
+
+import os
+import json
+import time
+import threading
+from pathlib import Path
+
+# Internal Dependencies
+import util
+
+class MetadataCache():
+    """
+    Persists metadata fetched from Specify7 per domain and collection to a local JSON file, so that later runs
+    do not fetch it again. Entries expire after a number of seconds (TTL). In refresh mode every entry is fetched anew
+    once per run, regardless of its age, e.g. after the tree definitions have been changed in Specify.
+    """
+
+    def __init__(self, path=None, ttl=86400, refresh=False) -> None:
+        """
+        CONSTRUCTOR
+        CONTRACT
+            path (String)     : Path of the cache file. Default: 'metadata_cache.json' in the user documents folder
+            ttl (float)       : Number of seconds before an entry is fetched anew. Default: one day
+            refresh (boolean) : Whether to fetch every entry anew once in this run
+        """
+        self.path = Path(path) if path else Path(util.getUserPath()).joinpath('metadata_cache.json')
+        self.ttl = ttl
+        self.refresh = refresh
+        self.refreshed = set()
+        self.lock = threading.Lock()
+
+    def get(self, domain, collectionName, name, fetch):
+        """
+        Get a metadata entry for the domain and collection, fetching and persisting it if absent, expired or refreshed
+        CONTRACT
+            domain (String)         : Base URL of the Specify7 server
+            collectionName (String) : Name of the collection logged in to
+            name (String)           : Name of the entry, e.g. 'taxontreedefitem/13'
+            fetch (function)        : Function fetching the entry from Specify7; its result must be JSON serializable.
+                                      None and empty results are returned without being cached.
+            RETURNS the entry
+        """
+        key = self.key(domain, collectionName)
+        with self.lock:
+            entry = self.readAll().get(key, {}).get(name)
+            stale = entry is None or time.time() - entry['savedAt'] > self.ttl
+            if self.refresh and (key, name) not in self.refreshed:
+                stale = True
+            if not stale:
+                return entry['value']
+
+        value = fetch()
+        if value is None or value == [] or value == {}:
+            # Most likely a failed request rather than metadata: served as is, but fetched anew next time
+            util.logger.warning(f'Metadata "{name}" for {key} came back empty; not cached')
+            return value
+        with self.lock:
+            entries = self.readAll()
+            entries.setdefault(key, {})[name] = {'value': value, 'savedAt': time.time()}
+            self.writeAll(entries)
+            self.refreshed.add((key, name))
+        util.logger.debug(f'Cached metadata "{name}" for {key}')
+        return value
+
+    def remove(self, domain, collectionName):
+        """
+        Forget all metadata cached for the domain and collection
+        """
+        with self.lock:
+            entries = self.readAll()
+            if entries.pop(self.key(domain, collectionName), None) is not None:
+                self.writeAll(entries)
+
+    def key(self, domain, collectionName):
+        return f'{domain}|{collectionName}'
+
+    def readAll(self):
+        """
+        Read all cached entries; an unreadable file is treated as empty
+        """
+        try:
+            with open(self.path, 'r', encoding='utf-8') as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    def writeAll(self, entries):
+        """
+        Write all entries to file, replacing it at once so that concurrent runs never read a partial file
+        """
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = self.path.with_name(f'{self.path.name}.{os.getpid()}.tmp')
+        with open(temporary, 'w', encoding='utf-8') as file:
+            json.dump(entries, file)
+        os.replace(temporary, self.path)
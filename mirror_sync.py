@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""
+  Created on October 16, 2026
+  @author: Fedor Alexander Steeman, NHMD
+  Copyright 2026 Natural History Museum of Denmark (NHMD)
+  Licensed under the Apache License, Version 2.0 (the "License");
+  you may not use this file except in compliance with the License.
+  You may obtain a copy of the License at
+  http://www.apache.org/licenses/LICENSE-2.0
+  Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the specific language governing permissions and limitations under the License.
+
+  PURPOSE: Incremental synchronization of the local SQLite mirror with Specify7, fetching only what changed since the last run
+"""
+
+import sys
+import json
+import time
+
+# Internal Dependencies
+import util
+import configuration
+import data_access
+
+# Object types synchronized by default, tree definition items first
+DEFAULT_TYPES = ['taxontreedefitem', 'storagetreedefitem', 'collection', 'discipline', 'taxon', 'storage']
+
+class MirrorSync():
+    """
+    Keeps the local mirror (see data_access.py) of Specify object types up to date:
+    The first synchronization of a type loads all its objects. Later ones only fetch the objects modified since the
+    watermark, i.e. the latest modification timestamp seen by the previous run, and insert or update them locally.
+    Deleted objects leave no trace to fetch, so deletions are detected by reconciling the sets of primary keys
+    whenever Specify holds fewer objects than the mirror, or at least once per reconciliation interval.
+    Reconciliation compares the counts of objects in ranges of primary keys, splitting the ranges that differ, so that
+    only the keys of the few ranges containing deletions are actually fetched.
+    A failed request (see SpecifyInterface.getSpecifyObjectPage) aborts the synchronization: the watermark is not advanced
+    and no objects are removed, since neither a truncated page nor a failed count says anything about what is in Specify.
+    """
+
+    def __init__(self, specifyInterface, db=None, pageSize=500, reconcileInterval=86400) -> None:
+        """
+        CONSTRUCTOR
+        CONTRACT
+            specifyInterface (obj)    : Logged in API wrapper
+            db (DataAccess)           : Local database. Default: as set in the 'database' setting
+            pageSize (Integer)        : Number of objects fetched per request
+            reconcileInterval (float) : Seconds between reconciliations of the primary keys, regardless of the counts
+        """
+        self.sp = specifyInterface
+        self.db = db or data_access.getDataAccess()
+        self.pageSize = pageSize
+        self.reconcileInterval = reconcileInterval
+
+    def sync(self, sptype, reconcile=False):
+        """
+        Synchronize the mirror of an object type with Specify
+        CONTRACT
+            sptype (String)     : API name of the objects, e.g. 'taxon'
+            reconcile (boolean) : Whether to reconcile the primary keys for deletions regardless of counts and interval
+            RETURNS summary (dict) of the numbers of objects 'fetched' and 'deleted', the new 'watermark',
+                    whether the primary keys were 'reconciled' and the number of 'requests' made
+        """
+        start = time.time()
+        requests = self.requestCount()
+        state = self.db.getSyncState(sptype) or {}
+        watermark = state.get('watermark')
+
+        # Take the latest modification before fetching as the next watermark, so that objects modified while fetching
+        # are fetched again next time; objects modified at the watermark itself are fetched again as well (__gte)
+        latest = self.sp.getSpecifyObjects(sptype, 1, 0, {'timestampmodified__isnull': 'false'}, sort='-timestampmodified')
+        nextWatermark = latest[0]['timestampmodified'] if latest else watermark
+
+        filters = {'timestampmodified__gte': watermark} if watermark else {}
+        fetched = 0
+        batch = []
+        for obj in self.sp.iterateSpecifyObjects(sptype, filters, pageSize=self.pageSize, keyset=True):
+            batch.append(obj)
+            if len(batch) >= self.pageSize:
+                fetched += self.db.upsertObjects(sptype, batch)
+                batch = []
+        fetched += self.db.upsertObjects(sptype, batch)
+
+        # Only advance the watermark once all modified objects are fetched; a failed request raises before getting here, 
+        # so that the objects beyond it are fetched again next time
+        self.db.setSyncState(sptype, watermark=nextWatermark, syncedat=time.time(),
+                             **({} if watermark else {'reconciledat': time.time()}))
+
+        # Specify holding fewer objects than the mirror (whose objects are all up to date now) reveals deletions
+        deleted = 0
+        due = time.time() - (state.get('reconciledat') or 0) > self.reconcileInterval
+        reconciled = bool(watermark) and (reconcile or due or self.sp.countSpecifyObjects(sptype) < self.db.count(sptype))
+        if reconciled:
+            deleted = self.reconcile(sptype)
+            self.db.setSyncState(sptype, reconciledat=time.time())
+
+        summary = {'sptype': sptype, 'fetched': fetched, 'deleted': deleted, 'watermark': nextWatermark,
+                   'reconciled': reconciled, 'requests': self.requestCount() - requests}
+        util.logger.info(f'Synchronized {sptype} mirror in {time.time() - start:.1f}s: {summary}')
+        return summary
+
+    def syncAll(self, sptypes=DEFAULT_TYPES, reconcile=False):
+        """
+        Synchronize the mirrors of several object types
+        CONTRACT
+            RETURNS list of summaries (see sync)
+        """
+        return [self.sync(sptype, reconcile) for sptype in sptypes]
+
+    def reconcile(self, sptype):
+        """
+        Remove the mirrored objects of a type that no longer exist in Specify. 
+        Nothing is removed until all ranges are reconciled. 
+        CONTRACT
+            RETURNS number of objects removed
+            RAISES requests.HTTPError if a count or page could not be fetched
+        """
+        spids = self.db.getSpids(sptype)
+        if not spids: return 0
+        missing = self.reconcileRange(sptype, spids[0], spids[-1] + 1)
+        deleted = self.db.deleteObjects(sptype, missing)
+        if deleted: util.logger.info(f'Removed {deleted} {sptype} objects deleted in Specify from the mirror')
+        return deleted
+
+    def reconcileRange(self, sptype, low, high):
+        """
+        Find the primary keys in the range [low, high) that are mirrored but no longer in Specify. A range holding as
+        many objects in Specify as in the mirror is complete; otherwise it is split in two halves of mirrored objects,
+        until it is small enough to compare its primary keys directly.
+        """
+        spids = self.db.getSpids(sptype, low, high)
+        if not spids: return []
+        bounds = {'id__gte': low, 'id__lt': high}
+        if self.sp.countSpecifyObjects(sptype, bounds) >= len(spids):
+            return []
+        if len(spids) <= self.pageSize:
+            existing = {obj['id'] for obj in self.sp.iterateSpecifyObjects(sptype, bounds, pageSize=self.pageSize, keyset=True)}
+            return [spid for spid in spids if spid not in existing]
+        middle = spids[len(spids) // 2]
+        return self.reconcileRange(sptype, low, middle) + self.reconcileRange(sptype, middle, high)
+
+    def requestCount(self):
+        metrics = getattr(self.sp, 'metrics', None)
+        return sum(stats.count for stats in metrics.endpoints.values()) if metrics is not None else 0
+
+# Standalone execution entry point
+if __name__ == "__main__":
+    """
+    Synchronize the local mirror: python mirror_sync.py [mode] [object types ...] [--reconcile]
+    """
+    arguments = sys.argv[1:]
+    reconcile = '--reconcile' in arguments
+    arguments = [argument for argument in arguments if argument != '--reconcile']
+    mode = arguments.pop(0) if arguments and arguments[0] not in DEFAULT_TYPES else ''
+    sptypes = arguments or DEFAULT_TYPES
+
+    util.buildLogger()
+    with open(f"config/config{'.' + mode if mode else ''}.json", "r") as file:
+        config = json.load(file)
+
+    cfg = configuration.ConfigurationHandler()
+    cfg.applyConfiguration(config)
+    syncer = MirrorSync(cfg.sp, **config.get('mirrorSync', {}))
+    for summary in syncer.syncAll(sptypes, reconcile):
+        print(f"{summary['sptype']}: {summary['fetched']} fetched, {summary['deleted']} deleted, "
+              f"watermark {summary['watermark']}, {summary['requests']} requests")
@@ -82,6 +82,14 @@ class Collection(model.Model):
 
 # Specify Interfacing functions 
 
+    def fetch(self, spid=0):
+        """
+        Fetch the collection record from the Specify API, or from the metadata cache if configured
+        """
+        if spid == 0: spid = self.spid
+        jsonObject = self.sp.getMetadata(f'{self.sptype}/{spid}', lambda: self.sp.getSpecifyObject(self.sptype, spid))
+        self.fill(jsonObject)
+
     def fill(self, jsonObject, source="Specify"):
         """
         Function for filling collection model's fields with data record fetched from external source
@@ -111,7 +119,8 @@ class Collection(model.Model):
         Method for fetching the discipline from the Specify API and filling it with data
         """
         self.discipline = discipline.Discipline(self.id)
-        disciplineObj = self.sp.getSpecifyObject('discipline', self.disciplineId)
+        disciplineObj = self.sp.getMetadata(f'discipline/{self.disciplineId}', 
+                                            lambda: self.sp.getSpecifyObject('discipline', self.disciplineId))
         self.discipline.fill(disciplineObj, source)
 
 # Generic functions
@@ -27,6 +27,31 @@ class Discipline(model.Model):
         self.sptype  = 'discipline'
         self.taxontreedefid = 0
 
+    def getFieldsAsDict(self):
+        """
+        Generates a dictonary with database column names as keys and discipline record fields as values
+        RETURNS said dictionary for passing on to data access handler
+        """
+        fieldsDict = {
+                'id':               f'{self.id}',
+                'spid':             f'{self.spid}',
+                'name':             f'"{self.name}"',
+                'taxontreedefid':   f'{self.taxontreedefid}'
+                }
+
+        return fieldsDict
+
+    def setFields(self, record):
+        """
+        Function for setting discipline data field from record
+        CONTRACT
+           record: sqliterow object containing record data
+        """
+        self.id             = record['id']
+        self.spid           = record['spid']
+        self.name           = record['name']
+        self.taxontreedefid = record['taxontreedefid']
+
     def fill(self, jsonObject, source="Specify"):
         """
         Specific function for filling discipline instance's fields with data from record fetched from external source 
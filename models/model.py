@@ -18,6 +18,7 @@ import sys
 # Internal dependencies
 import global_settings as app
 import specify_interface
+import data_access
 
 # TODO Explain reason for below code
 current = os.path.dirname(os.path.realpath(__file__))
@@ -66,6 +67,13 @@ class Model:
 
     # Generic local database interfacing functions
 
+    @property
+    def db(self):
+        """
+        Local database as set in the 'database' setting, shared by all models (see data_access.py)
+        """
+        return data_access.getDataAccess()
+
     def save(self):
         """
         Function telling instance to save its data either as a new record (INSERT) or updating an existing one (UPDATE)
@@ -77,11 +85,15 @@ class Model:
         # Checking if Save is a novel record, or if it is updating existing record.
         if self.id > 0:
             # Record Id is not 0 therefore existing record to be updated
-            record = None #self.db.updateRow(self.table, self.id, self.getFieldsAsDict())
+            record = self.db.updateRow(self.table, self.id, self.getFieldsAsDict())
         else:
-            # Record Id is 0 therefore existing record to be created
-            record = None #self.db.insertRow(self.table, self.getFieldsAsDict())
-            #self.id = record['id']
+            record = None
+
+        if record is None:
+            # Record Id is 0 or not (yet) in the local database therefore new record to be created, 
+            # unless the Specify object is already in the local database, e.g. as mirrored 
+            record = self.db.saveRow(self.table, self.getFieldsAsDict())
+            self.id = record['id']
 
         return record
 
@@ -95,7 +107,7 @@ class Model:
 
         if id == 0: id = self.id
 
-        record = None #self.db.getRowOnId(self.table, id)
+        record = self.db.getRowOnId(self.table, id)
 
         if record is not None:
             self.setFields(record)
@@ -106,16 +118,16 @@ class Model:
         """
         TODO Function contract
         """
-        return self.load(self, self.id)
+        return self.load(self.id)
 
     def delete(self):
         """
         Function for deleting database record belonging to current instance
         CONTRACT
-           id: Primary key of current record
+           RETURNS boolean to indicate whether a record was deleted
         """
 
-        record = None #self.db.deleteRowOnId(self.table, self.id)
+        return self.db.deleteRowOnId(self.table, self.id)
 
     def getFieldsAsDict(self):
         """
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+  Created on October 16, 2026
+  @author: Fedor Alexander Steeman, NHMD
+  Copyright 2026 Natural History Museum of Denmark (NHMD)
+  Licensed under the Apache License, Version 2.0 (the "License");
+  you may not use this file except in compliance with the License.
+  You may obtain a copy of the License at
+  http://www.apache.org/licenses/LICENSE-2.0
+  Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the specific language governing permissions and limitations under the License.
+
+  PURPOSE: Prefix tree ("trie") of the distinct node paths found in the rows of a hierarchical data file
+"""
+
+# Internal Dependencies
+from models.tree_index import fold
+
+class PathNode:
+    """
+    Distinct node of a row path: a name in a given column under a given parent path
+    """
+
+    def __init__(self, name=None, index=None, row=None, parent=None) -> None:
+        """
+        CONSTRUCTOR
+        CONTRACT
+            name (String)      : Name of the node as given in the data file
+            index (Integer)    : Index of the column (header) the node was first found in
+            row (dict)         : First row containing the node, used for creating it
+            parent (PathNode)  : Node above, or None for the root of the trie
+        """
+        self.name = name
+        self.index = index
+        self.row = row
+        self.parent = parent
+        self.children = {}
+        self.rowNumbers = []    # Rows whose path passes through the node
+        self.id = None          # Primary key once resolved in Specify
+        self.error = None       # Error raised resolving the node or one of its ancestors
+        self.step = None        # Step of the plan once planned (see models/tree_plan.py)
+
+    @property
+    def depth(self):
+        return 0 if self.parent is None else self.parent.depth + 1
+
+class PathTrie:
+    """
+    Prefix tree of the row paths of a data file with a column per tree level. Rows sharing the start of their path
+    (e.g. "Main Site,General Collection") share the nodes of the trie, so that every distinct node can be resolved once.
+    Like TreeNodeTool.addChildNodes, the first column always makes up the first node of a path, empty cells in the
+    following columns are skipped and nodes under the same parent are told apart by name, regardless of case
+    (like the tree index, see tree_index.fold).
+    """
+
+    def __init__(self) -> None:
+        self.root = PathNode()
+        self.leaves = {}    # row number -> last node of the row's path
+
+    def add(self, headers, row, number):
+        """
+        Add the path of a row
+        CONTRACT
+            headers (list)   : Columns making up the path, from the top down
+            row (dict)       : Row as dictionary of column name to value
+            number (Integer) : Number of the row in the data file
+            RETURNS the last node of the path (PathNode)
+        """
+        node = self.root
+        for index, header in enumerate(headers):
+            name = row[header] if index == 0 else row[header].strip()
+            if index > 0 and name == '': continue
+            child = node.children.get(fold(name))
+            if child is None:
+                child = node.children[fold(name)] = PathNode(name, index, row, node)
+            child.rowNumbers.append(number)
+            node = child
+        self.leaves[number] = node
+        return node
+
+    def levels(self):
+        """
+        Get the nodes of the trie level by level (breadth-first), from the top down
+        CONTRACT
+            RETURNS list of levels, each a list of nodes (PathNode)
+        """
+        levels = []
+        level = list(self.root.children.values())
+        while level:
+            levels.append(level)
+            level = [child for node in level for child in node.children.values()]
+        return levels
+
+    def __len__(self) -> int:
+        return sum(len(level) for level in self.levels())
@@ -136,24 +136,21 @@ class Taxon(TreeNode):
     
     def getChildCount(self, specify_interface):
         """ 
-        Get the number of children for this taxon. If the children have not been retrieved yet, it will fetch them from the API.
+        Get the number of children for this taxon. If the children have not been retrieved yet, it will count them at the API without fetching them.
+        A failed count raises rather than being taken for a taxon without children. 
         """
         if len(self.children) > 0:
             return len(self.children)
         
-        self.getChildren(specify_interface)
-            
-        return len(self.children)
+        return specify_interface.countSpecifyObjects(self.sptype, filters={'parent': f'{self.id}'})
       
     def getChildren(self, specify_interface):
         """ 
-        
-
+        Get all children of this taxon from the API, fetched page by page. 
         """
         
         try:
-            childTaxonObj = specify_interface.getSpecifyObjects(self.sptype,limit=1000, offset=0, 
-                                                                filters={'parent': f'{self.id}'})
+            childTaxonObj = specify_interface.iterateSpecifyObjects(self.sptype, filters={'parent': f'{self.id}'})
             for childObj in childTaxonObj:
                 childTaxon = Taxon()
                 childTaxon.fill(childObj)
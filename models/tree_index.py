@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""
+  Created on October 16, 2026
+  @author: Fedor Alexander Steeman, NHMD
+  Copyright 2026 Natural History Museum of Denmark (NHMD)
+  Licensed under the Apache License, Version 2.0 (the "License");
+  you may not use this file except in compliance with the License.
+  You may obtain a copy of the License at
+  http://www.apache.org/licenses/LICENSE-2.0
+  Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the specific language governing permissions and limitations under the License.
+
+  PURPOSE: In-memory index of the nodes of a Specify tree (storage, taxon, ...) for looking up nodes without API calls
+"""
+
+import threading
+
+# Internal dependencies
+import util
+
+class TreeIndex:
+    """
+    Holds all nodes of one tree definition in memory, loaded once page by page, and indexes them on parent id and name
+    and on full name (narrowed down further on rank id, author etc.). Tools add the nodes they create, so that the index
+    stays current while the tool is running. Lookups answer the same filters as the Specify API would ('name', 'fullname',
+    'parent', 'rankid', 'author', 'definition'), returning matching nodes in order of primary key.
+    Text is compared case-insensitively, as the Specify database does (MySQL collation), so that the index finds the nodes
+    the API would have found.
+    NOTE Changes made to the tree by others while the index is in use are not seen.
+    """
+
+    # Filters the index can answer; queries with other filters are left to the API
+    FILTERS = {'name', 'fullname', 'parent', 'rankid', 'author', 'definition'}
+
+    def __init__(self, specifyInterface, sptype, treedef_id, pageSize=500) -> None:
+        """
+        CONSTRUCTOR
+        CONTRACT
+            specifyInterface (SpecifyInterface) : Logged in API interface for loading the tree
+            sptype (String)      : API name of the tree nodes, e.g. 'storage' or 'taxon'
+            treedef_id (Integer) : Primary key of the tree definition
+            pageSize (Integer)   : Number of nodes fetched per request when loading
+        """
+        self.sp = specifyInterface
+        self.sptype = sptype
+        self.treedef_id = int(treedef_id)
+        self.pageSize = pageSize
+        self.lock = threading.Lock()
+        self.nodes = {}         # id -> node
+        self.children = {}      # (parent id, name) -> ids
+        self.fullnames = {}     # fullname -> ids
+        self.rootId = None
+
+    def load(self):
+        """
+        Load all nodes of the tree definition from the API, page by page
+        CONTRACT
+            RETURNS the index itself
+        """
+        with self.lock:
+            self.nodes, self.children, self.fullnames, self.rootId = {}, {}, {}, None
+        for node in self.sp.iterateSpecifyObjects(self.sptype, {'definition': self.treedef_id}, pageSize=self.pageSize, keyset=True):
+            self.add(node)
+        util.logger.info(f'Indexed {len(self.nodes)} {self.sptype} nodes of tree definition {self.treedef_id}')
+        return self
+
+    def add(self, node):
+        """
+        Add a node (dict as returned by the API) to the index, e.g. after creating it
+        """
+        id = int(node['id'])
+        with self.lock:
+            self.nodes[id] = node
+            parent_id = uriId(node.get('parent'))
+            if parent_id is None and (self.rootId is None or id < self.rootId):
+                self.rootId = id
+            self.addKey(self.children, (parent_id, fold(node.get('name'))), id)
+            self.addKey(self.fullnames, fold(node.get('fullname')), id)
+
+    def addKey(self, index, key, id):
+        ids = index.setdefault(key, [])
+        if id not in ids:
+            ids.append(id)
+            ids.sort()
+
+    def remove(self, id):
+        """
+        Remove a node from the index, e.g. after deleting or merging it
+        """
+        with self.lock:
+            node = self.nodes.pop(int(id), None)
+            if node is None: return
+            for index, key in ((self.children, (uriId(node.get('parent')), fold(node.get('name')))),
+                               (self.fullnames, fold(node.get('fullname')))):
+                ids = index.get(key, [])
+                if int(id) in ids: ids.remove(int(id))
+
+    def root(self):
+        """
+        Get the root node of the tree, or None if the tree has no nodes
+        """
+        return self.nodes.get(self.rootId)
+
+    def get(self, id):
+        """
+        Get a node by primary key, or None if not indexed
+        """
+        return self.nodes.get(int(id))
+
+    def answers(self, filters):
+        """
+        Whether a query with the given filters can be answered from the index
+        """
+        return set(filters) <= self.FILTERS and ('fullname' in filters or ('parent' in filters and 'name' in filters))
+
+    def query(self, filters, limit=None):
+        """
+        Get the nodes matching the filters, in order of primary key
+        CONTRACT
+            filters (dict)  : Case-insensitive match filters on 'name', 'fullname', 'parent', 'rankid', 'author' and 'definition';
+                              must include 'fullname', or 'parent' and 'name' (see answers)
+            limit (Integer) : Maximum number of nodes to return
+            RETURNS list of nodes (dict)
+        """
+        if not self.answers(filters):
+            raise ValueError(f'Tree index cannot answer query on {sorted(filters)}')
+        if 'definition' in filters and uriId(filters['definition']) != self.treedef_id:
+            return []
+
+        with self.lock:
+            if 'fullname' in filters:
+                candidates = list(self.fullnames.get(fold(filters['fullname']), []))
+            else:
+                candidates = list(self.children.get((uriId(filters['parent']), fold(filters['name'])), []))
+            matches = [self.nodes[id] for id in candidates if self.matches(self.nodes[id], filters)]
+
+        return matches[:limit] if limit else matches
+
+    def matches(self, node, filters):
+        for key, value in filters.items():
+            if key == 'definition': continue
+            if key == 'parent':
+                if uriId(node.get('parent')) != uriId(value): return False
+            elif key == 'rankid':
+                if node.get('rankid') != int(value): return False
+            elif fold(node.get(key)) != fold(value):
+                return False
+        return True
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    def __str__(self) -> str:
+        return f'TreeIndex: {len(self.nodes)} {self.sptype} nodes of tree definition {self.treedef_id}'
+
+def fold(value):
+    """
+    Get the key for comparing a text value case-insensitively; other values are returned as they are
+    """
+    return value.casefold() if isinstance(value, str) else value
+
+def uriId(value):
+    """
+    Get the primary key from a resource URI (e.g. '/api/specify/storage/5/') or id, or None if absent
+    """
+    if value is None or value == '':
+        return None
+    if isinstance(value, str) and '/' in value:
+        return int(value.rstrip('/').split('/')[-1])
+    return int(value)
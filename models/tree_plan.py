@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+  Created on October 16, 2026
+  @author: Fedor Alexander Steeman, NHMD
+  Copyright 2026 Natural History Museum of Denmark (NHMD)
+  Licensed under the Apache License, Version 2.0 (the "License");
+  you may not use this file except in compliance with the License.
+  You may obtain a copy of the License at
+  http://www.apache.org/licenses/LICENSE-2.0
+  Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the specific language governing permissions and limitations under the License.
+
+  PURPOSE: Plan of the tree nodes to create for a data file, serialized as JSON lines between planning and applying it
+"""
+
+import json
+
+class TreePlan:
+    """
+    Plan of a tree import: one step per distinct node of the data file, either an existing node ('exists', with its id)
+    or a node to create ('create'). A step refers to its parent either by primary key ('parent') if the parent exists,
+    or by the number of the parent's step ('parentStep') if the parent is created by the plan as well. Steps are
+    numbered in order of their level, so the nodes of a level can be created at the same time once the level above is.
+    Serialized as JSON lines: a header line with the summary of the plan followed by a line per step.
+    """
+
+    def __init__(self, header=None, steps=None) -> None:
+        """
+        CONSTRUCTOR
+        CONTRACT
+            header (dict) : Summary of the plan, e.g. 'tool', 'sptype', 'treedef', 'datafile' and 'rows'
+            steps (list)  : Steps (dict) in order of their numbers
+        """
+        self.header = dict(header or {})
+        self.steps = list(steps or [])
+
+    def addStep(self, step):
+        """
+        Number a step and add it to the plan
+        CONTRACT
+            RETURNS the step (dict)
+        """
+        step['step'] = len(self.steps) + 1
+        self.steps.append(step)
+        return step
+
+    def creates(self):
+        return [step for step in self.steps if step['action'] == 'create']
+
+    def levels(self):
+        """
+        Get the steps creating nodes grouped by level, from the top down
+        CONTRACT
+            RETURNS list of levels, each a list of steps (dict)
+        """
+        levels = {}
+        for step in self.creates():
+            levels.setdefault(step['level'], []).append(step)
+        return [levels[level] for level in sorted(levels)]
+
+    def apiCalls(self):
+        """
+        Get the number of API requests applying the plan takes per method: a POST per node created and a lookup (GET)
+        per node created under an existing node, checking that it was not created since planning (see TreeNodeTool.applyPlan)
+        """
+        creates = self.creates()
+        return {'POST': len(creates), 'GET': len([step for step in creates if step.get('parentStep') is None])}
+
+    def summarize(self):
+        """
+        Complete the header with the numbers of steps, nodes to create, existing nodes, levels and API calls
+        CONTRACT
+            RETURNS the header (dict)
+        """
+        creates = self.creates()
+        self.header.update(steps=len(self.steps), creates=len(creates), existing=len(self.steps) - len(creates),
+                           levels=len(self.levels()), apiCalls=self.apiCalls())
+        return self.header
+
+    def write(self, path):
+        """
+        Write the plan as JSON lines to file
+        """
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(json.dumps({'plan': self.summarize()}) + '\n')
+            for step in self.steps:
+                file.write(json.dumps(step) + '\n')
+
+    @classmethod
+    def read(cls, path):
+        """
+        Read a plan written to file
+        CONTRACT
+            RETURNS the plan (TreePlan)
+        """
+        with open(path, 'r', encoding='utf-8') as file:
+            lines = [json.loads(line) for line in file if line.strip()]
+        if not lines or 'plan' not in lines[0]:
+            raise ValueError(f'Not a plan file: {path}')
+        return cls(lines[0]['plan'], lines[1:])
+
+    def __str__(self) -> str:
+        header = self.summarize()
+        return (f"Plan for {header.get('datafile')}: {header['rows']} rows, {header['steps']} distinct nodes "
+                f"({header['existing']} existing, {header['creates']} to create in {header['levels']} levels), "
+                f"{header['apiCalls']['POST']} POST and {header['apiCalls']['GET']} GET requests to apply")
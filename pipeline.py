@@ -0,0 +1,276 @@
+# -*- coding: utf-8 -*-
+"""
+  Created on October 16, 2026
+  @author: Fedor Alexander Steeman, NHMD
+  Copyright 2026 Natural History Museum of Denmark (NHMD)
+  Licensed under the Apache License, Version 2.0 (the "License");
+  you may not use this file except in compliance with the License.
+  You may obtain a copy of the License at
+  http://www.apache.org/licenses/LICENSE-2.0
+  Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the specific language governing permissions and limitations under the License.
+
+  PURPOSE: Streaming pipeline of processing stages connected by bounded queues, each stage with its own worker threads
+"""
+
+import time
+import queue
+import threading
+import traceback
+
+# Internal Dependencies
+import util
+
+# Returned by a stage function to drop an item, e.g. an invalid row
+SKIP = object()
+
+# Marks the end of the items in a queue
+DONE = object()
+
+class Stage():
+    """
+    Stage of a pipeline: a function applied to every item by a number of worker threads
+    """
+
+    def __init__(self, name, function, workers=1, ordered=False, before=None) -> None:
+        """
+        CONSTRUCTOR
+        CONTRACT
+            name (String)       : Name of the stage, e.g. 'validate'
+            function (function) : Function taking an item and returning the item passed on to the next stage, or SKIP
+            workers (Integer)   : Number of worker threads
+            ordered (boolean)   : Whether items are started in the order they entered the pipeline
+            before (function)   : Optional function called with each item in order before it is started (ordered stages only)
+        """
+        self.name = name
+        self.function = function
+        self.workers = max(1, int(workers))
+        self.ordered = ordered
+        self.before = before
+        self.lock = threading.Lock()
+        self.items = 0          # Items processed
+        self.busy = 0.0         # Seconds spent in the function, summed over the workers
+        self.blocked = 0.0      # Seconds waiting for room in the queue of the next stage (back-pressure)
+        self.depthSum = 0       # Sum, number and maximum of the depths of the input queue, sampled as items are taken
+        self.depthCount = 0
+        self.depthMax = 0
+        self.first = None       # Time the first item was started
+        self.last = None        # Time the last item was finished
+        self.sequenced = 0      # Number of the last item passed on in order (ordered stages only)
+        self.reordered = 0      # Largest number of items held back waiting for an earlier item (ordered stages only)
+
+    def throughput(self):
+        """
+        Items processed per second between the first item started and the last item finished
+        """
+        if not self.items or self.last is None: return 0.0
+        return self.items / max(self.last - self.first, 1e-9)
+
+    def sampleDepth(self, depth):
+        with self.lock:
+            self.depthSum += depth
+            self.depthCount += 1
+            self.depthMax = max(self.depthMax, depth)
+
+    def averageDepth(self):
+        return self.depthSum / self.depthCount if self.depthCount else 0.0
+
+    def __str__(self) -> str:
+        return f'Stage {self.name}: {self.items} items on {self.workers} workers, {self.throughput():.1f} items/s'
+
+class Pipeline():
+    """
+    Streams items through a sequence of stages, e.g. parse -> validate -> resolve -> write for the rows of a data file.
+    Stages are connected by bounded queues: a stage whose next stage falls behind blocks once the queue in between is
+    full (back-pressure), so that only a bounded number of items is held in memory and CPU bound stages overlap with
+    stages waiting on the network. Items are numbered in order of entering the pipeline; items dropped (SKIP) or failed
+    in a stage continue as placeholders, so that ordered stages can start the remaining items in order.
+    Items waiting for an earlier item in front of an ordered stage are bounded as well: no item enters the pipeline
+    more than queueSize x workers items ahead of the last item an ordered stage has started, so one stalled item holds
+    back the items behind it rather than letting them pile up.
+    A failing item does not stop the pipeline; failures are collected with their stage and error. An exception reading
+    the items or ordering them stops reading further items; the items read finish and run raises the exception.
+    """
+
+    def __init__(self, stages, queueSize=100, metrics=None) -> None:
+        """
+        CONSTRUCTOR
+        CONTRACT
+            stages (list)            : Stages (Stage) in order of processing
+            queueSize (Integer)      : Maximum number of items waiting in front of each stage
+            metrics (RequestMetrics) : Optional request metrics to add the throughput and queue depths of the stages to
+        """
+        self.stages = stages
+        self.queueSize = max(1, int(queueSize))
+        self.metrics = metrics
+        self.results = {}
+        self.failures = []
+        self.lock = threading.Lock()
+        self.progress = threading.Condition()   # Notified as ordered stages start items
+        self.error = None                       # Exception aborting the pipeline, e.g. raised reading the items
+
+    def run(self, items):
+        """
+        Stream the items through all stages and wait for them to finish
+        CONTRACT
+            items (iterable) : Items to process, read as the first stage has room for them
+            RETURNS list of (number, result) of the items passing all stages, in order of the items
+            RAISES the exception raised reading the items or ordering them (see Stage 'before'), once all threads finished
+        """
+        queues = [queue.Queue(self.queueSize) for _ in self.stages] + [queue.Queue()]
+        threads = [threading.Thread(target=self.feed, args=(items, queues[0], self.consumers(0)), name='sp7pipe-feed', daemon=True)]
+        for index, stage in enumerate(self.stages):
+            source = queues[index]
+            if stage.ordered:
+                source = queue.Queue(self.queueSize)
+                threads.append(threading.Thread(target=self.sequence, args=(stage, queues[index], source),
+                                                name=f'sp7pipe-{stage.name}-order', daemon=True))
+            remaining = [stage.workers]
+            for worker in range(stage.workers):
+                threads.append(threading.Thread(target=self.work, args=(index, stage, source, queues[index + 1], remaining),
+                                                name=f'sp7pipe-{stage.name}-{worker}', daemon=True))
+        for thread in threads: thread.start()
+        for thread in threads: thread.join()
+
+        self.reportMetrics()
+        if self.error is not None:
+            raise self.error
+        return sorted(self.results.items())
+
+    def consumers(self, index):
+        """
+        Number of threads taking items from the queue in front of a stage, each to be told when there are no more items
+        """
+        if index >= len(self.stages): return 1
+        return 1 if self.stages[index].ordered else self.stages[index].workers
+
+    def feed(self, items, output, consumers):
+        number = 0
+        try:
+            for number, item in enumerate(items, start=1):
+                self.waitForWindow(number)
+                if self.error is not None: break
+                output.put((number, item))
+        except Exception as e:
+            util.logger.error(f'Reading items failed after item {number}: {e}')
+            self.abort(e)
+        finally:
+            # The stages behind always learn that there are no more items, so that the pipeline finishes
+            for _ in range(consumers): output.put(DONE)
+
+    def abort(self, error):
+        """
+        Stop reading items after an exception that is not the failure of a single item, to be raised by run
+        """
+        util.logger.debug(''.join(traceback.format_exception(error)))
+        with self.progress:
+            if self.error is None: self.error = error
+            self.progress.notify_all()
+
+    def waitForWindow(self, number):
+        """
+        Wait until an item is within queueSize x workers items of the last item started by every ordered stage
+        """
+        window = [stage for stage in self.stages if stage.ordered]
+        if not window: return
+        with self.progress:
+            self.progress.wait_for(lambda: self.error is not None or all(number - stage.sequenced <= self.queueSize * stage.workers for stage in window))
+
+    def sequence(self, stage, source, output):
+        """
+        Pass the items on to the workers of an ordered stage in order of their numbers
+        """
+        waiting = {}
+        nextNumber = 1
+        entry = None
+        try:
+            while True:
+                entry = source.get()
+                if entry is DONE: break
+                waiting[entry[0]] = entry
+                stage.reordered = max(stage.reordered, len(waiting))
+                while nextNumber in waiting:
+                    number, item = waiting.pop(nextNumber)
+                    if item is not SKIP and stage.before is not None:
+                        stage.before(item)
+                    output.put((number, item))
+                    nextNumber += 1
+                with self.progress:
+                    stage.sequenced = nextNumber - 1
+                    self.progress.notify_all()
+            for number in sorted(waiting):
+                output.put(waiting[number])
+        except Exception as e:
+            util.logger.error(f'Ordering item {nextNumber} failed in stage {stage.name}: {e}')
+            self.abort(e)
+            # Take the remaining items off the queue, so that the stage before is not blocked putting them
+            while entry is not DONE:
+                entry = source.get()
+        finally:
+            for _ in range(stage.workers): output.put(DONE)
+
+    def work(self, index, stage, source, output, remaining):
+        """
+        Worker thread of a stage: apply the stage function to items until there are no more
+        """
+        while True:
+            stage.sampleDepth(source.qsize())
+            entry = source.get()
+            if entry is DONE: break
+            number, item = entry
+
+            if item is not SKIP:
+                started = time.time()
+                try:
+                    item = stage.function(item)
+                except Exception as e:
+                    util.logger.error(f'Item {number} failed in stage {stage.name}: {e}')
+                    util.logger.debug(''.join(traceback.format_exception(e)))
+                    with self.lock:
+                        self.failures.append({'number': number, 'stage': stage.name, 'item': entry[1], 'error': str(e)})
+                    item = SKIP
+                finished = time.time()
+                with stage.lock:
+                    stage.items += 1
+                    stage.busy += finished - started
+                    stage.first = started if stage.first is None else min(stage.first, started)
+                    stage.last = finished if stage.last is None else max(stage.last, finished)
+
+            if index == len(self.stages) - 1:
+                if item is not SKIP:
+                    with self.lock:
+                        self.results[number] = item
+                continue
+            waited = time.time()
+            output.put((number, item))
+            with stage.lock:
+                stage.blocked += time.time() - waited
+
+        # The last worker of a stage tells the next stage that there are no more items
+        with stage.lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if last and index < len(self.stages) - 1:
+            for _ in range(self.consumers(index + 1)): output.put(DONE)
+
+    def reportMetrics(self):
+        if self.metrics is None: return
+        for stage in self.stages:
+            self.metrics.count(f'pipeline.{stage.name}.items', stage.items)
+            self.metrics.setGauge(f'pipeline.{stage.name}.itemsPerSecond', round(stage.throughput(), 1))
+            if stage.depthCount:
+                self.metrics.setGauge(f'pipeline.{stage.name}.queueDepth', stage.depthMax)
+
+    def report(self):
+        """
+        Format the throughput, utilization, queue depths and back-pressure of the stages as a table for printing
+        """
+        lines = [f'{"Stage":<12}{"Workers":>8}{"Items":>8}{"Items/s":>10}{"Busy %":>8}{"Queue avg":>10}{"Queue max":>10}{"Blocked s":>10}']
+        for stage in self.stages:
+            wall = (stage.last - stage.first) if stage.items and stage.last is not None else 0.0
+            busy = 100 * stage.busy / (wall * stage.workers) if wall > 0 else 0.0
+            lines.append(f'{stage.name:<12}{stage.workers:>8}{stage.items:>8}{stage.throughput():>10.1f}{busy:>8.0f}'
+                         f'{stage.averageDepth():>10.1f}{stage.depthMax:>10}{stage.blocked:>10.2f}')
+        return '\n'.join(lines)
+
+    def __str__(self) -> str:
+        return f'Pipeline: {" -> ".join(stage.name for stage in self.stages)}'
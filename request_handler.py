@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+"""
+  Created on October 16, 2026
+  @author: Fedor Alexander Steeman, NHMD
+  Copyright 2026 Natural History Museum of Denmark (NHMD)
+  Licensed under the Apache License, Version 2.0 (the "License");
+  you may not use this file except in compliance with the License.
+  You may obtain a copy of the License at
+  http://www.apache.org/licenses/LICENSE-2.0
+  Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the specific language governing permissions and limitations under the License.
+
+  PURPOSE: Request layer shared by the API interfaces, retrying transient failures with jittered exponential backoff
+           and recording request metrics
+"""
+
+import time
+import random
+import threading
+import requests
+
+# Internal Dependencies
+import util
+from request_metrics import RequestMetrics, endpointTemplate
+
+class RetryPolicy():
+    """
+    Determines which failed requests are retried, how many times and how long to wait in between.
+    Transient failures are connection errors, timeouts and the response status codes given (by default 429, 502, 503 and 504).
+    Only idempotent HTTP methods are retried by default. Other methods (POST) are only retried when the caller
+    provides an existence check for finding out whether a failed attempt took effect after all (see RequestHandler.request).
+    Timeouts (incl. 504 Gateway Timeout) can be excluded for long running requests that may still be in progress at the server.
+    The waiting time before retry n is drawn at random between 0 and min(backoffMax, backoffBase * 2^n) ("full jitter"),
+    so that many concurrent clients failing at the same time do not retry in lockstep.
+    """
+
+    def __init__(self, maxAttempts=4, backoffBase=0.5, backoffMax=30.0, retryStatuses=(429, 502, 503, 504),
+                 idempotentMethods=('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'), methodAttempts={}) -> None:
+        """
+        CONSTRUCTOR
+        CONTRACT
+            maxAttempts (Integer)     : Maximum number of attempts per request incl. the first one (1 disables retrying)
+            backoffBase (float)       : Seconds of the backoff window before the first retry, doubling with each retry
+            backoffMax (float)        : Maximum seconds of the backoff window
+            retryStatuses (list)      : Response status codes considered transient
+            idempotentMethods (list)  : HTTP methods that are safe to send again
+            methodAttempts (dict)     : Maximum number of attempts per HTTP method overriding maxAttempts, e.g. {'POST': 2}
+        """
+        self.maxAttempts = maxAttempts
+        self.backoffBase = backoffBase
+        self.backoffMax = backoffMax
+        self.retryStatuses = set(retryStatuses)
+        self.idempotentMethods = {method.upper() for method in idempotentMethods}
+        self.methodAttempts = {method.upper(): attempts for method, attempts in methodAttempts.items()}
+
+    def attempts(self, method, recoverable=False):
+        """
+        Get the maximum number of attempts for a request
+        CONTRACT
+            method (String)       : HTTP method of the request
+            recoverable (boolean) : Whether the caller can check if a failed attempt took effect
+            RETURNS number of attempts (Integer)
+        """
+        method = method.upper()
+        if method not in self.idempotentMethods and not recoverable:
+            return 1
+        return max(1, self.methodAttempts.get(method, self.maxAttempts))
+
+    def isTransient(self, response=None, error=None, retryTimeouts=True):
+        """
+        Determine whether the outcome of an attempt is a transient failure worth retrying
+        CONTRACT
+            retryTimeouts (boolean) : Whether timeouts and 504 responses count as transient
+        """
+        if error is not None:
+            if isinstance(error, requests.Timeout) and not isinstance(error, requests.ConnectTimeout):
+                return retryTimeouts # A read timeout leaves the request possibly running at the server 
+            return isinstance(error, requests.ConnectionError)
+        if response is not None and response.status_code == 504 and not retryTimeouts:
+            return False
+        return response is not None and response.status_code in self.retryStatuses
+
+    def backoff(self, retry, response=None):
+        """
+        Get the number of seconds to wait before the given retry (1 for the first retry).
+        A 'Retry-After' header in seconds sent along with the failed response takes precedence.
+        """
+        if response is not None:
+            retryAfter = response.headers.get('Retry-After', '')
+            if retryAfter.isdigit():
+                return min(float(retryAfter), self.backoffMax)
+        return random.uniform(0, min(self.backoffMax, self.backoffBase * 2 ** (retry - 1)))
+
+class RecoveredResponse():
+    """
+    Stand-in for the response of a request that failed in transit, but was found to have taken effect by an existence check
+    """
+
+    def __init__(self, status_code, payload=None) -> None:
+        self.status_code = status_code
+        self.reason = 'Recovered'
+        self.payload = payload
+        self.text = '' if payload is None else str(payload)
+        self.headers = {}
+        self.ok = status_code < 400
+
+    def json(self):
+        return self.payload
+
+class RequestHandler():
+    """
+    Sends the HTTP requests of an API interface through a shared session, applying the retry policy
+    and recording the outcome of every request in the request metrics.
+    Every request of the interface passes through the 'request' method, which makes it the single place
+    to add cross-cutting request handling.
+    """
+
+    def __init__(self, session=None, retryPolicy=None, metrics=None, cassette=None, limiter=None) -> None:
+        """
+        CONSTRUCTOR
+        CONTRACT
+            session (requests.Session) : Session holding cookies and connection pool. A new one is created if omitted.
+            retryPolicy (RetryPolicy)  : Policy for retrying transient failures. Default policy if omitted.
+            metrics (RequestMetrics)   : Request metrics to record to. New metrics are created if omitted.
+            cassette (Cassette)        : Optional cassette recording the requests or replaying recorded responses
+            limiter (AdaptiveConcurrencyLimiter) : Optional limit on the number of requests in flight (see concurrency_limiter.py)
+        """
+        self.session = session if session is not None else requests.Session()
+        self.retryPolicy = retryPolicy if retryPolicy is not None else RetryPolicy()
+        self.metrics = metrics if metrics is not None else RequestMetrics()
+        self.cassette = cassette
+        self.limiter = limiter
+        if limiter is not None:
+            self.metrics.setGauge('concurrencyLimit', limiter.limit)
+        # Number of retries, counted under a lock, since the handler is shared by the threads sending requests
+        self.retries = 0
+        self.lock = threading.Lock()
+
+    def request(self, method, url, recover=None, retryTimeouts=True, **kwargs):
+        """
+        Send a request, retrying transient failures according to the retry policy.
+        Before sending a non-idempotent request again, the existence check 'recover' is called to find out whether
+        the failed attempt took effect after all; if so, its result is returned instead of sending the request again.
+        CONTRACT
+            method (String)    : HTTP method, e.g. 'GET'
+            url (String)       : URL of the request
+            recover (function) : Optional existence check returning a response (e.g. RecoveredResponse) if the request
+                                 already took effect, or None if it should be sent again
+            retryTimeouts (boolean) : Whether to retry timeouts and 504 responses. Should be False for requests that may 
+                                 still be running at the server after timing out, which the existence check cannot tell apart 
+                                 from requests that did not take effect
+            kwargs             : Further arguments passed on to requests.Session.request, e.g. headers, json, timeout
+            RETURNS response of the last attempt
+            RAISES requests.RequestException if the last attempt failed without response
+        """
+        method = method.upper()
+        attempts = self.retryPolicy.attempts(method, recover is not None)
+        start = time.perf_counter()
+
+        attempt = 1
+        while True:
+            response, error = None, None
+            try:
+                response = self.send(method, url, **kwargs)
+            except requests.RequestException as e:
+                error = e
+
+            if attempt >= attempts or not self.retryPolicy.isTransient(response, error, retryTimeouts):
+                break
+
+            delay = self.retryPolicy.backoff(attempt, response)
+            outcome = error.__class__.__name__ if error is not None else response.status_code
+            util.logger.warning(f'{method} {url} failed ({outcome}); retry {attempt}/{attempts - 1} in {delay:.2f}s')
+            time.sleep(delay)
+            attempt += 1
+            with self.lock:
+                self.retries += 1
+
+            if recover is not None:
+                recovered = recover()
+                if recovered is not None:
+                    util.logger.info(f'{method} {url} took effect despite failure; not sent again')
+                    response, error = recovered, None
+                    break
+
+        self.record(method, url, response, time.perf_counter() - start, attempt - 1)
+        if error is not None:
+            raise error
+        return response
+
+    def send(self, method, url, **kwargs):
+        """
+        Send a single attempt of a request, through the cassette if one is used (see cassette.py), 
+        once the concurrency limiter, if any, allows for another request in flight
+        """
+        if self.limiter is None:
+            return self.transmit(method, url, **kwargs)
+
+        ticket = self.limiter.acquire()
+        start = time.perf_counter()
+        overloaded = True
+        try:
+            response = self.transmit(method, url, **kwargs)
+            overloaded = response.status_code == 429 or response.status_code > 499
+            return response
+        except requests.RequestException as e:
+            overloaded = isinstance(e, (requests.ConnectionError, requests.Timeout))
+            raise
+        finally:
+            self.limiter.release(ticket, time.perf_counter() - start, overloaded)
+            self.metrics.setGauge('concurrencyLimit', self.limiter.limit)
+
+    def transmit(self, method, url, **kwargs):
+        if self.cassette is not None:
+            return self.cassette.send(self.session, method, url, **kwargs)
+        return self.session.request(method, url, **kwargs)
+
+    def record(self, method, url, response, latency, retries):
+        """
+        Record the outcome of a request in the request metrics
+        """
+        status, requestBytes, responseBytes = 'error', 0, 0
+        if response is not None:
+            status = response.status_code
+            request = getattr(response, 'request', None)
+            body = getattr(request, 'body', None)
+            requestBytes = len(body) if body else int(getattr(request, 'headers', {}).get('Content-Length', 0))
+            content = getattr(response, 'content', None)
+            responseBytes = len(content) if content else 0
+        self.metrics.record(method, endpointTemplate(url), status, latency, requestBytes, responseBytes, retries)
@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+"""
+  Created on October 16, 2026
+  @author: Fedor Alexander Steeman, NHMD
+  Copyright 2026 Natural History Museum of Denmark (NHMD)
+  Licensed under the Apache License, Version 2.0 (the "License");
+  you may not use this file except in compliance with the License.
+  You may obtain a copy of the License at
+  http://www.apache.org/licenses/LICENSE-2.0
+  Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the specific language governing permissions and limitations under the License.
+
+  PURPOSE: Per-endpoint request metrics (count, latency percentiles, bytes, retries) for performance reports
+"""
+
+import csv
+import math
+import time
+import threading
+import urllib.parse
+from array import array
+from collections import Counter
+
+def endpointTemplate(url):
+    """
+    Derive the endpoint template from a request URL, so that requests for different objects are grouped together,
+    e.g. '.../api/specify/taxon/123/?limit=1' becomes 'api/specify/{table}/{id}/'
+    CONTRACT
+        url (String) : URL of the request
+        RETURNS endpoint template (String)
+    """
+    segments = [segment for segment in urllib.parse.urlsplit(url).path.split('/') if segment]
+    for index, segment in enumerate(segments):
+        if segment.isdigit():
+            segments[index] = '{id}'
+        elif index == 2 and segments[0] == 'api' and segments[1] == 'specify':
+            segments[index] = '{table}'
+        elif index == 2 and segments[0] == 'api' and segments[1] == 'specify_tree':
+            segments[index] = '{tree}'
+    return '/'.join(segments) + '/'
+
+def percentile(sortedValues, fraction):
+    """
+    Get the percentile of sorted values using the nearest rank method, e.g. fraction 0.95 for p95
+    """
+    if not sortedValues: return 0.0
+    rank = max(1, math.ceil(fraction * len(sortedValues)))
+    return sortedValues[rank - 1]
+
+class EndpointStats():
+    """
+    Accumulated measurements of the requests to a single endpoint template with a single HTTP method
+    """
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.latencies = array('d')
+        self.statuses = Counter()
+        self.requestBytes = 0
+        self.responseBytes = 0
+        self.retries = 0
+
+    def merge(self, other):
+        self.count += other.count
+        self.latencies.extend(other.latencies)
+        self.statuses.update(other.statuses)
+        self.requestBytes += other.requestBytes
+        self.responseBytes += other.responseBytes
+        self.retries += other.retries
+
+    @property
+    def errors(self):
+        return sum(count for status, count in self.statuses.items() if not isinstance(status, int) or status > 399)
+
+class RequestMetrics():
+    """
+    Thread-safe collection of request measurements per HTTP method and endpoint template.
+    Metrics of several interfaces (or runs) can be combined using merge, e.g. for a report covering
+    both the Specify and the GBIF interface.
+    """
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.endpoints = {}
+        self.gauges = {}
+        self.counters = Counter()
+        self.started = time.time()
+
+    def __getstate__(self):
+        # The lock cannot be pickled, e.g. for returning metrics from a worker process
+        state = self.__dict__.copy()
+        del state['lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def setGauge(self, name, value):
+        """
+        Set the current value of a named gauge, e.g. the concurrency limit, keeping track of its extremes
+        """
+        with self.lock:
+            gauge = self.gauges.get(name)
+            if gauge is None:
+                self.gauges[name] = {'current': value, 'min': value, 'max': value}
+            else:
+                gauge.update(current=value, min=min(gauge['min'], value), max=max(gauge['max'], value))
+
+    def count(self, name, increment=1):
+        """
+        Add to a named counter, e.g. the number of coalesced get-or-create calls
+        """
+        with self.lock:
+            self.counters[name] += increment
+
+    def record(self, method, endpoint, status, latency, requestBytes=0, responseBytes=0, retries=0):
+        """
+        Record a completed request
+        CONTRACT
+            method (String)         : HTTP method
+            endpoint (String)       : Endpoint template (see endpointTemplate)
+            status (Integer)        : Response status code or 'error' if no response was received
+            latency (float)         : Seconds from sending the request until the final response, including retries
+            requestBytes (Integer)  : Size of the request body
+            responseBytes (Integer) : Size of the response body
+            retries (Integer)       : Number of times the request was sent again
+        """
+        with self.lock:
+            stats = self.endpoints.get((method, endpoint))
+            if stats is None:
+                stats = self.endpoints[(method, endpoint)] = EndpointStats()
+            stats.count += 1
+            stats.latencies.append(latency)
+            stats.statuses[status] += 1
+            stats.requestBytes += requestBytes
+            stats.responseBytes += responseBytes
+            stats.retries += retries
+
+    def merge(self, other):
+        """
+        Add the measurements of another RequestMetrics instance to this one
+        """
+        with self.lock:
+            for key, stats in list(other.endpoints.items()):
+                self.endpoints.setdefault(key, EndpointStats()).merge(stats)
+            for name, gauge in list(other.gauges.items()):
+                mine = self.gauges.setdefault(name, dict(gauge))
+                mine.update(current=gauge['current'], min=min(mine['min'], gauge['min']), max=max(mine['max'], gauge['max']))
+            self.counters.update(other.counters)
+            self.started = min(self.started, other.started)
+
+    def reset(self):
+        """
+        Discard all measurements
+        """
+        with self.lock:
+            self.endpoints = {}
+            self.gauges = {}
+            self.counters = Counter()
+            self.started = time.time()
+
+    def summary(self):
+        """
+        Summarize the measurements per endpoint, sorted by total time spent descending
+        CONTRACT
+            RETURNS list of dictionaries with 'method', 'endpoint', 'count', 'errors', 'retries', 'p50', 'p95', 'p99', 'max'
+                    and 'total' (seconds), 'requestBytes', 'responseBytes' and 'statuses'
+        """
+        rows = []
+        with self.lock:
+            for (method, endpoint), stats in self.endpoints.items():
+                latencies = sorted(stats.latencies)
+                rows.append({'method': method, 'endpoint': endpoint, 'count': stats.count, 'errors': stats.errors,
+                             'retries': stats.retries, 'p50': percentile(latencies, 0.50),
+                             'p95': percentile(latencies, 0.95), 'p99': percentile(latencies, 0.99),
+                             'max': latencies[-1] if latencies else 0.0, 'total': sum(latencies),
+                             'requestBytes': stats.requestBytes, 'responseBytes': stats.responseBytes,
+                             'statuses': ' '.join(f'{status}:{count}' for status, count in sorted(stats.statuses.items(), key=str))})
+        return sorted(rows, key=lambda row: row['total'], reverse=True)
+
+    def report(self, wallTime=None):
+        """
+        Format the summary as a table for printing
+        CONTRACT
+            wallTime (float) : Seconds the run took. Default: time since the metrics were started or reset
+            RETURNS report (String)
+        """
+        wallTime = wallTime if wallTime is not None else time.time() - self.started
+        rows = self.summary()
+        lines = [f'Request metrics: {sum(row["count"] for row in rows)} requests in {wallTime:.2f}s wall time',
+                 f'{"Method":<7}{"Endpoint":<42}{"Count":>8}{"Errors":>7}{"Retries":>8}'
+                 f'{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}{"Total s":>10}{"KB out":>9}{"KB in":>10}']
+        for row in rows:
+            lines.append(f'{row["method"]:<7}{row["endpoint"]:<42}{row["count"]:>8}{row["errors"]:>7}{row["retries"]:>8}'
+                         f'{row["p50"] * 1000:>9.1f}{row["p95"] * 1000:>9.1f}{row["p99"] * 1000:>9.1f}{row["total"]:>10.2f}'
+                         f'{row["requestBytes"] / 1024:>9.1f}{row["responseBytes"] / 1024:>10.1f}')
+        for name, gauge in sorted(self.gauges.items()):
+            lines.append(f'{name}: {gauge["current"]} (min {gauge["min"]}, max {gauge["max"]})')
+        for name, value in sorted(self.counters.items()):
+            lines.append(f'{name}: {value}')
+        return '\n'.join(lines)
+
+    def save(self, path):
+        """
+        Save the summary as CSV file
+        """
+        rows = self.summary()
+        fields = ['method', 'endpoint', 'count', 'errors', 'retries', 'p50', 'p95', 'p99', 'max', 'total',
+                  'requestBytes', 'responseBytes', 'statuses']
+        with open(path, 'w', newline='', encoding='utf-8') as file:
+            writer = csv.DictWriter(file, fieldnames=fields)
+            writer.writeheader()
+            writer.writerows(rows)
+            # Gauges and counters are appended as rows of their own
+            for name, gauge in sorted(self.gauges.items()):
+                writer.writerow({'method': 'GAUGE', 'endpoint': name,
+                                 'statuses': f'current:{gauge["current"]} min:{gauge["min"]} max:{gauge["max"]}'})
+            for name, value in sorted(self.counters.items()):
+                writer.writerow({'method': 'COUNTER', 'endpoint': name, 'count': value})
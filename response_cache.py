@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+  Created on October 16, 2026
+  @author: Fedor Alexander Steeman, NHMD
+  Copyright 2026 Natural History Museum of Denmark (NHMD)
+  Licensed under the Apache License, Version 2.0 (the "License");
+  you may not use this file except in compliance with the License.
+  You may obtain a copy of the License at
+  http://www.apache.org/licenses/LICENSE-2.0
+  Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the specific language governing permissions and limitations under the License.
+
+  PURPOSE: Least recently used (LRU) cache with time to live (TTL) for Specify API responses
+"""
+
+import copy
+import time
+import threading
+from collections import OrderedDict
+
+class ResponseCache():
+    """
+    Thread-safe LRU cache of Specify objects keyed by (objectName, id) with expiry after a given time to live.
+    Objects are copied in and out of the cache, so that callers altering a fetched object do not alter the cache.
+    """
+
+    def __init__(self, maxSize=1000, ttl=300) -> None:
+        """
+        CONSTRUCTOR
+        CONTRACT
+            maxSize (Integer) : Maximum number of objects kept; the least recently used object is evicted first. 0 disables the cache.
+            ttl (float)       : Number of seconds an object is kept before it is considered stale
+        """
+        self.maxSize = maxSize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, objectName, objectId):
+        """
+        Get a copy of a cached object
+        CONTRACT
+            RETURNS the cached object or None if absent or expired (counted as a miss)
+        """
+        key = (objectName, str(objectId))
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] > self.ttl:
+                del self.entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return copy.deepcopy(entry[1])
+
+    def put(self, objectName, objectId, specifyObject):
+        """
+        Add a copy of an object to the cache, evicting the least recently used object if full
+        """
+        if self.maxSize <= 0 or specifyObject is None: return
+        key = (objectName, str(objectId))
+        with self.lock:
+            self.entries[key] = (time.monotonic(), copy.deepcopy(specifyObject))
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxSize:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, objectName, objectId):
+        """
+        Remove an object from the cache
+        """
+        with self.lock:
+            self.entries.pop((objectName, str(objectId)), None)
+
+    def invalidateTable(self, objectName):
+        """
+        Remove all objects of the given type from the cache, e.g. after tree operations affecting several nodes
+        """
+        with self.lock:
+            for key in [key for key in self.entries if key[0] == objectName]:
+                del self.entries[key]
+
+    def clear(self):
+        """
+        Remove all objects from the cache and reset the counters
+        """
+        with self.lock:
+            self.entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __str__(self) -> str:
+        return f'ResponseCache: {len(self.entries)} objects, {self.hits} hits, {self.misses} misses'
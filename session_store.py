@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+  Created on October 16, 2026
+  @author: Fedor Alexander Steeman, NHMD
+  Copyright 2026 Natural History Museum of Denmark (NHMD)
+  Licensed under the Apache License, Version 2.0 (the "License");
+  you may not use this file except in compliance with the License.
+  You may obtain a copy of the License at
+  http://www.apache.org/licenses/LICENSE-2.0
+  Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the specific language governing permissions and limitations under the License.
+
+  PURPOSE: Local store for persisting logged in Specify7 sessions (cookies and CSRF token) between runs
+"""
+
+import os
+import json
+import time
+from pathlib import Path
+
+# Internal Dependencies
+import util
+
+class SessionStore():
+    """
+    Persists Specify7 session cookies and CSRF token per domain and collection to a local JSON file,
+    so that a later run can resume the session instead of logging in anew.
+    NOTE The file grants access to Specify as the logged in user and is therefore only readable by the owner.
+    """
+
+    def __init__(self, path=None) -> None:
+        """
+        CONSTRUCTOR
+        CONTRACT
+            path (String) : Path of the session file. Default: 'sessions.json' in the user documents folder
+        """
+        self.path = Path(path) if path else Path(util.getUserPath()).joinpath('sessions.json')
+
+    def load(self, domain, collectionName):
+        """
+        Get the persisted session for the domain and collection
+        CONTRACT
+            RETURNS session (dict) with 'csrfToken', 'cookies', 'collectionId' and 'savedAt', or None if absent
+        """
+        return self.readAll().get(self.key(domain, collectionName))
+
+    def save(self, domain, collectionName, csrfToken, cookies, collectionId):
+        """
+        Persist the session for the domain and collection
+        CONTRACT
+            csrfToken (String)    : The CSRF token of the logged in session
+            cookies (list)        : Session cookies as dictionaries (see SpecifyInterface.exportCookies)
+            collectionId (Integer): Primary key of the collection logged in to
+        """
+        sessions = self.readAll()
+        sessions[self.key(domain, collectionName)] = {'csrfToken': csrfToken, 'cookies': cookies,
+                                                       'collectionId': collectionId, 'savedAt': time.time()}
+        self.writeAll(sessions)
+
+    def remove(self, domain, collectionName):
+        """
+        Forget the persisted session for the domain and collection, e.g. when it has expired
+        """
+        sessions = self.readAll()
+        if sessions.pop(self.key(domain, collectionName), None) is not None:
+            self.writeAll(sessions)
+
+    def key(self, domain, collectionName):
+        return f'{domain}|{collectionName}'
+
+    def readAll(self):
+        """
+        Read all persisted sessions; an unreadable file is treated as empty
+        """
+        try:
+            with open(self.path, 'r', encoding='utf-8') as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    def writeAll(self, sessions):
+        """
+        Write all sessions to file, accessible to the owner only
+        """
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        descriptor = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(descriptor, 'w', encoding='utf-8') as file:
+            json.dump(sessions, file)
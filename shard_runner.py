@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+"""
+  Created on October 16, 2026
+  @author: Fedor Alexander Steeman, NHMD
+  Copyright 2026 Natural History Museum of Denmark (NHMD)
+  Licensed under the Apache License, Version 2.0 (the "License");
+  you may not use this file except in compliance with the License.
+  You may obtain a copy of the License at
+  http://www.apache.org/licenses/LICENSE-2.0
+  Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the specific language governing permissions and limitations under the License.
+
+  PURPOSE: Run a tool on one data file split into shards, each handled by a process of its own with its own Specify session.
+
+  Run from the repository root: python shard_runner.py [mode] "<tool name>" <data file> [number of shards]
+  e.g. python shard_runner.py debug "Mass Add Storage Nodes" mass_add_storage_nodes.csv 4
+"""
+
+import os
+import sys
+import csv
+import json
+import logging
+import datetime
+import traceback
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+# Internal Dependencies
+import util
+import configuration
+from request_metrics import RequestMetrics
+from models.tree_index import fold
+from tools.treenode_tool import TreeNodeTool
+
+class ShardRunner():
+    """
+    Splits the rows of a data file into shards and runs the tool on each shard in a separate process.
+    For tree tools the rows are sharded by hierarchy prefix: rows sharing the values of the first k hierarchy columns
+    go to the same shard, and the nodes above (the distinct prefixes of k-1 columns) are created up front,
+    so that shards never create the same node. Rows creating nodes outside their hierarchy (e.g. accepted taxa of
+    synonyms) declare them as keys (see Sp7ApiTool.rowKeys), merging the shards of rows sharing such a key.
+    Other tools are sharded by the keys of their rows alone, keeping rows affecting the same objects in the same shard.
+    At the end the logs, request metrics and failed rows of the shards are merged.
+    """
+
+    def __init__(self, config, toolDescriptor, shards=4) -> None:
+        """
+        CONSTRUCTOR
+        CONTRACT
+            config (dict)                   : Configuration as found in the config files (see ConfigurationHandler.applyConfiguration)
+            toolDescriptor (ToolDescriptor) : Descriptor of the tool to run
+            shards (Integer)                : Number of shards, i.e. processes
+        """
+        self.config = dict(config, persistSession=False) # Every shard logs in with a session of its own
+        self.toolDescriptor = toolDescriptor
+        self.shards = shards
+
+    def run(self, filename):
+        """
+        Run the tool on the data file in shards
+        CONTRACT
+            filename (String) : Name of the data file in the data folder
+            RETURNS list of shard results (dict) with 'shard', 'rows', 'failures', 'metrics' and 'error'
+        """
+        with open(f'data/{filename}', mode='r', encoding='utf-8') as file:
+            reader = csv.DictReader(file, delimiter=',')
+            headers = reader.fieldnames
+            rows = list(reader)
+
+        cfg = configuration.ConfigurationHandler()
+        cfg.applyConfiguration(self.config)
+        tool = self.toolDescriptor.load(cfg.sp)
+        if not tool.validateHeaders(headers):
+            raise Exception(f"Invalid headers in {filename}")
+
+        numbered = [(number, row) for number, row in enumerate(rows, start=1) if tool.validateRow(row)]
+        shards = self.splitRows(tool, headers, numbered)
+        print(f"Processing {len(numbered)} rows of {filename} in {len(shards)} shard(s): {[len(shard) for shard in shards]}")
+
+        runPath = f'output/shards_{tool.__class__.__name__}_{datetime.datetime.now().strftime("%Y%m%d%H%M%S")}'
+        os.makedirs(runPath, exist_ok=True)
+
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=len(shards), mp_context=context) as pool:
+            futures = [pool.submit(runShard, self.config, self.toolDescriptor.module, self.toolDescriptor.class_name,
+                                   index, headers, shard, runPath) for index, shard in enumerate(shards)]
+            results = [future.result() for future in futures]
+
+        self.mergeResults(tool, results, cfg.sp.metrics, runPath)
+        return results
+
+    def splitRows(self, tool, headers, numbered):
+        """
+        Split the numbered rows into shards of rows that do not affect the same objects
+        CONTRACT
+            tool (Sp7ApiTool) : Logged in tool instance
+            headers (list)    : Column names of the data file
+            numbered (list)   : Tuples of row number and row
+            RETURNS list of shards, each a list of tuples of row number and row in order of the file
+        """
+        if isinstance(tool, TreeNodeTool):
+            groups = self.groupByHierarchy(tool, headers, numbered)
+        else:
+            groups = self.groupByKeys(numbered, tool.rowKeys)
+
+        # Assign the largest groups first, each to the shard with the fewest rows
+        shards = [[] for i in range(min(self.shards, len(groups)))]
+        for group in sorted(groups, key=len, reverse=True):
+            min(shards, key=len).extend(group)
+        return [sorted(shard, key=lambda item: item[0]) for shard in shards if shard]
+
+    def groupByHierarchy(self, tool, headers, numbered):
+        """
+        Group rows by the smallest prefix of their node paths giving a group per shard, after creating the nodes above
+        that prefix. Paths are made up of the non-empty hierarchy cells of a row, as the nodes are created.
+        Groups sharing a row key (see Sp7ApiTool.rowKeys) are merged, since their rows create the same nodes.
+        """
+        hierarchy = tool.hierarchyHeaders(headers)
+
+        def path(row):
+            # Like TreeNodeTool.addChildNodes: the first column always, empty cells in the following columns skipped, 
+            # and names compared regardless of case (see tree_index.fold)
+            return [fold(row[header].strip()) for index, header in enumerate(hierarchy) if index == 0 or row[header].strip()]
+
+        def prefix(row, depth):
+            return tuple(path(row)[:depth])
+
+        def columns(row, depth):
+            # Number of columns holding the first nodes of the path of a row
+            filled = 0
+            for index, header in enumerate(hierarchy):
+                if index == 0 or row[header].strip():
+                    filled += 1
+                    if filled == depth: return index + 1
+            return len(hierarchy)
+
+        depth = 1
+        while depth < len(hierarchy) and len({prefix(row, depth) for _, row in numbered}) < self.shards:
+            depth += 1
+
+        # Create the nodes shared by shards, i.e. the distinct prefixes above the shard prefix
+        if depth > 1:
+            ancestors = {}
+            for _, row in numbered:
+                ancestors.setdefault(prefix(row, depth - 1), row)
+            util.logger.info(f'Creating {len(ancestors)} ancestor path(s) shared by shards')
+            for row in ancestors.values():
+                tool.getOrCreatePath(hierarchy, row, columns(row, depth - 1))
+
+        return self.groupByKeys(numbered, lambda row: [('prefix', prefix(row, depth))] + list(tool.rowKeys(row)))
+
+    def groupByKeys(self, numbered, rowKeys):
+        """
+        Group rows connected by shared keys
+        CONTRACT
+            numbered (list)    : Tuples of row number and row
+            rowKeys (function) : Function returning the keys of a row, e.g. Sp7ApiTool.rowKeys
+            RETURNS list of groups, each a list of tuples of row number and row in order of the file
+        """
+        parents = {}
+
+        def find(item):
+            while parents.setdefault(item, item) != item:
+                parents[item] = parents[parents[item]]
+                item = parents[item]
+            return item
+
+        for number, row in numbered:
+            for key in rowKeys(row):
+                parents[find(('key', key))] = find(('row', number))
+
+        groups = {}
+        for number, row in numbered:
+            groups.setdefault(find(('row', number)), []).append((number, row))
+        return list(groups.values())
+
+    def mergeResults(self, tool, results, metrics, runPath):
+        """
+        Merge the logs, request metrics and failed rows of the shards, and report them
+        """
+        with open(f'{runPath}/merged.log', 'w', encoding='utf-8') as merged:
+            for result in results:
+                with open(result['log'], 'r', encoding='utf-8') as log:
+                    for line in log:
+                        merged.write(f"[shard {result['shard']}] {line}")
+
+        combined = RequestMetrics()
+        combined.merge(metrics)
+        for result in results:
+            combined.merge(result['metrics'])
+        print(combined.report())
+        combined.save(f'{runPath}/request_metrics.csv')
+
+        failures = []
+        for result in results:
+            if result['error']:
+                print(f"Shard {result['shard']} stopped: {result['error'].splitlines()[-1]}")
+                failures.append({'row': '', 'shard': result['shard'], 'error': result['error']})
+            failures += [dict(failure, shard=result['shard']) for failure in result['failures']]
+        tool.reportFailures(failures, sum(result['rows'] for result in results))
+        print(f"Shard logs, metrics and failed rows saved to {runPath}")
+
+def runShard(config, module, className, index, headers, numbered, runPath):
+    """
+    Process entry point of a shard: Log in, construct the tool and process the rows of the shard
+    CONTRACT
+        config (dict)    : Configuration (see ConfigurationHandler.applyConfiguration)
+        module (String)  : Module of the tool class
+        className (String) : Name of the tool class
+        index (Integer)  : Number of the shard
+        headers (list)   : Column names of the data file
+        numbered (list)  : Tuples of row number and row in the data file
+        runPath (String) : Folder for the shard's log
+        RETURNS result (dict) with 'shard', 'rows', 'failures' (row numbers of the data file), 'metrics', 'error' and 'log'
+    """
+    logPath = f'{runPath}/shard_{index}.log'
+    handler = logging.FileHandler(logPath, encoding='utf-8')
+    handler.setFormatter(logging.Formatter('[%(asctime)s] p%(process)s {%(filename)s:%(lineno)d} %(levelname)s - %(message)s', '%m-%d %H:%M:%S'))
+    util.logger.addHandler(handler)
+    util.logger.setLevel(logging.DEBUG)
+
+    result = {'shard': index, 'rows': len(numbered), 'failures': [], 'metrics': RequestMetrics(), 'error': None, 'log': logPath}
+    try:
+        cfg = configuration.ConfigurationHandler()
+        cfg.applyConfiguration(config)
+        result['metrics'] = cfg.sp.metrics
+        tool = configuration.ToolDescriptor(className, module, className).load(cfg.sp)
+        # Failing rows do not stop the shard, but are collected (see Sp7ApiTool.handleRowsParallel and TreeNodeTool.handleRows);
+        # rows are processed one at a time, unless parallel rows are configured as well
+        if not config.get('parallelRows', False):
+            tool.concurrency = 1
+        if getattr(tool, 'planPaths', False):
+            tool.handleRows(headers, [row for _, row in numbered])
+        else:
+            tool.handleRowsParallel(headers, [row for _, row in numbered])
+        # Map the row numbers within the shard to those of the data file
+        rowNumbers = [number for number, _ in numbered]
+        result['failures'] = [dict(failure, row=rowNumbers[failure['row'] - 1]) for failure in tool.failures]
+    except Exception:
+        result['error'] = traceback.format_exc()
+        util.logger.error(result['error'])
+    finally:
+        util.logger.removeHandler(handler)
+        handler.close()
+
+    return result
+
+
+# Sharded execution entry point
+if __name__ == "__main__":
+    arguments = sys.argv[1:]
+    shards = int(arguments.pop()) if arguments[-1].isdigit() else 4
+    mode = arguments.pop(0) if len(arguments) > 2 else ''
+    toolName, filename = arguments[0], arguments[1]
+
+    util.buildLogger()
+    with open(f"config/config{'.' + mode if mode else ''}.json", "r") as file:
+        config = json.load(file)
+
+    cfg = configuration.ConfigurationHandler()
+    cfg.loadTools()
+    descriptors = {name: descriptor for name, descriptor in cfg.toolKit}
+    if toolName not in descriptors:
+        raise Exception(f"Unknown tool: {toolName}. Choose one of: {', '.join(descriptors)}")
+
+    ShardRunner(config, descriptors[toolName], shards).run(filename)
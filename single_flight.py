@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+  Created on October 16, 2026
+  @author: Fedor Alexander Steeman, NHMD
+  Copyright 2026 Natural History Museum of Denmark (NHMD)
+  Licensed under the Apache License, Version 2.0 (the "License");
+  you may not use this file except in compliance with the License.
+  You may obtain a copy of the License at
+  http://www.apache.org/licenses/LICENSE-2.0
+  Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the specific language governing permissions and limitations under the License.
+
+  PURPOSE: Coordinator letting only one of several concurrent callers perform a keyed get-or-create, the others awaiting its result
+"""
+
+import threading
+
+class SingleFlight():
+    """
+    Coalesces concurrent calls for the same key: The first caller ("leader") performs the call, while callers arriving
+    with the same key before it has finished wait for and share its result (or its error) instead of repeating the call.
+    Used for looking up or creating tree nodes, so that two workers missing the same node do not both create it.
+    Once a call has finished, later callers perform the call anew, which then finds what the leader created.
+    """
+
+    def __init__(self, metrics=None) -> None:
+        """
+        CONSTRUCTOR
+        CONTRACT
+            metrics (RequestMetrics) : Optional request metrics to count the calls and coalesced calls in
+        """
+        self.metrics = metrics
+        self.lock = threading.Lock()
+        self.inFlight = {}  # key -> Flight
+        self.calls = 0
+        self.coalesced = 0
+
+    def do(self, key, function, *args, **kwargs):
+        """
+        Call the function, unless a call with the same key is in flight, in which case its result is awaited
+        CONTRACT
+            key (tuple)         : Hashable key identifying the call, e.g. ('taxon', parent_id, fullname, rankid, author)
+            function (function) : Function to call
+            args, kwargs        : Arguments of the function
+            RETURNS the result of the function
+            RAISES the exception raised by the function
+        """
+        with self.lock:
+            self.calls += 1
+            flight = self.inFlight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.inFlight[key] = Flight()
+            else:
+                self.coalesced += 1
+        if self.metrics is not None:
+            self.metrics.count('getOrCreateCalls')
+            if not leader: self.metrics.count('getOrCreateCoalesced')
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = function(*args, **kwargs)
+            return flight.result
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.inFlight[key]
+            flight.done.set()
+
+    def __str__(self) -> str:
+        return f'SingleFlight: {self.calls} calls, {self.coalesced} coalesced, {len(self.inFlight)} in flight'
+
+class Flight():
+    """
+    Call in flight, holding its outcome once done
+    """
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
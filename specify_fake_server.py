@@ -0,0 +1,624 @@
+# -*- coding: utf-8 -*-
+"""
+  Created on October 16, 2026
+  @author: Fedor Alexander Steeman, NHMD
+  Copyright 2026 Natural History Museum of Denmark (NHMD)
+  Licensed under the Apache License, Version 2.0 (the "License");
+  you may not use this file except in compliance with the License.
+  You may obtain a copy of the License at
+  http://www.apache.org/licenses/LICENSE-2.0
+  Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the specific language governing permissions and limitations under the License.
+
+  PURPOSE: In-process stand-in for a Specify7 server to be used for offline unit tests and benchmarking.
+
+  The fake server implements the subset of the Specify7 API used by the toolbox:
+    - context/login/                           (GET: collections & CSRF token, PUT: log in/out)
+    - context/user.json                        (GET: verify session)
+    - api/specify/<table>/                     (GET: limit/offset/orderby/filters, POST: create)
+    - api/specify/<table>/<id>/                (GET, PUT, DELETE)
+    - api/specify_tree/<tree>/<id>/merge|move/ (POST with form field 'target')
+
+  Latency can be injected per endpoint in order to emulate realistic round trip costs.
+  The endpoint names are: 'login', 'user', 'list', 'get', 'post', 'put', 'delete', 'merge' and 'move'.
+  The key '*' sets the default latency for endpoints not mentioned explicitly.
+  Transient failures can be injected per endpoint as well (see injectFailures).
+
+  Example usage:
+
+    server = FakeSpecifyServer(latency={'*': 0.02, 'merge': 0.5})
+    server.start()
+    ... # point app.settings['baseURL'] to server.baseURL
+    server.stop()
+
+  The server can also be run standalone for use with main.py: python specify_fake_server.py [port]
+"""
+
+import sys
+import json
+import time
+import uuid
+import threading
+import datetime
+import urllib.parse
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Default tree definition items as derived from a standard Specify setup: (name, rankid)
+TAXON_RANKS = [('Life', 0), ('Kingdom', 10), ('Phylum', 30), ('Subphylum', 40), ('Class', 60), ('Subclass', 70),
+               ('Order', 100), ('Suborder', 110), ('Superfamily', 130), ('Family', 140), ('Subfamily', 150),
+               ('Tribe', 160), ('Genus', 180), ('Subgenus', 190), ('Species', 220), ('Subspecies', 230),
+               ('Variety', 240), ('Subvariety', 250), ('Forma', 260), ('Subforma', 270)]
+
+STORAGE_RANKS = [('Institution', 0), ('Building', 100), ('Collection', 150), ('Room', 200), ('Aisle', 250),
+                 ('Cabinet', 300), ('Freezer', 325), ('Shelf', 350), ('Box', 400), ('Rack', 450),
+                 ('CryoBox', 475), ('Vial', 500)]
+
+# Default field values of objects created through the API
+TABLE_DEFAULTS = {
+    'taxon':   {'author': None, 'isaccepted': True, 'acceptedtaxon': None, 'ishybrid': False,
+                'text1': None, 'text2': None, 'source': None, 'parent': None},
+    'storage': {'parent': None},
+}
+
+TREE_TABLES = ('taxon', 'storage', 'geography')
+
+TIMESTAMP_FORMAT = '%Y-%m-%dT%H:%M:%S'
+
+class FakeSpecifyServer():
+    """
+    Minimal in-memory imitation of a Specify7 server running in a background thread.
+    """
+
+    def __init__(self, collections={'KUFishvoucher': 4}, username='sp7demofish', password='sp7demofish',
+                 latency={}, data=None, host='127.0.0.1', port=0) -> None:
+        """
+        CONSTRUCTOR
+        CONTRACT
+            collections (dict)  : Collection names mapped to their primary keys
+            username (String)   : Specify account user name accepted at login
+            password (String)   : Specify account password accepted at login
+            latency (dict)      : Seconds of latency injected per endpoint name (see module docstring)
+            data (dict)         : Optional table name mapped to list of objects replacing the default data set
+            host (String)       : Host name to bind to
+            port (Integer)      : Port to bind to; 0 picks a free port
+        """
+        self.collections = dict(collections)
+        self.username = username
+        self.password = password
+        self.latency = dict(latency)
+        self.host = host
+        self.port = port
+
+        self.tables = {}
+        self.nextIds = {}
+        self.sessions = {}
+        self.requestCounts = Counter()
+        self.failures = {}
+        self.lock = threading.RLock()
+
+        self.httpServer = None
+        self.thread = None
+
+        if data is None:
+            self.loadDefaultData()
+        else:
+            for table in data:
+                for obj in data[table]:
+                    self.addObject(table, obj)
+
+    # Server life cycle
+
+    @property
+    def baseURL(self):
+        """
+        Base URL of the running server as expected by SpecifyInterface (app.settings['baseURL'])
+        """
+        return f'http://{self.host}:{self.port}/'
+
+    def start(self):
+        """
+        Start serving requests in a background thread
+        CONTRACT
+            RETURNS base URL of the server (String)
+        """
+        self.httpServer = ThreadingHTTPServer((self.host, self.port), FakeSpecifyRequestHandler)
+        self.httpServer.daemon_threads = True
+        self.httpServer.fake = self
+        self.port = self.httpServer.server_address[1]
+        self.thread = threading.Thread(target=self.httpServer.serve_forever, daemon=True)
+        self.thread.start()
+        return self.baseURL
+
+    def stop(self):
+        """
+        Stop serving requests and release the port
+        """
+        if self.httpServer:
+            self.httpServer.shutdown()
+            self.httpServer.server_close()
+            self.httpServer = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def setLatency(self, endpoint, seconds):
+        """
+        Set the latency injected for a given endpoint name ('*' for default)
+        """
+        self.latency[endpoint] = seconds
+
+    def getLatency(self, endpoint):
+        """
+        Get the latency injected for a given endpoint name
+        """
+        return self.latency.get(endpoint, self.latency.get('*', 0))
+
+    def injectFailures(self, endpoint, statuses, applied=False):
+        """
+        Make the next requests to an endpoint fail, e.g. for testing retries
+        CONTRACT
+            endpoint (String) : Endpoint name (see module docstring)
+            statuses (list)   : Response status code of each failing request in turn; None drops the connection without response
+            applied (boolean) : Whether the failing requests take effect before failing, as when a response is lost in transit
+        """
+        with self.lock:
+            self.failures.setdefault(endpoint, []).extend((status, applied) for status in statuses)
+
+    def nextFailure(self, endpoint):
+        """
+        Get the next failure injected for an endpoint as (status, applied) or None
+        """
+        with self.lock:
+            queue = self.failures.get(endpoint)
+            return queue.pop(0) if queue else None
+
+    def resetCounts(self):
+        """
+        Reset the number of requests counted per endpoint
+        """
+        self.requestCounts.clear()
+
+    # Data handling
+
+    def loadDefaultData(self):
+        """
+        Set up a minimal Specify database with an institution, a discipline, collection(s), and taxon & storage trees
+        """
+        self.addObject('institution', {'id': 1, 'name': 'Natural History Museum'})
+        self.addObject('taxontreedef', {'id': 1, 'name': 'Taxonomy'})
+        self.addObject('storagetreedef', {'id': 1, 'name': 'Storage'})
+        self.addObject('discipline', {'id': 3, 'name': 'Ichthyology',
+                                      'taxontreedef': '/api/specify/taxontreedef/1/'})
+        for name, id in self.collections.items():
+            self.addObject('collection', {'id': id, 'collectionname': name, 'code': name,
+                                          'guid': str(uuid.uuid5(uuid.NAMESPACE_URL, name)),
+                                          'discipline': '/api/specify/discipline/3/'})
+
+        for tree, ranks in (('taxon', TAXON_RANKS), ('storage', STORAGE_RANKS)):
+            parent = None
+            for name, rankid in ranks:
+                item = self.addObject(f'{tree}treedefitem', {'name': name, 'rankid': rankid,
+                                      'treedef': f'/api/specify/{tree}treedef/1/', 'parent': parent})
+                item['treeentries'] = f'/api/specify/{tree}/?definitionitem={item["id"]}'
+                parent = item['resource_uri']
+            rootItem = self.tables[f'{tree}treedefitem'][1]
+            self.addObject(tree, {'name': rootItem['name'], 'fullname': rootItem['name'], 'rankid': 0,
+                                  'definitionitem': rootItem['resource_uri']})
+
+    def addObject(self, table, fields):
+        """
+        Add an object directly to the data set without going through the API
+        CONTRACT
+            table (String) : Name of the table
+            fields (dict)  : Fields of the object; an 'id' is assigned if missing
+            RETURNS the stored object (dict)
+        """
+        with self.lock:
+            rows = self.tables.setdefault(table, {})
+            obj = dict(TABLE_DEFAULTS.get(table, {}))
+            obj.update(fields)
+            id = int(obj.get('id') or self.nextIds.get(table, 1))
+            self.nextIds[table] = max(self.nextIds.get(table, 1), id + 1)
+            now = datetime.datetime.now().strftime(TIMESTAMP_FORMAT)
+            obj['id'] = id
+            obj['resource_uri'] = f'/api/specify/{table}/{id}/'
+            obj.setdefault('version', 0)
+            obj.setdefault('timestampcreated', now)
+            obj['timestampmodified'] = now
+            if table in TREE_TABLES and not obj.get('definition') and obj.get('definitionitem'):
+                # Specify derives the tree definition from the tree definition item
+                item = self.getObject(f'{table}treedefitem', uriId(obj['definitionitem']))
+                if item: obj['definition'] = item['treedef']
+            rows[id] = obj
+            return obj
+
+    def getObject(self, table, id):
+        """
+        Get an object directly from the data set or None if it does not exist
+        """
+        with self.lock:
+            return self.tables.get(table, {}).get(int(id))
+
+    def objects(self, table):
+        """
+        Get all objects of a table sorted on primary key
+        """
+        with self.lock:
+            return [self.tables.get(table, {})[id] for id in sorted(self.tables.get(table, {}))]
+
+    def queryObjects(self, table, params):
+        """
+        Filter, sort and page objects of a table according to the query parameters of the API
+        CONTRACT
+            table (String) : Name of the table
+            params (dict)  : Query string parameters as single values
+            RETURNS response body with 'objects' and 'meta' (dict)
+        """
+        limit = int(params.get('limit', 20) or 0)
+        offset = int(params.get('offset', 0) or 0)
+        orderby = params.get('orderby', '')
+        filters = {key: value for key, value in params.items() if key not in ('limit', 'offset', 'orderby', 'domainfilter')}
+
+        with self.lock:
+            matches = [obj for obj in self.objects(table) if all(matchFilter(obj, key, value) for key, value in filters.items())]
+
+        for field in reversed([f.strip() for f in orderby.split(',') if f.strip()]):
+            descending = field.startswith('-')
+            field = field.lstrip('-')
+            matches.sort(key=lambda obj: sortKey(obj.get(field)), reverse=descending)
+
+        page = matches[offset:offset + limit] if limit > 0 else matches[offset:]
+
+        return {'objects': page, 'meta': {'limit': limit, 'offset': offset, 'total_count': len(matches)}}
+
+    def createObject(self, table, fields):
+        """
+        Create an object as done by POST api/specify/<table>/
+        """
+        fields = {key: value for key, value in fields.items() if key not in ('id', 'resource_uri', 'version')}
+        return self.addObject(table, fields)
+
+    def updateObject(self, table, id, fields):
+        """
+        Update an object as done by PUT api/specify/<table>/<id>/
+        CONTRACT
+            RETURNS (status code, updated object or error message)
+        """
+        with self.lock:
+            obj = self.getObject(table, id)
+            if obj is None:
+                return 404, 'Not found'
+            if 'version' in fields and fields['version'] is not None and int(fields['version']) != int(obj['version']):
+                return 409, f'Stale object: {table} {id} version {fields["version"]} vs {obj["version"]}'
+            for key, value in fields.items():
+                if key not in ('id', 'resource_uri', 'version', 'timestampcreated', 'timestampmodified'):
+                    obj[key] = value
+            self.touch(obj)
+            return 200, obj
+
+    def deleteObject(self, table, id):
+        """
+        Delete an object as done by DELETE api/specify/<table>/<id>/
+        """
+        with self.lock:
+            return self.tables.get(table, {}).pop(int(id), None) is not None
+
+    def mergeNodes(self, tree, sourceId, targetId):
+        """
+        Merge the source tree node into the target node: Children and references are moved to the target and the source is deleted
+        """
+        with self.lock:
+            source = self.getObject(tree, sourceId)
+            target = self.getObject(tree, targetId)
+            if source is None or target is None:
+                return 404
+            for obj in self.objects(tree):
+                for field in ('parent', 'acceptedtaxon'):
+                    if obj.get(field) and uriId(obj[field]) == source['id']:
+                        obj[field] = target['resource_uri']
+                        self.touch(obj)
+            self.deleteObject(tree, sourceId)
+            self.touch(target)
+            return 204
+
+    def moveNode(self, tree, sourceId, targetId):
+        """
+        Move the source tree node to the target node as its new parent
+        """
+        with self.lock:
+            source = self.getObject(tree, sourceId)
+            target = self.getObject(tree, targetId)
+            if source is None or target is None:
+                return 404
+            source['parent'] = target['resource_uri']
+            self.touch(source)
+            return 204
+
+    def touch(self, obj):
+        """
+        Update the modification timestamp and version of an object
+        """
+        obj['version'] = int(obj.get('version', 0)) + 1
+        obj['timestampmodified'] = datetime.datetime.now().strftime(TIMESTAMP_FORMAT)
+
+
+class FakeSpecifyRequestHandler(BaseHTTPRequestHandler):
+    """
+    Request handler dispatching the Specify7 API endpoints to the FakeSpecifyServer instance
+    """
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True  # Avoid delayed ACK stalls on keep-alive connections
+    injectedFailure = None          # Failure replacing the response of the request being handled
+
+    @property
+    def fake(self) -> FakeSpecifyServer:
+        return self.server.fake
+
+    def log_message(self, format, *args):
+        # Silence default logging to stderr
+        pass
+
+    def do_GET(self):
+        self.dispatch('GET')
+
+    def do_PUT(self):
+        self.dispatch('PUT')
+
+    def do_POST(self):
+        self.dispatch('POST')
+
+    def do_DELETE(self):
+        self.dispatch('DELETE')
+
+    def dispatch(self, method):
+        """
+        Route the request to the handling method based on path and HTTP method
+        """
+        url = urllib.parse.urlsplit(self.path)
+        parts = [part for part in url.path.split('/') if part]
+        params = {key: values[-1] for key, values in urllib.parse.parse_qs(url.query, keep_blank_values=True).items()}
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0) or 0))
+
+        endpoint, handler, args = self.route(method, parts)
+        if handler is None:
+            return self.respond(404, {'error': f'No such endpoint: {method} {url.path}'})
+
+        with self.fake.lock:
+            self.fake.requestCounts[endpoint] += 1
+        latency = self.fake.getLatency(endpoint)
+        if latency: time.sleep(latency)
+
+        # Apply authentication and CSRF protection like Django would
+        if endpoint not in ('login', 'user') and self.session() is None:
+            return self.respond(403, {'error': 'Not logged in'})
+        if method != 'GET' and not self.checkCSRF():
+            return self.respond(403, {'error': 'CSRF verification failed'})
+
+        failure = self.fake.nextFailure(endpoint)
+        if failure is None:
+            return handler(params, body, *args)
+
+        status, applied = failure
+        if applied:
+            # Handle the request, but replace the response by the failure
+            self.injectedFailure = failure
+            handler(params, body, *args)
+        elif status is None:
+            self.close_connection = True
+        else:
+            self.respond(status, {'error': 'Injected failure'})
+
+    def route(self, method, parts):
+        """
+        Determine endpoint name, handling method and arguments from the path parts
+        """
+        if parts == ['context', 'login'] and method in ('GET', 'PUT'):
+            return 'login', self.handleLogin if method == 'PUT' else self.handleLoginContext, ()
+        if parts == ['context', 'user.json'] and method == 'GET':
+            return 'user', self.handleUser, ()
+        if len(parts) == 3 and parts[:2] == ['api', 'specify']:
+            if method == 'GET': return 'list', self.handleList, (parts[2],)
+            if method == 'POST': return 'post', self.handlePost, (parts[2],)
+        if len(parts) == 4 and parts[:2] == ['api', 'specify'] and parts[3].isdigit():
+            if method == 'GET': return 'get', self.handleGet, (parts[2], parts[3])
+            if method == 'PUT': return 'put', self.handlePut, (parts[2], parts[3])
+            if method == 'DELETE': return 'delete', self.handleDelete, (parts[2], parts[3])
+        if len(parts) == 5 and parts[:2] == ['api', 'specify_tree'] and parts[3].isdigit() and method == 'POST':
+            if parts[4] in ('merge', 'move'):
+                return parts[4], self.handleTreeAction, (parts[2], parts[3], parts[4])
+        return None, None, ()
+
+    # Endpoint handlers
+
+    def handleLoginContext(self, params, body):
+        csrfToken = uuid.uuid4().hex
+        self.respond(200, {'collections': self.fake.collections}, cookies={'csrftoken': csrfToken})
+
+    def handleLogin(self, params, body):
+        credentials = json.loads(body or b'{}')
+        if credentials.get('username') is None:
+            # Log out
+            self.fake.sessions.pop(self.cookies().get('sessionid'), None)
+            return self.respond(204)
+        if credentials.get('username') != self.fake.username or credentials.get('password') != self.fake.password:
+            return self.respond(403, {'error': 'Invalid username/password'})
+        if credentials.get('collection') not in self.fake.collections.values():
+            return self.respond(400, {'error': f'Invalid collection: {credentials.get("collection")}'})
+        sessionId = uuid.uuid4().hex
+        self.fake.sessions[sessionId] = {'username': credentials['username'], 'collection': credentials['collection']}
+        self.respond(204, cookies={'csrftoken': uuid.uuid4().hex, 'sessionid': sessionId})
+
+    def handleUser(self, params, body):
+        session = self.session()
+        if session is None:
+            return self.respond(403, {'error': 'Not logged in'})
+        self.respond(200, {'id': 1, 'name': session['username'], 'usertype': 'Manager'})
+
+    def handleList(self, params, body, table):
+        self.respond(200, self.fake.queryObjects(table, params))
+
+    def handleGet(self, params, body, table, id):
+        obj = self.fake.getObject(table, id)
+        if obj is None:
+            return self.respond(404, {'error': f'{table} {id} not found'})
+        self.respond(200, obj)
+
+    def handlePost(self, params, body, table):
+        try:
+            fields = json.loads(body)
+        except ValueError:
+            return self.respond(400, {'error': 'Invalid JSON'})
+        self.respond(201, self.fake.createObject(table, fields))
+
+    def handlePut(self, params, body, table, id):
+        try:
+            fields = json.loads(body)
+        except ValueError:
+            return self.respond(400, {'error': 'Invalid JSON'})
+        status, result = self.fake.updateObject(table, id, fields)
+        self.respond(status, result if status < 299 else {'error': result})
+
+    def handleDelete(self, params, body, table, id):
+        if self.fake.deleteObject(table, id):
+            return self.respond(204)
+        self.respond(404, {'error': f'{table} {id} not found'})
+
+    def handleTreeAction(self, params, body, tree, id, action):
+        form = {key: values[-1] for key, values in urllib.parse.parse_qs(body.decode('utf-8')).items()}
+        if 'target' not in form:
+            return self.respond(400, {'error': 'Missing target'})
+        if action == 'merge':
+            status = self.fake.mergeNodes(tree, id, form['target'])
+        else:
+            status = self.fake.moveNode(tree, id, form['target'])
+        self.respond(status, None if status < 299 else {'error': 'Node not found'})
+
+    # Helper methods
+
+    def cookies(self):
+        """
+        Parse request cookies into a dictionary
+        """
+        cookies = {}
+        for part in self.headers.get('Cookie', '').split(';'):
+            if '=' in part:
+                key, value = part.strip().split('=', 1)
+                cookies[key] = value
+        return cookies
+
+    def session(self):
+        """
+        Get the logged in session belonging to the request, if any
+        """
+        return self.fake.sessions.get(self.cookies().get('sessionid'))
+
+    def checkCSRF(self):
+        """
+        Check that the CSRF token header matches the CSRF cookie (double submit)
+        """
+        token = self.cookies().get('csrftoken')
+        return token is not None and self.headers.get('X-CSRFToken') == token
+
+    def respond(self, status, payload=None, cookies={}):
+        """
+        Send response with optional JSON payload and cookies
+        """
+        if self.injectedFailure is not None:
+            status, payload, cookies = self.injectedFailure[0], {'error': 'Injected failure'}, {}
+            self.injectedFailure = None
+            if status is None:
+                self.close_connection = True
+                return
+        content = b'' if payload is None else json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        if payload is not None:
+            self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        for key, value in cookies.items():
+            self.send_header('Set-Cookie', f'{key}={value}; Path=/')
+        self.end_headers()
+        self.wfile.write(content)
+
+
+def uriId(value):
+    """
+    Extract the primary key from a resource URI like '/api/specify/taxon/1/'
+    """
+    return int(str(value).rstrip('/').split('/')[-1])
+
+def normalize(value):
+    """
+    Normalize a field value for comparison with a query string value
+    """
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, str) and value.startswith('/api/specify/'):
+        return str(uriId(value))
+    if value is None:
+        return None
+    return str(value)
+
+def compare(left, right):
+    """
+    Compare two normalized values numerically if possible, otherwise as strings. Returns -1, 0 or 1.
+    """
+    try:
+        left, right = float(left), float(right)
+    except (TypeError, ValueError):
+        left, right = str(left), str(right)
+    return (left > right) - (left < right)
+
+def sortKey(value):
+    """
+    Sort key placing None first and comparing numbers numerically
+    """
+    value = normalize(value)
+    if value is None: return (0, 0, '')
+    try:
+        return (1, float(value), '')
+    except ValueError:
+        return (2, 0, value)
+
+def matchFilter(obj, key, value):
+    """
+    Evaluate a Django style query filter, e.g. 'name', 'id__in', 'rankid__gt', 'fullname__istartswith'
+    """
+    field, _, operator = key.partition('__')
+    actual = normalize(obj.get(field))
+
+    if operator in ('', 'exact'):
+        # Exact matches ignore case, as in the MySQL collation of the Specify database
+        return actual is not None and actual.casefold() == value.casefold()
+    if operator == 'iexact': return actual is not None and actual.lower() == value.lower()
+    if operator == 'in': return actual in value.split(',')
+    if operator == 'isnull': return (actual is None) == (value.lower() in ('true', '1'))
+    if actual is None: return False
+    if operator == 'gt': return compare(actual, value) > 0
+    if operator == 'gte': return compare(actual, value) >= 0
+    if operator == 'lt': return compare(actual, value) < 0
+    if operator == 'lte': return compare(actual, value) <= 0
+    if operator == 'startswith': return actual.startswith(value)
+    if operator == 'istartswith': return actual.lower().startswith(value.lower())
+    if operator == 'contains': return value in actual
+    if operator == 'icontains': return value.lower() in actual.lower()
+    return False
+
+
+# Standalone execution entry point
+if __name__ == "__main__":
+    """
+    Serve the fake Specify7 API until interrupted. Optional argument: port number (default 8000)
+    """
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8000
+    server = FakeSpecifyServer(port=port)
+    server.start()
+    print(f"Fake Specify7 server running at {server.baseURL} (press Ctrl+C to stop)")
+    try:
+        while True: time.sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
@@ -15,15 +15,28 @@
 import requests # Documentation: https://requests.readthedocs.io/en/latest/api/ 
 import json 
 import urllib3
-import traceback
 import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
 
 # Internal Dependencies
 import util
 import global_settings as app
+from response_cache import ResponseCache
+from request_handler import RequestHandler, RetryPolicy, RecoveredResponse
+from request_metrics import RequestMetrics
+from cassette import getCassette
+from concurrency_limiter import AdaptiveConcurrencyLimiter
+from metadata_cache import MetadataCache
 
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
+# Fields identifying a newly posted object, used for checking whether a failed POST took effect before sending it again 
+POST_LOOKUP_FIELDS = {
+  'taxon':     ('name', 'parent', 'rankid', 'author'),
+  'storage':   ('name', 'parent', 'rankid'),
+  'geography': ('name', 'parent', 'rankid'),
+}
+
 class SpecifyInterface():
   """
   The Specify Interface class acts as a wrapper around a selection of API functions offered by Specify7. 
@@ -31,17 +44,54 @@ class SpecifyInterface():
   Interactions with Specify7 require a token to prevent Cross Site Request Forgery (CSRF). 
   In order to log in, an initial CSRF token must be acquired by accessing .../context/login/ (getCSRFToken).
   The initial CSRF token kan be used to subsequently log in using a Specify username/password combination (specifyLogin). 
+  All requests are sent through a request handler retrying transient failures (see request_handler.py) 
+  and recording per-endpoint request metrics (see request_metrics.py). 
+  Optionally the requests are recorded to, or replayed from, a cassette file (see cassette.py), 
+  and the number of concurrent requests is limited adaptively to the server's latency (see concurrency_limiter.py). 
+  Rarely changing metadata (collection, discipline, tree definitions) can be persisted between runs (see metadata_cache.py). 
   """
 
-  def __init__(self, token=None) -> None:
+  def __init__(self, token=None, cacheSize=1000, cacheTTL=300, retryPolicy=None, cassette=None, limiter=None) -> None:
     """ 
     CONSTRUCTOR
-    Creates a session for storing cookies  
+    Creates a session for storing cookies and a cache for objects fetched by primary key 
+    CONTRACT
+      cacheSize   (Integer)     : Maximum number of objects kept in the response cache (0 disables caching)
+      cacheTTL    (float)       : Number of seconds before a cached object is fetched anew
+      retryPolicy (RetryPolicy) : Policy for retrying failed requests. Default: as configured by the 'retry' setting 
+      cassette    (Cassette)    : Cassette for recording or replaying requests. Default: as configured by the 'cassette' setting 
+      limiter     (AdaptiveConcurrencyLimiter) : Limiter of concurrent requests. Default: as configured by the 'adaptiveConcurrency' setting 
     """      
     self.spSession = requests.Session() 
+    if retryPolicy is None:
+      retryPolicy = RetryPolicy(**app.settings.get('retry', {}))
+    self.metrics = RequestMetrics()
+    if cassette is None:
+      cassette = getCassette(app.settings.get('cassette'))
+    if limiter is None and app.settings.get('adaptiveConcurrency') is not None:
+      limiter = AdaptiveConcurrencyLimiter(**app.settings['adaptiveConcurrency'])
+    self.requestHandler = RequestHandler(self.spSession, retryPolicy, self.metrics, cassette, limiter)
     self.csrfToken = ''
     self.verifySSL = True
     self.baseURL = app.settings['baseURL']
+    self.cache = ResponseCache(cacheSize, cacheTTL)
+    self.loggedIn = False
+    self.metadataCache = None
+    metadataSettings = app.settings.get('metadataCache')
+    if metadataSettings is not None:
+      self.metadataCache = MetadataCache(metadataSettings.get('path'), metadataSettings.get('ttl', 86400), 
+                                         metadataSettings.get('refresh', False) or app.settings.get('refreshMetadata', False))
+
+  def setPoolSize(self, size):
+    """
+    Set the number of connections kept open to the Specify server, allowing for that many concurrent requests 
+    through the shared session (cookies and CSRF token) without connections being discarded. 
+    CONTRACT
+      size (Integer) : Maximum number of pooled connections
+    """
+    adapter = requests.adapters.HTTPAdapter(pool_connections=size, pool_maxsize=size)
+    self.spSession.mount('http://', adapter)
+    self.spSession.mount('https://', adapter)
 
   def getInitialCollections(self):
     """ 
@@ -50,7 +100,7 @@ class SpecifyInterface():
       RETURNS collections list (dictionary)
     """ 
     util.logger.debug('Get initial collections')
-    response = self.spSession.get(self.baseURL + "context/login/", verify=self.verifySSL)
+    response = self.requestHandler.request('GET', self.baseURL + "context/login/", verify=self.verifySSL)
     util.logger.debug(' - Response: ' + str(response.status_code) + " " + response.reason)
     collections = json.loads(response.text)['collections'] # get collections from json string and convert into dictionary
     util.logger.debug(' - Received %d collection(s)' % len(collections))
@@ -66,7 +116,7 @@ class SpecifyInterface():
        Returns csrftoken (String)
     """   
     #util.logger.debug('Get CSRF token from ', self.baseURL)
-    response = self.spSession.get(self.baseURL + 'context/login/', verify=self.verifySSL)
+    response = self.requestHandler.request('GET', self.baseURL + 'context/login/', verify=self.verifySSL)
     self.csrfToken = response.cookies.get('csrftoken')
     util.logger.debug(' - Response: %s %s' %(str(response.status_code), response.reason))
     util.logger.debug(' - CSRF Token: %s' % self.csrfToken)
@@ -100,14 +150,17 @@ class SpecifyInterface():
     """
     util.logger.debug('Log in using CSRF token & username/password')
     headers = {'content-type': 'application/json', 'X-CSRFToken': csrftoken, 'Referer': self.baseURL}
-    response = self.spSession.put(self.baseURL + "context/login/", json={"username": username, "password": passwd, "collection": collectionid}, headers=headers, verify=self.verifySSL) 
+    response = self.requestHandler.request('PUT', self.baseURL + "context/login/", json={"username": username, "password": passwd, "collection": collectionid}, headers=headers, verify=self.verifySSL) 
     
     if response.status_code > 299:
       csrftoken = ''
+      self.loggedIn = False
       util.logger.error('Error logging in to Specify! ')
       util.logger.error(response.text)
     else:
       csrftoken = response.cookies.get('csrftoken') # Keep and use new CSRF token after login
+      self.csrfToken = csrftoken
+      self.loggedIn = True
 
     util.logger.debug(' - Response: %s %s' %(str(response.status_code), response.reason))
     util.logger.debug(f' - New CSRF Token: {csrftoken}')
@@ -124,16 +177,42 @@ class SpecifyInterface():
     validity = None
 
     headers = {'content-type': 'application/json', 'X-CSRFToken': token, 'Referer': self.baseURL}
-    response = self.spSession.get(self.baseURL + "context/user.json", headers=headers, verify=self.verifySSL)
+    response = self.requestHandler.request('GET', self.baseURL + "context/user.json", headers=headers, verify=self.verifySSL)
     
     if response.status_code > 299:
       validity = False 
     else:
       validity = True
       self.csrfToken = token
+    self.loggedIn = validity
     
     return validity
 
+  def exportCookies(self):
+    """ 
+    Export the session cookies, e.g. for persisting the logged in session (see session_store.py) 
+    CONTRACT 
+      RETURNS list of cookies as dictionaries with 'name', 'value', 'domain', 'path' and 'expires'
+    """  
+    return [{'name': c.name, 'value': c.value, 'domain': c.domain, 'path': c.path, 'expires': c.expires} 
+            for c in self.spSession.cookies]
+
+  def resumeSession(self, token, cookies):
+    """ 
+    Resume a previously logged in session from its CSRF token and cookies and verify it with a single call 
+    CONTRACT 
+      token   (String) : The CSRF token of the session 
+      cookies (List)   : The session cookies as exported by exportCookies
+      RETURNS boolean to indicate session validity
+    """  
+    for cookie in cookies:
+      self.spSession.cookies.set(cookie['name'], cookie['value'], domain=cookie.get('domain', ''), 
+                                 path=cookie.get('path', '/'), expires=cookie.get('expires'))
+    valid = self.verifySession(token)
+    if not valid:
+      self.spSession.cookies.clear()
+    return valid
+
   def specifyLogout(self):
       """ 
       Function for logging out of the Specify7 API again 
@@ -151,7 +230,7 @@ class SpecifyInterface():
     """   
     util.logger.debug('Query collection object')
     headers = {'content-type': 'application/json', 'X-CSRFToken': self.csrfToken, 'Referer': self.baseURL}
-    response = self.spSession.get(self.baseURL + "api/specify/collectionobject/" + str(collectionObjectId)  + "/", headers=headers)
+    response = self.requestHandler.request('GET', self.baseURL + "api/specify/collectionobject/" + str(collectionObjectId)  + "/", headers=headers)
     util.logger.debug(' - Response: %s %s' %(str(response.status_code), response.reason))
     if response.status_code < 299:
       object = response.json()
@@ -162,6 +241,29 @@ class SpecifyInterface():
     util.logger.debug('------------------------------')
     return object 
 
+  def getMetadata(self, name, fetch):
+    """ 
+    Get rarely changing metadata from the metadata cache, if configured, or else fetch it 
+    CONTRACT 
+      name  (String)   : Name of the metadata entry, e.g. 'discipline/3' 
+      fetch (function) : Function fetching the metadata from the API; its result must be JSON serializable 
+      RETURNS metadata 
+    """ 
+    if self.metadataCache is None:
+      return fetch()
+    return self.metadataCache.get(self.baseURL, app.settings.get('collectionName'), name, fetch)
+
+  def getTreeDefItems(self, tree, treedefId):
+    """ 
+    Get the tree definition items (ranks) of a tree definition in order of rank id, through the metadata cache 
+    CONTRACT 
+      tree      (String)  : Name of the tree, e.g. 'taxon' or 'storage' 
+      treedefId (Integer) : Primary key of the tree definition 
+      RETURNS list of tree definition items (dict) 
+    """ 
+    return self.getMetadata(f'{tree}treedefitem/{treedefId}', 
+                            lambda: list(self.iterateSpecifyObjects(f'{tree}treedefitem', {'treedef': str(treedefId)}, sort='rankid')))
+
   def getSpecifyObjects(self, objectName, limit=100, offset=0, filters={}, sort='') -> dict:
     """ 
     Generic method for fetching object sets from the Specify API based on object name 
@@ -172,41 +274,151 @@ class SpecifyInterface():
       filters    (Dictionary) : Optional filters as a key, value pair of strings 
       RETURNS fetched object set 
     """ 
+    return self.getSpecifyObjectPage(objectName, limit, offset, filters, sort)['objects']
+
+  def getSpecifyObjectPage(self, objectName, limit=100, offset=0, filters={}, sort='') -> dict:
+    """ 
+    Generic method for fetching a page of objects from the Specify API including the paging meta data 
+    CONTRACT 
+      objectName (String)     : The API's name for the objects to be queried  
+      limit      (Integer)    : Maximum amount of records to be retrieve at a time. Default value: 100 
+      offset     (Integer)    : Offset of the records to be retrieved for enabling paging. Default value: 0 
+      filters    (Dictionary) : Optional filters as a key, value pair of strings 
+      sort       (String)     : Optional field name to order by (prefixed by '-' for descending order)
+      RETURNS page (Dictionary) with the fetched object set as 'objects' and paging info as 'meta' incl. 'total_count'
+      RAISES requests.HTTPError if the page could not be fetched (despite retrying), rather than returning an empty page 
+    """ 
     util.logger.debug(f'Fetching "{objectName}" with limit {limit} and offset {offset} ')
-    objectSet = {}
     headers = {'content-type': 'application/json', 'X-CSRFToken': self.csrfToken, 'Referer': self.baseURL}
     filterString = ""
     for key in filters:
         encoded_value = urllib.parse.quote(str(filters[key]))
         filterString += f"&{key}={encoded_value}"
     apiCallString = f'{self.baseURL}api/specify/{objectName}/?limit={limit}&offset={offset}{filterString}&orderby={sort}'
-    response = self.spSession.get(apiCallString, headers=headers, verify=False)
+    response = self.requestHandler.request('GET', apiCallString, headers=headers, verify=False)
     #util.logger.debug(f' - Response: {str(response.status_code)} {response.reason}')
-    if response.status_code < 299:
-      objectSet = json.loads(response.text)['objects'] # get collections from json string and convert into dictionary
-      #util.logger.debug(' - Received %d object(s)' % len(objectSet))
-    else:
+    if response.status_code > 299:
       util.logger.error(f"Response error: {response.text}")
+      raise requests.HTTPError(f"Response error: {response.status_code} fetching {objectName}", response=response)
+    page = json.loads(response.text) # get objects and meta data from json string and convert into dictionary
+    #util.logger.debug(' - Received %d object(s)' % len(page['objects']))
     
-    return objectSet 
+    return page 
+
+  def countSpecifyObjects(self, objectName, filters={}) -> int:
+    """ 
+    Generic method for counting the objects of a set in the Specify API without fetching them. 
+    Requests a single object and reads the total count from the paging meta data. 
+    CONTRACT 
+      objectName (String)     : The API's name for the objects to be counted  
+      filters    (Dictionary) : Optional filters as a key, value pair of strings 
+      RETURNS number of matching objects (Integer) 
+      RAISES requests.HTTPError if the count could not be fetched 
+    """ 
+    page = self.getSpecifyObjectPage(objectName, 1, 0, filters)
+    return int(page['meta'].get('total_count', 0))
+
+  def iterateSpecifyObjects(self, objectName, filters={}, sort='id', pageSize=100, keyset=False):
+    """ 
+    Generator yielding all objects of a set from the Specify API page by page, until the total count is reached. 
+    The next page is prefetched in the background while the current page is being consumed by the caller. 
+    Only up to two pages are held in memory at any time. 
+    In keyset mode pages are fetched in order of primary key starting after the last id received (id__gt) 
+    instead of using offsets. Thus each page costs the same regardless of depth into the table and objects 
+    are not skipped when objects already seen are deleted or merged while iterating. 
+    CONTRACT 
+      objectName (String)     : The API's name for the objects to be queried  
+      filters    (Dictionary) : Optional filters as a key, value pair of strings 
+      sort       (String)     : Field name to order by, which should be unique for stable paging. Default value: 'id'
+                                NOTE Ignored in keyset mode, which always orders by 'id' 
+      pageSize   (Integer)    : Amount of records to be retrieved per request. Default value: 100 
+      keyset     (Boolean)    : Whether to use keyset (id based) paging instead of offsets. Default value: False 
+      YIELDS fetched objects one by one 
+      RAISES requests.HTTPError if a page could not be fetched, so that a truncated iteration is never taken for a complete one 
+    """ 
+    def fetchPage(offset, lastId):
+      if keyset:
+        return self.getSpecifyObjectPage(objectName, pageSize, 0, {**filters, 'id__gt': lastId}, 'id')
+      return self.getSpecifyObjectPage(objectName, pageSize, offset, filters, sort)
+
+    prefetcher = ThreadPoolExecutor(max_workers=1, thread_name_prefix='sp7prefetch')
+    try:
+      offset = 0
+      nextPage = prefetcher.submit(fetchPage, offset, 0)
+      while nextPage:
+        page = nextPage.result()
+        objects = page['objects']
+        totalCount = page['meta'].get('total_count', 0)
+        offset += len(objects)
+
+        # Determine whether there are more objects; in keyset mode the total count only covers the ids beyond the last id 
+        if keyset:
+          hasMore = len(objects) < totalCount
+        else:
+          hasMore = offset < totalCount
+
+        # Start fetching the next page before handing over the current one 
+        nextPage = None
+        if objects and hasMore:
+          nextPage = prefetcher.submit(fetchPage, offset, objects[-1]['id'])
+
+        for object in objects:
+          yield object
+    finally:
+      prefetcher.shutdown(wait=False, cancel_futures=True)
+
+  def getSpecifyObjectsByIds(self, objectName, objectIds, chunkSize=100) -> dict:
+    """ 
+    Generic method for fetching many objects from the Specify API by their primary keys in few requests. 
+    Objects present in the response cache are taken from there, while the rest are fetched in chunks using 'id__in' filters. 
+    The objects fetched are added to the response cache. 
+    CONTRACT 
+      objectName (String)  : The API's name for the objects to be fetched  
+      objectIds  (List)    : The primary keys of the objects
+      chunkSize  (Integer) : Maximum number of ids per request. Default value: 100 
+      RETURNS dictionary of primary key (Integer) to fetched object; ids not found are absent 
+    """ 
+    objects = {}
+    missingIds = []
+    for objectId in dict.fromkeys(int(id) for id in objectIds):
+      object = self.cache.get(objectName, objectId)
+      if object is not None:
+        objects[objectId] = object
+      else:
+        missingIds.append(objectId)
+
+    for index in range(0, len(missingIds), chunkSize):
+      chunk = missingIds[index:index + chunkSize]
+      idString = ','.join(str(id) for id in chunk)
+      for object in self.getSpecifyObjects(objectName, len(chunk), 0, {'id__in': idString}, sort='id'):
+        objects[object['id']] = object
+        self.cache.put(objectName, object['id'], object)
+
+    return objects
 
   def getSpecifyObject(self, objectName, objectId):
     """ 
     Generic method for fetching an object from the Specify API using their primary key
+    The object is served from the response cache, if present, and otherwise added to it. 
     CONTRACT 
       objectName (String)  : The API's name for the object to be fetched  
       objectId   (Integer) : The primary key of the object
       RETURNS fetched object 
     """ 
+    object = self.cache.get(objectName, objectId)
+    if object is not None:
+      return object
+
     #util.logger.debug('Fetching ' + objectName + ' object on id: ' + str(objectId))
     headers = {'content-type': 'application/json', 'X-CSRFToken': self.csrfToken, 'Referer': self.baseURL}
     apiCallString = f'{self.baseURL}api/specify/{objectName}/{objectId}/' 
     #util.logger.debug(apiCallString)
-    response = self.spSession.get(apiCallString, headers=headers, verify=False)
+    response = self.requestHandler.request('GET', apiCallString, headers=headers, verify=False)
     #util.logger.debug(f' - Response: {str(response.status_code)} {response.reason}')
     #util.logger.debug(f' - Session cookies: {self.spSession.cookies.get_dict()}')
     if response.status_code < 299:
       object = response.json()
+      self.cache.put(objectName, objectId, object)
     else: 
       util.logger.error(f"Response error: {response.text}")
       object = None
@@ -226,35 +438,72 @@ class SpecifyInterface():
     apiCallString = f"{self.baseURL}api/specify/{objectName}/{objectId}/"
     util.logger.debug(apiCallString)
     util.logger.debug(specifyObject)
-    response = self.spSession.put(apiCallString, data=json.dumps(specifyObject), headers=headers)
+    self.cache.invalidate(objectName, objectId)
+    response = self.requestHandler.request('PUT', apiCallString, data=json.dumps(specifyObject), headers=headers)
     #response = requests.put(apiCallString, data=specifyObject, json=specifyObject, headers=headers)
     util.logger.debug(f' - Response: {str(response.status_code)} response.reason')
     if response.status_code < 299:
       object = response.json()
+      self.cache.put(objectName, objectId, object)
     else: 
       object = None
     return object 
     #return response.status_code 
 
-  def postSpecifyObject(self, objectName, specifyObject):
+  def postSpecifyObject(self, objectName, specifyObject, lookupFields=None):
     """ 
     Generic method for posting a new object to the Specify API including a primary key
+    A failed POST is only sent again after checking that no object matching the lookup fields was created in the meantime. 
     CONTRACT 
       objectName    (String)  : The API's name for the object to be fetched  
       specifyObject (JSON)    : The state of the object to be created 
+      lookupFields  (List)    : Fields identifying the new object. Default: as listed in POST_LOOKUP_FIELDS. 
+                                If there are none, a failed POST is not sent again.
       RETURNS boolean to indicate success  
     """ 
     headers = {'content-type': 'application/json', 'X-CSRFToken': self.csrfToken, 'referer': self.baseURL}
     apiCallString = f"{self.baseURL}api/specify/{objectName}/"
     util.logger.debug(apiCallString)
-    response = self.spSession.post(apiCallString, headers=headers, json=specifyObject, verify=False)
+
+    lookupFields = lookupFields if lookupFields is not None else POST_LOOKUP_FIELDS.get(objectName)
+    recover = None
+    if lookupFields:
+      recover = lambda: self.findPostedObject(objectName, specifyObject, lookupFields)
+
+    response = self.requestHandler.request('POST', apiCallString, recover=recover, headers=headers, json=specifyObject, verify=False)
     util.logger.debug(' - Response: %s %s' %(str(response.status_code), response.reason))
     if response.status_code < 299:
-       return response.json()
+       object = response.json()
+       self.cache.put(objectName, object['id'], object)
+       return object
     else: 
-      util.logger.debug(f' - ERROR trying to delete object!')
+      util.logger.debug(f' - ERROR trying to post object!')
       raise Exception(f"Response error: {response.status_code}")
 
+  def findPostedObject(self, objectName, specifyObject, lookupFields):
+    """ 
+    Existence check for a failed POST: Look up the most recent object matching the posted object on the lookup fields 
+    CONTRACT 
+      objectName    (String) : The API's name for the object posted  
+      specifyObject (JSON)   : The state of the object posted 
+      lookupFields  (List)   : Fields identifying the object 
+      RETURNS RecoveredResponse holding the object found or None if absent 
+    """ 
+    filters = {}
+    for field in lookupFields:
+      if field not in specifyObject: continue
+      value = specifyObject[field]
+      if value is None:
+        filters[f'{field}__isnull'] = 'true'
+      elif isinstance(value, str) and value.startswith('/api/specify/'):
+        filters[field] = value.rstrip('/').split('/')[-1] # Resource URI to primary key 
+      else:
+        filters[field] = value
+    if not filters: return None
+
+    objects = self.getSpecifyObjects(objectName, 1, 0, filters, sort='-id')
+    return RecoveredResponse(201, objects[0]) if objects else None
+
   def deleteSpecifyObject(self, objectName, objectId):
     """ 
     Generic method for deleting an object from the Specify API using their primary key
@@ -267,7 +516,8 @@ class SpecifyInterface():
     headers = {'content-type': 'application/json', 'X-CSRFToken': self.csrfToken, 'Referer': self.baseURL}
     apiCallString = f'{self.baseURL}api/specify/{objectName}/{objectId}/' 
     util.logger.debug(apiCallString)
-    response = self.spSession.delete(apiCallString, headers=headers, verify=False)
+    self.cache.invalidate(objectName, objectId)
+    response = self.requestHandler.request('DELETE', apiCallString, headers=headers, verify=False)
     util.logger.debug(f' - Response: {str(response.status_code)} {response.reason}')
     util.logger.debug(f' - Session cookies: {self.spSession.cookies.get_dict()}')
     if response.status_code < 299:
@@ -289,7 +539,7 @@ class SpecifyInterface():
     apiCallString = "%s%s" %(self.baseURL, callString)
     util.logger.debug(apiCallString)
     headers = {'content-type': 'application/json', 'X-CSRFToken': self.csrfToken, 'Referer': self.baseURL}
-    response = self.spSession.get(apiCallString, headers=headers)
+    response = self.requestHandler.request('GET', apiCallString, headers=headers)
     util.logger.debug(' - Response: %s %s' %(str(response.status_code), response.reason))
     
     if response.status_code < 299:
@@ -305,7 +555,7 @@ class SpecifyInterface():
     """ 
     util.logger.debug('Log out')
     headers = {'content-type': 'application/json', 'X-CSRFToken': self.csrfToken, 'Referer': self.baseURL}
-    response = self.spSession.put(self.baseURL + "context/login/", data="{\"username\": null, \"password\": null, \"collection\": 688130}", headers=headers)
+    response = self.requestHandler.request('PUT', self.baseURL + "context/login/", data="{\"username\": null, \"password\": null, \"collection\": 688130}", headers=headers)
     util.logger.debug(' - %s %s ' %(str(response.status_code), response.reason))
     util.logger.debug('------------------------------')
 
@@ -314,24 +564,34 @@ class SpecifyInterface():
     Special function for merging tree nodes. 
     Merging is done from the source node to the target node. 
     The source node will be deleted and the target node and its Specify id will prevail. 
+    A failed merge is only sent again after checking that the source node still exists. 
+    A merge timing out is not sent again, since it may still be running at the server with the source node still present. 
     CONTRACT 
       tree_name (string) : Name of the Specify Tree to be handled: {"taxon", "storage", "geography"} 
       source_id (int)    : Specify ID of the node to be merged into the target node 
       target_id (int)    : Specify ID of the node to be merged with (the target node)
       RETURNS response object 
+      RAISES requests.RequestException if the merge failed without response despite retrying 
     """   
     headers = {'X-CSRFToken': self.csrfToken, 'referer': self.baseURL, } 
     apiCallString = f"{self.baseURL}api/specify_tree/{tree_name}/{source_id}/merge/"
     util.logger.debug(" - API call: %s"%apiCallString)
+
+    # Merging affects the source node, the target node and the children moved, so drop all cached nodes of the tree 
+    self.cache.invalidateTable(tree_name)
+
+    def recover():
+      # The merge took effect if the source node is gone 
+      response = self.requestHandler.request('GET', f'{self.baseURL}api/specify/{tree_name}/{source_id}/', headers=headers, verify=False)
+      return RecoveredResponse(204) if response.status_code == 404 else None
     
     try:
-      response = self.spSession.post(apiCallString, headers=headers, data={'target' : target_id }, timeout=960) 
-    except Exception as e:
-      util.logger.error(str(e))
-      traceBack = traceback.format_exc()
-      util.logger.error(traceBack)
-      util.logger.debug(f' - Response: {str(response.status_code)} {response.reason} {response.text}.')
-      response = util.Struct(status_code='408')
+      response = self.requestHandler.request('POST', apiCallString, recover=recover, retryTimeouts=False, 
+                                              headers=headers, data={'target' : target_id }, timeout=960) 
+    except requests.RequestException as e:
+      util.logger.error(f'Merging {tree_name} {source_id} into {target_id} failed: {e}')
+      raise
+    util.logger.debug(f' - Response: {str(response.status_code)} {response.reason}')
 
     return response
 
@@ -339,30 +599,36 @@ class SpecifyInterface():
     """
     Special function for moving a node to another parent. 
     The parent node to be moved to is termed the target node. 
+    A failed move is only sent again after checking that the node has not been moved to the target already. 
+    A move timing out is not sent again, since it may still be running at the server. 
     CONTRACT 
       tree_name (string) : Name of the Specify Tree to be handled: {"taxon", "storage", "geography"} 
       source_id (int)    : Specify ID of the node to be moved to the target node being the new parent 
       target_id (int)    : Specify ID of the new parent node to be moved to (the target node)
       RETURNS response object 
+      RAISES requests.RequestException if the move failed without response despite retrying 
     """   
     headers = {'X-CSRFToken': self.csrfToken, 'referer': self.baseURL, } 
     apiCallString = f"{self.baseURL}api/specify_tree/{tree_name}/{source_id}/move/"
     # TODO target_id into header as "target"
     util.logger.debug(" - API call: %s"%apiCallString)
-    exception = False
 
-    #input('ready?')
+    # Moving affects the node and the full names of its descendants, so drop all cached nodes of the tree 
+    self.cache.invalidateTable(tree_name)
+
+    def recover():
+      # The move took effect if the node's parent is the target already 
+      response = self.requestHandler.request('GET', f'{self.baseURL}api/specify/{tree_name}/{source_id}/', headers=headers, verify=False)
+      if response.status_code < 299 and str(response.json().get('parent') or '').rstrip('/').endswith(f'/{target_id}'):
+        return RecoveredResponse(204)
+      return None
     
     try:
-      response = self.spSession.post(apiCallString, headers=headers, data={'target' : target_id }, timeout=960) 
-    except Exception as e:
-      util.logger.error(str(e))
-      traceBack = traceback.format_exc()
-      util.logger.error(traceBack)
-      exception = True
-      #util.logger.debug(f' - Response: {str(response.status_code)} {response.reason} {response.text}.')
-      response = util.Struct(status_code='408')
-    
-    #print(response) 
+      response = self.requestHandler.request('POST', apiCallString, recover=recover, retryTimeouts=False, 
+                                              headers=headers, data={'target' : target_id }, timeout=960) 
+    except requests.RequestException as e:
+      util.logger.error(f'Moving {tree_name} {source_id} to {target_id} failed: {e}')
+      raise
+    util.logger.debug(f' - Response: {str(response.status_code)} {response.reason}')
 
     return response
@@ -0,0 +1,23 @@
+import pytest
+import global_settings as app
+import configuration
+import specify_fake_server
+
+@pytest.fixture(scope='module')
+def server():
+    """ Fake Specify7 server of the test module """
+    fake = specify_fake_server.FakeSpecifyServer()
+    fake.start()
+    yield fake
+    fake.stop()
+
+@pytest.fixture(scope='module')
+def spi(server):
+    """ Interface logged in to the module's fake server; the global settings configured for it are restored afterwards """
+    settings = dict(app.settings)
+    cfg = configuration.ConfigurationHandler()
+    cfg.applyConfiguration({'mode': 'fake', 'domain': server.baseURL, 'collection': 'KUFishvoucher',
+                            'username': server.username, 'password': server.password})
+    yield cfg.sp
+    app.settings.clear()
+    app.settings.update(settings)
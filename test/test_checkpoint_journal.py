@@ -0,0 +1,140 @@
+import os
+import pytest
+import global_settings as app
+import tools.mass_add_storage_nodes
+import tools.import_synonyms
+from checkpoint_journal import CheckpointJournal
+
+def test_journalPerTarget(tmp_path):
+    """ Test whether a journal is only resumed against the server and collection it was written for """
+    datafile = tmp_path / 'rows.csv'
+    datafile.write_text('Building,Room\nSite,Room 1\n', encoding='utf-8')
+    journals = tmp_path / 'journals'
+
+    journal = CheckpointJournal('Tool', datafile, 'https://test.example/', 'Fishes', journals)
+    journal.complete(1)
+    journal.close()
+
+    resumed = CheckpointJournal('Tool', datafile, 'https://test.example/', 'Fishes', journals)
+    assert resumed.completed == {1}
+    resumed.close()
+    production = CheckpointJournal('Tool', datafile, 'https://production.example/', 'Fishes', journals)
+    assert not production.resumed
+    production.close()
+    other = CheckpointJournal('Tool', datafile, 'https://test.example/', 'Birds', journals)
+    assert not other.resumed
+    other.close(completed=True)
+
+    # A journal of another target found under the path of this one is refused
+    production.path.write_bytes(journal.path.read_bytes())
+    with pytest.raises(Exception, match='production'):
+        CheckpointJournal('Tool', datafile, 'https://production.example/', 'Fishes', journals)
+
+def test_checkpointJournal(server, spi, tmp_path, monkeypatch):
+    """ Test whether a run restarted after a crash skips the rows completed and re-uses the nodes created """
+    monkeypatch.chdir(tmp_path)
+    os.makedirs('data')
+    filename = 'checkpoint.csv'
+    rows = [f'Journal Site,Room {number // 3},{number}' for number in range(1, 10)]
+    with open(f'data/{filename}', 'w', encoding='utf-8') as file:
+        file.write('Building,Room,Freezer\n' + '\n'.join(rows) + '\n')
+    app.settings['checkpoint'] = {'path': str(tmp_path / 'journals'), 'batchSize': 2}
+    try:
+        processed = []
+        class CrashingTool(tools.mass_add_storage_nodes.MassAddStorageNodeTool):
+            planPaths = False
+            def processRow(self, headers, row):
+                if row['Freezer'] == '5' and not processed.count('crashed'):
+                    processed.append('crashed')
+                    raise KeyboardInterrupt()
+                processed.append(row['Freezer'])
+                super().processRow(headers, row)
+
+        tool = CrashingTool(spi)
+        try:
+            tool.handleDatafile(filename)
+        except KeyboardInterrupt:
+            pass
+        assert processed == ['1', '2', '3', '4', 'crashed']
+
+        server.resetCounts()
+        tool = CrashingTool(spi)
+        tool.handleDatafile(filename)
+        assert processed[5:] == ['5', '6', '7', '8', '9']
+        # Building and room of row 5 were created before the crash and are not looked up again
+        assert server.requestCounts['post'] == 7
+        site = next(node for node in server.objects('storage') if node['name'] == 'Journal Site')
+        assert len(spi.getSpecifyObjects('storage', filters={'parent': site['id'], 'name': 'Room 1'})) == 1
+        assert os.listdir(app.settings['checkpoint']['path']) == []
+    finally:
+        app.settings['checkpoint'] = None
+
+def test_checkpointFailedRow(server, spi, tmp_path, monkeypatch):
+    """ Test whether a row failing in a journaled run is not recorded as completed and succeeds when resumed """
+    monkeypatch.chdir(tmp_path)
+    os.makedirs('data')
+    filename = 'checkpoint_failed.csv'
+    headers = 'Kingdom,Phylum,Subphylum,Class,Subclass,Order,Suborder,Superfamily,Family,Genus,Species,SpeciesAuthor,' \
+              'isAccepted,AcceptedGenus,AcceptedSpecies,AcceptedSpeciesAuthor'
+    rows = [f'Animalia,Chordata,,Mammalia,,Carnivora,,,Journalidae,Journalus,{name},,Yes,,,' for name in ('alpha', 'beta', 'gamma')]
+    with open(f'data/{filename}', 'w', encoding='utf-8') as file:
+        file.write(headers + '\n' + '\n'.join(rows) + '\n')
+    app.settings['checkpoint'] = {'path': str(tmp_path / 'journals'), 'batchSize': 1}
+    app.settings['skipFailedRows'] = True
+    try:
+        processed = []
+        class FailingTool(tools.import_synonyms.ImportSynonymTool):
+            def addChildNodes(self, headers, row, parent_id, index, filters={}):
+                if index == 0:
+                    processed.append(row['Species'])
+                    if row['Species'] == 'beta' and processed.count('beta') == 1:
+                        raise Exception('Temporary failure')
+                return super().addChildNodes(headers, row, parent_id, index, filters)
+
+        tool = FailingTool(spi)
+        tool.handleDatafile(filename)
+        assert processed == ['alpha', 'beta', 'gamma']
+        assert [failure['Species'] for failure in tool.failures] == ['beta']
+        assert len(os.listdir(app.settings['checkpoint']['path'])) == 1
+
+        # Resuming retries the failed row only, and completes the run
+        tool = FailingTool(spi)
+        tool.handleDatafile(filename)
+        assert processed[3:] == ['beta']
+        assert tool.failures == []
+        assert sorted(taxon['name'] for taxon in server.objects('taxon') if taxon['fullname'].startswith('Journalus ')) == ['alpha', 'beta', 'gamma']
+        assert os.listdir(app.settings['checkpoint']['path']) == []
+    finally:
+        app.settings['checkpoint'] = None
+        app.settings['skipFailedRows'] = False
+
+def test_failedRowStopsRun(server, spi, tmp_path, monkeypatch):
+    """ Test whether a failing row stops a run processing rows one at a time, and failures of a run are not carried over """
+    monkeypatch.chdir(tmp_path)
+    os.makedirs('data')
+    filename = 'stop.csv'
+    with open(f'data/{filename}', 'w', encoding='utf-8') as file:
+        file.write('Building,Room,Freezer\n' + '\n'.join(f'Stop Site,Room 1,{number}' for number in range(1, 4)) + '\n')
+
+    processed = []
+    class FailingTool(tools.mass_add_storage_nodes.MassAddStorageNodeTool):
+        planPaths = False
+        def processRow(self, headers, row):
+            processed.append(row['Freezer'])
+            if row['Freezer'] == '2': raise Exception('Freezer failed')
+            super().processRow(headers, row)
+
+    tool = FailingTool(spi)
+    with pytest.raises(Exception, match='Freezer failed'):
+        tool.handleDatafile(filename)
+    assert processed == ['1', '2']
+
+    # Carrying on when asked to, and a later run reporting only its own failures
+    app.settings['skipFailedRows'] = True
+    try:
+        tool.handleDatafile(filename)
+        assert [failure['Freezer'] for failure in tool.failures] == ['2']
+        tool.handleDatafile(filename)
+        assert [failure['Freezer'] for failure in tool.failures] == ['2']
+    finally:
+        app.settings['skipFailedRows'] = False
@@ -0,0 +1,84 @@
+import global_settings as app
+import data_access
+import models.discipline
+import tools.mass_add_storage_nodes
+
+def test_localMirror(spi):
+    """ Test mirroring objects to the local database and saving, loading and deleting model records """
+    tool = tools.mass_add_storage_nodes.MassAddStorageNodeTool(spi)
+    tool.processRow(['Building', 'Room', 'Freezer'], {'Building': 'Mirror Site', 'Room': 'Room 1', 'Freezer': '1'})
+
+    db = data_access.DataAccess('test_mirror', inMemory=True)
+    nodes = spi.getSpecifyObjects('storage', limit=100, filters={'definition': 1})
+    assert db.upsertObjects('storage', nodes) == len(nodes)
+    assert db.upsertObjects('storagetreedefitem', spi.getSpecifyObjects('storagetreedefitem', limit=100)) > 0
+    assert db.count('storage') == len(nodes)
+    assert db.count('taxontreedefitem') == 0
+
+    # Queries on the indexed columns return the objects as fetched from the API
+    child = next(node for node in nodes if node.get('parent'))
+    parentid = int(child['parent'].split('/')[4])
+    found = db.getObjects('storage', {'parentid': parentid, 'name': child['name']})
+    assert found[0]['id'] == child['id']
+    assert db.getObjects('storagetreedefitem', {'name': 'Freezer'})[0]['rankid'] == 325
+    assert db.getObjects('storagetreedefitem', {'name': 'freezer'})[0]['rankid'] == 325
+
+    # Mirroring an object again updates it in place
+    db.upsertObjects('storage', [{**child, 'name': 'Renamed'}])
+    assert db.count('storage') == len(nodes)
+    assert db.getObjects('storage', {'spid': child['id']})[0]['name'] == 'Renamed'
+    assert db.deleteObjects('storage', [child['id']]) == 1
+    assert db.getObjects('storage', {'spid': child['id']}) == []
+
+    settings = app.settings['database']
+    app.settings['database'] = {'name': 'test_models', 'in_memory': True}
+    try:
+        record = models.discipline.Discipline(4)
+        record.fill({'id': 3, 'name': 'Ichthyology', 'taxontreedef': '/api/specify/taxontreedef/1/'})
+        record.save()
+        assert record.id > 0
+        record.name = 'Fishes'
+        record.save()
+
+        loaded = models.discipline.Discipline(4)
+        assert loaded.load(record.id)['spid'] == 3
+        assert (loaded.name, loaded.taxontreedefid) == ('Fishes', 1)
+        assert loaded.delete()
+        assert loaded.load(record.id) is None
+    finally:
+        app.settings['database'] = settings
+        data_access.databases.pop('test_models', None)
+
+def test_saveMirroredModel(spi):
+    """ Test saving model records into a database mirroring the same Specify objects """
+    settings = app.settings['database']
+    app.settings['database'] = {'name': 'test_shared', 'in_memory': True}
+    try:
+        db = data_access.getDataAccess()
+        db.upsertObjects('discipline', [{'id': 3, 'name': 'Ichthyology', 'taxontreedef': '/api/specify/taxontreedef/1/'}])
+
+        # Saving a model of a mirrored object updates the mirrored record
+        record = models.discipline.Discipline(4)
+        record.fill({'id': 3, 'name': 'Fishes', 'taxontreedef': '/api/specify/taxontreedef/1/'})
+        record.save()
+        assert db.getRows('discipline', {'spid': 3})[0]['name'] == 'Fishes'
+        assert record.load(record.id)['json'] is not None
+        assert db.getObjects('discipline', {'name': 'Fishes'}) == \
+            [{'id': 3, 'name': 'Fishes', 'taxontreedef': '/api/specify/taxontreedef/1/'}]
+
+        # Updating the model's record updates the mirrored object as well
+        record.taxontreedefid = 2
+        record.save()
+        assert db.getObjects('discipline', {'spid': 3})[0]['taxontreedef'] == '/api/specify/taxontreedef/2/'
+
+        # New records not in Specify yet (primary key 0) neither clash nor count as mirrored
+        first, second = models.discipline.Discipline(4), models.discipline.Discipline(4)
+        first.name, second.name = 'New 1', 'New 2'
+        first.save()
+        second.save()
+        assert first.id != second.id
+        assert db.count('discipline') == 1
+        assert db.getSpids('discipline') == [3]
+    finally:
+        app.settings['database'] = settings
+        data_access.databases.pop('test_shared', None)
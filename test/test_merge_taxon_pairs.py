@@ -0,0 +1,156 @@
+import os
+import time
+import pytest
+import global_settings as app
+import specify_interface as sp
+import request_handler
+import tools.merge_taxon_pairs
+
+@pytest.fixture(scope='module')
+def spi(server, spi):
+    """ Interface of its own retrying only once, logged in to the module's fake server """
+    rsp = sp.SpecifyInterface(retryPolicy=request_handler.RetryPolicy(maxAttempts=2, backoffBase=0.01))
+    rsp.specifyLogin(server.username, server.password, 4)
+    return rsp
+
+@pytest.fixture(scope='module')
+def tool(spi):
+    return tools.merge_taxon_pairs.MergeTaxonPairsTool(spi)
+
+def addTaxa(server, count, prefix):
+    """ Add genera directly to the fake server """
+    return [server.addObject('taxon', {'name': f'{prefix}{i}', 'fullname': f'{prefix}{i}', 'rankid': 180,
+                                       'parent': '/api/specify/taxon/1/'}) for i in range(count)]
+
+def test_initialization(tool):
+    """ Test whether class initializes properly """
+    assert tool is not None
+    assert tool.concurrency > 1
+
+def test_handleRowsParallel(server, tool, tmp_path, monkeypatch):
+    """ Test whether independent pairs are merged concurrently, chained pairs in order and failures are summarized """
+    taxa = addTaxa(server, 20, 'Parallelus')
+    ids = [str(taxon['id']) for taxon in taxa]
+    rows = [{'from_id': ids[i], 'to_id': ids[i + 8]} for i in range(8)]    # Independent pairs
+    rows += [{'from_id': ids[16], 'to_id': ids[17]}, {'from_id': ids[17], 'to_id': ids[18]}]  # Chained pairs
+    rows += [{'from_id': 'x', 'to_id': ids[0]}]                              # Invalid row
+
+    server.setLatency('merge', 0.1)
+    tool.parallel = True
+    monkeypatch.chdir(tmp_path)
+    try:
+        start = time.time()
+        results = tool.handleRows(['from_id', 'to_id'], iter(rows))
+        elapsed = time.time() - start
+        assert tool.failures == []
+
+        server.injectFailures('merge', [None, None])                       # Pair fails twice without response
+        tool.handleRows(['from_id', 'to_id'], iter([{'from_id': ids[19], 'to_id': ids[18]}]))
+        saved = os.listdir('output')
+    finally:
+        server.setLatency('merge', 0)
+        tool.parallel = False
+
+    assert len(results) == 10
+    assert [failure['row'] for failure in tool.failures] == [1]
+    assert any(name.startswith('row_failures_MergeTaxonPairsTool') for name in saved)
+
+    # Independent pairs merged, chained pairs merged one after the other into the last taxon
+    assert all(server.getObject('taxon', id) is None for id in ids[0:8] + ids[16:18])
+    assert all(server.getObject('taxon', id) is not None for id in ids[8:16] + ids[18:20])
+
+    # Sequentially 10 merges take at least 1 second
+    assert elapsed < 0.8
+
+def test_handleRowsParallelFailedDependency(server, spi, tmp_path, monkeypatch):
+    """ Test whether rows are read ahead boundedly and rows sharing a taxon with a failed row fail without being merged """
+    taxa = addTaxa(server, 63, 'Dependus')
+    ids = [str(taxon['id']) for taxon in taxa]
+    rows = [{'from_id': ids[0], 'to_id': ids[1]}, {'from_id': ids[1], 'to_id': ids[2]}]   # Chained pairs, the first failing
+    rows += [{'from_id': ids[i], 'to_id': ids[i + 30]} for i in range(3, 33)]           # Independent pairs
+    read = []
+    done = []
+    readAhead = []
+    def readRows():
+        for row in rows:
+            read.append(row)
+            yield row
+
+    class FailingTool(tools.merge_taxon_pairs.MergeTaxonPairsTool):
+        def processRow(self, headers, row):
+            try:
+                if row['from_id'] == ids[0]:
+                    raise Exception('Merge failed')
+                time.sleep(0.01)
+                super().processRow(headers, row)
+                readAhead.append(len(read) - len(done))
+            finally:
+                done.append(row)
+
+    failing = FailingTool(spi)
+    failing.parallel = True
+    monkeypatch.chdir(tmp_path)
+    results = failing.handleRows(['from_id', 'to_id'], readRows())
+
+    assert len(results) == 32
+    assert [(failure['row'], failure['error']) for failure in failing.failures] == \
+        [(1, 'Merge failed'), (2, 'Skipped, since row 1 sharing objects with it failed')]
+    assert server.getObject('taxon', ids[1]) is not None
+    assert all(server.getObject('taxon', id) is None for id in ids[3:33])
+    # Rows read beyond those done: at most the rows in flight, the row read while waiting and the row skipped
+    assert max(readAhead) <= 2 * failing.concurrency + 2
+
+def test_handleRowsPipelined(server, spi, tool):
+    """ Test whether rows streamed through the pipeline are merged concurrently, chained pairs in order """
+    taxa = addTaxa(server, 12, 'Pipelinus')
+    ids = [str(taxon['id']) for taxon in taxa]
+    rows = [{'from_id': ids[i], 'to_id': ids[i + 5]} for i in range(5)]    # Independent pairs
+    rows += [{'from_id': ids[10], 'to_id': ids[11]}, {'from_id': ids[11], 'to_id': ids[5]}]  # Chained pairs
+    rows += [{'from_id': 'x', 'to_id': ids[0]}]                              # Invalid row
+
+    server.setLatency('merge', 0.1)
+    app.settings['pipeline'] = {'queueSize': 2}    # Written by as many writers as the tool's concurrency
+    tool.failures = []
+    spi.metrics.reset()
+    try:
+        start = time.time()
+        results = tool.handleRows(['from_id', 'to_id'], iter(rows))
+        elapsed = time.time() - start
+    finally:
+        server.setLatency('merge', 0)
+        app.settings['pipeline'] = None
+
+    assert len(results) == 7
+    assert tool.failures == []
+    assert all(server.getObject('taxon', id) is None for id in ids[0:5] + ids[10:12])
+    assert server.getObject('taxon', ids[5]) is not None
+    assert elapsed < 0.6
+    assert spi.metrics.counters['pipeline.validate.items'] == 8
+    assert spi.metrics.counters['pipeline.write.items'] == 7
+
+def test_handleRowsPipelinedFailedDependency(server, spi, tmp_path, monkeypatch):
+    """ Test whether rows sharing a taxon with a row failing ahead of the write stage fail without being merged """
+    monkeypatch.chdir(tmp_path)
+    taxa = addTaxa(server, 6, 'Prefailus')
+    ids = [str(taxon['id']) for taxon in taxa]
+    rows = [{'from_id': ids[0], 'to_id': ids[1]}, {'from_id': ids[1], 'to_id': ids[2]}]   # Chained pairs, the first failing
+    rows += [{'from_id': ids[3], 'to_id': ids[4]}]                                      # Independent pair
+
+    class FailingTool(tools.merge_taxon_pairs.MergeTaxonPairsTool):
+        def resolveRow(self, headers, row):
+            if row['from_id'] == ids[0]:
+                raise Exception('Resolving failed')
+            return None
+
+    failing = FailingTool(spi)
+    app.settings['pipeline'] = {'queueSize': 2}
+    try:
+        results = failing.handleRows(['from_id', 'to_id'], iter(rows))
+    finally:
+        app.settings['pipeline'] = None
+
+    assert len(results) == 3
+    assert [(failure['row'], failure['error']) for failure in failing.failures] == \
+        [(1, 'Resolving failed'), (2, 'Skipped, since a row sharing objects with it failed')]
+    assert all(server.getObject('taxon', id) is not None for id in ids[0:3])
+    assert server.getObject('taxon', ids[3]) is None
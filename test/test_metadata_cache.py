@@ -0,0 +1,40 @@
+import os
+import global_settings as app
+import specify_interface as sp
+import tools.mass_add_storage_nodes
+from metadata_cache import MetadataCache
+
+def test_metadataCache(server, spi, tmp_path):
+    """ Test whether tree definitions are persisted between runs and fetched anew when refreshed """
+    path = os.path.join(tmp_path, 'metadata_cache.json')
+    app.settings['metadataCache'] = {'path': path, 'ttl': 60}
+    try:
+        server.resetCounts()
+        tool = tools.mass_add_storage_nodes.MassAddStorageNodeTool(sp.SpecifyInterface())
+        fetched = server.requestCounts['list']
+
+        # A new run takes collection, discipline and tree definition items from the cache
+        server.resetCounts()
+        tool = tools.mass_add_storage_nodes.MassAddStorageNodeTool(sp.SpecifyInterface())
+        assert server.requestCounts['list'] == fetched - 1
+        assert server.requestCounts['get'] == 0
+        assert tool.getTreeDefItem('Freezer')['rankid'] == 325
+        assert tool.getTreeDefItemByRankId(325)['name'] == 'Freezer'
+        assert tool.getRankId('Unknown') == 0
+
+        app.settings['metadataCache'] = {'path': path, 'ttl': 60, 'refresh': True}
+        server.resetCounts()
+        tool = tools.mass_add_storage_nodes.MassAddStorageNodeTool(sp.SpecifyInterface())
+        assert server.requestCounts['list'] == fetched
+    finally:
+        app.settings['metadataCache'] = None
+
+def test_emptyNotCached(tmp_path):
+    """ Test whether a failed fetch returning None or nothing is not served from the cache afterwards """
+    cache = MetadataCache(tmp_path / 'metadata_cache.json', ttl=60)
+    assert cache.get('https://test.example/', 'Fishes', 'taxontreedef/1', lambda: None) is None
+    assert cache.get('https://test.example/', 'Fishes', 'taxontreedefitem/1', lambda: []) == []
+    assert not (tmp_path / 'metadata_cache.json').exists()
+
+    assert cache.get('https://test.example/', 'Fishes', 'taxontreedef/1', lambda: {'id': 1}) == {'id': 1}
+    assert cache.get('https://test.example/', 'Fishes', 'taxontreedef/1', lambda: None) == {'id': 1}
@@ -0,0 +1,71 @@
+import pytest
+import requests
+import data_access
+import mirror_sync
+import tools.mass_add_storage_nodes
+
+def addStorageNodes(spi):
+    """ Add a few storage nodes beneath the root of the storage tree """
+    tool = tools.mass_add_storage_nodes.MassAddStorageNodeTool(spi)
+    for freezer in ('1', '2'):
+        tool.processRow(['Building', 'Room', 'Freezer'], {'Building': 'Sync Site', 'Room': 'Room 1', 'Freezer': freezer})
+
+def test_mirrorSync(server, spi):
+    """ Test whether later synchronizations only fetch modified objects and detect deleted ones """
+    addStorageNodes(spi)
+    db = data_access.DataAccess('test_sync', inMemory=True)
+    syncer = mirror_sync.MirrorSync(spi, db, pageSize=2)
+    # Backdate the existing nodes, since the server's timestamps only resolve seconds
+    for index, node in enumerate(server.objects('storage')):
+        node['timestampmodified'] = f'2026-01-01T{index // 3600:02d}:{index // 60 % 60:02d}:{index % 60:02d}'
+    first = syncer.sync('storage')
+    assert first['fetched'] == db.count('storage') == spi.countSpecifyObjects('storage')
+    assert not first['reconciled']
+
+    # Nothing changed: only the latest modification, the objects modified at that time and the count are requested
+    unchanged = syncer.sync('storage')
+    assert unchanged['fetched'] == 1
+    assert unchanged['deleted'] == 0 and not unchanged['reconciled']
+    assert unchanged['requests'] <= 3
+
+    nodes = spi.getSpecifyObjects('storage', limit=100, sort='id')
+    node = next(node for node in nodes if node.get('parent') and node.get('definitionitem'))
+    renamed = spi.putSpecifyObject('storage', node['id'], {**node, 'name': 'Renamed'})
+    added = spi.postSpecifyObject('storage', {'name': 'Synced', 'fullname': 'Synced', 'rankid': node['rankid'],
+                                              'parent': node['parent'], 'definitionitem': node['definitionitem']})
+    assert spi.deleteSpecifyObject('storage', nodes[-1]['id'])
+
+    second = syncer.sync('storage')
+    assert second['deleted'] == 1 and second['reconciled']
+    assert second['fetched'] == 2
+    assert db.getObjects('storage', {'spid': renamed['id']})[0]['name'] == 'Renamed'
+    assert db.getObjects('storage', {'spid': added['id']})[0]['name'] == 'Synced'
+    assert db.getSpids('storage') == [node['id'] for node in spi.iterateSpecifyObjects('storage', keyset=True)]
+    assert db.getSyncState('storage')['watermark'] == second['watermark']
+
+def test_mirrorSyncFailure(spi):
+    """ Test whether a failed request neither advances the watermark nor removes objects from the mirror """
+    class FailingInterface():
+        def __init__(self, failing): self.failing = failing
+        def __getattr__(self, name): return getattr(spi, name)
+        def iterateSpecifyObjects(self, *args, **kwargs):
+            for index, obj in enumerate(spi.iterateSpecifyObjects(*args, **kwargs)):
+                if 'iterate' in self.failing and index == 2: raise requests.HTTPError('Response error: 500')
+                yield obj
+        def countSpecifyObjects(self, *args, **kwargs):
+            if 'count' in self.failing: raise requests.HTTPError('Response error: 500')
+            return spi.countSpecifyObjects(*args, **kwargs)
+
+    db = data_access.DataAccess('test_sync_failure', inMemory=True)
+    mirror_sync.MirrorSync(spi, db, pageSize=2).sync('storage')
+    spids = db.getSpids('storage')
+
+    with pytest.raises(requests.HTTPError):
+        mirror_sync.MirrorSync(FailingInterface({'count'}), db, pageSize=2).sync('storage', reconcile=True)
+    assert db.getSpids('storage') == spids
+
+    db.setSyncState('storage', watermark='2000-01-01T00:00:00')
+    with pytest.raises(requests.HTTPError):
+        mirror_sync.MirrorSync(FailingInterface({'iterate'}), db, pageSize=2).sync('storage')
+    assert db.getSyncState('storage')['watermark'] == '2000-01-01T00:00:00'
+    assert db.getSpids('storage') == spids
@@ -0,0 +1,138 @@
+import os
+import re
+import time
+import threading
+import pytest
+from pipeline import Pipeline, Stage, SKIP
+from request_metrics import RequestMetrics
+
+def test_stagesInOrder():
+    """ Test whether items pass all stages, skipped and failed items are left out and results keep their order """
+    def parse(item): return int(item)
+    def validate(item): return item if item % 5 else SKIP
+    def resolve(item):
+        if item == 7: raise ValueError('seven')
+        return item * 10
+
+    pipeline = Pipeline([Stage('parse', parse), Stage('validate', validate, 2), Stage('resolve', resolve, 3),
+                         Stage('write', lambda item: item + 1, 2)], queueSize=2)
+    results = pipeline.run(str(number) for number in range(1, 13))
+    assert results == [(n, n * 10 + 1) for n in (1, 2, 3, 4, 6, 8, 9, 11, 12)]
+    assert [(failure['number'], failure['stage'], failure['error']) for failure in pipeline.failures] == [(7, 'resolve', 'seven')]
+
+def test_orderedStage():
+    """ Test whether an ordered stage starts its items in order even though the stage before finishes them out of order """
+    started = []
+    lock = threading.Lock()
+    def shuffle(item):
+        time.sleep(0.01 * (item % 3))
+        return item
+    def write(item):
+        with lock: started.append(item)
+        return item
+
+    pipeline = Pipeline([Stage('resolve', shuffle, 4), Stage('write', write, 1, ordered=True)])
+    pipeline.run(range(1, 21))
+    assert started == list(range(1, 21))
+
+def test_backPressure():
+    """ Test whether a slow stage bounds the items read ahead and stage metrics are recorded """
+    read = []
+    written = []
+    def items():
+        for number in range(1, 21):
+            read.append(number)
+            yield number
+    def write(item):
+        time.sleep(0.01)
+        written.append(item)
+        # Bounded queues: at most a few queues full of items read ahead of the slow stage
+        assert len(read) - len(written) <= 2 * 3 + 3
+        return item
+
+    metrics = RequestMetrics()
+    pipeline = Pipeline([Stage('parse', lambda item: item), Stage('write', write)], queueSize=3, metrics=metrics)
+    pipeline.run(items())
+    assert pipeline.failures == []
+    assert metrics.counters['pipeline.write.items'] == 20
+    assert metrics.gauges['pipeline.write.queueDepth']['max'] <= 3
+    assert pipeline.stages[0].blocked > 0
+    assert 'write' in pipeline.report()
+
+def test_stalledItem():
+    """ Test whether a stalled item holds back the items behind it in front of an ordered stage instead of piling them up """
+    read = []
+    readWhileStalled = []
+    def items():
+        for number in range(1, 101):
+            read.append(number)
+            yield number
+    def resolve(item):
+        if item == 1:
+            time.sleep(0.2)
+            readWhileStalled.append(len(read))
+        return item
+
+    stages = [Stage('resolve', resolve, 4), Stage('write', lambda item: item, 2, ordered=True)]
+    results = Pipeline(stages, queueSize=3).run(items())
+    assert [number for number, _ in results] == list(range(1, 101))
+    # At most queueSize x workers items ahead of the stalled one, plus the one drawn while waiting
+    assert readWhileStalled[0] <= 3 * 2 + 1
+    assert stages[1].reordered <= 3 * 2
+
+def test_failingItems():
+    """ Test whether an exception reading the items or ordering them finishes the pipeline and is raised by run """
+    def items():
+        for number in range(1, 51):
+            if number == 20: raise ValueError('bad line')
+            yield number
+    stages = [Stage('resolve', lambda item: item, 2), Stage('write', lambda item: item, 2, ordered=True)]
+    with pytest.raises(ValueError, match='bad line'):
+        Pipeline(stages, queueSize=2).run(items())
+
+    def before(item):
+        if item == 5: raise KeyError('five')
+    stages = [Stage('resolve', lambda item: item, 2), Stage('write', lambda item: item, 2, ordered=True, before=before)]
+    with pytest.raises(KeyError, match='five'):
+        Pipeline(stages, queueSize=2).run(range(1, 101))
+
+def test_queueDepths():
+    """ Test whether queue depths are summarized by running totals rather than kept per item """
+    stage = Stage('write', lambda item: item)
+    pipeline = Pipeline([Stage('parse', lambda item: item), stage], queueSize=3)
+    pipeline.run(range(1, 101))
+    assert stage.depthCount >= 100
+    assert 0 <= stage.averageDepth() <= stage.depthMax <= 3
+    assert not hasattr(stage, 'depths')
+
+def test_resolveFullnames(server, spi, tmp_path, monkeypatch):
+    """ Test whether the synonym import resolves the full names of a row ahead of writing it """
+    import global_settings as app
+    import tools.import_synonyms
+    monkeypatch.chdir(tmp_path)
+    os.makedirs('data')
+    filename = 'pipelined.csv'
+    headers = 'Kingdom,Phylum,Subphylum,Class,Subclass,Order,Suborder,Superfamily,Family,Genus,Species,SpeciesAuthor,' \
+              'isAccepted,AcceptedGenus,AcceptedSpecies,AcceptedSpeciesAuthor'
+    rows = [f'Animalia,Chordata,,Mammalia,,Carnivora,,,Pipelinidae,Pipelinus,{name},,Yes,,,' for name in ('alpha', 'beta', 'gamma')]
+    with open(f'data/{filename}', 'w', encoding='utf-8') as file:
+        file.write(headers + '\n' + '\n'.join(rows) + '\n')
+
+    generatedWhileWriting = []
+    class RecordingTool(tools.import_synonyms.ImportSynonymTool):
+        def generateFullname(self, row, headers, index, rank_id=None):
+            # Full names of the row's taxa looked up by (rank_id None) in a writer thread were not resolved ahead
+            if rank_id is None and len(headers) > 1 and re.fullmatch(r'sp7pipe-write-\d+', threading.current_thread().name):
+                generatedWhileWriting.append(headers[index])
+            return super().generateFullname(row, headers, index, rank_id)
+
+    app.settings['pipeline'] = {'queueSize': 2, 'workers': {'resolve': 2}}
+    try:
+        tool = RecordingTool(spi)
+        tool.handleDatafile(filename)
+    finally:
+        app.settings['pipeline'] = None
+    assert tool.failures == []
+    assert generatedWhileWriting == []
+    assert sorted(taxon['fullname'] for taxon in server.objects('taxon') if taxon['fullname'].startswith('Pipelinus ')) == \
+        ['Pipelinus alpha', 'Pipelinus beta', 'Pipelinus gamma']
@@ -0,0 +1,79 @@
+import os
+import csv
+import pytest
+import configuration
+import shard_runner
+
+@pytest.fixture(scope='module')
+def config(server):
+    return {'mode': 'fake', 'domain': server.baseURL, 'collection': 'KUFishvoucher',
+            'username': server.username, 'password': server.password}
+
+descriptor = configuration.ToolDescriptor('Mass Add Storage Nodes', 'tools.mass_add_storage_nodes', 'MassAddStorageNodeTool')
+
+def test_runShards(server, spi, config, tmp_path, monkeypatch):
+    """ Test whether a data file is processed in shards that do not create the same nodes and whose results are merged """
+    headers = ['Building', 'Room', 'Freezer']
+    rows = [{'Building': 'Shard Site', 'Room': f'Room {room}', 'Freezer': f'{room}-{freezer}'}
+            for room in range(4) for freezer in range(3)]
+
+    # The runner logs in through the global settings, which the spi fixture restores afterwards
+    monkeypatch.chdir(tmp_path)
+    os.makedirs('data')
+    with open('data/shards.csv', 'w', newline='', encoding='utf-8') as file:
+        writer = csv.DictWriter(file, fieldnames=headers)
+        writer.writeheader()
+        writer.writerows(rows)
+
+    results = shard_runner.ShardRunner(config, descriptor, shards=2).run('shards.csv')
+    runs = [name for name in os.listdir('output') if name.startswith('shards_MassAddStorageNodeTool')]
+    saved = os.listdir(f'output/{runs[0]}')
+
+    assert [result['rows'] for result in results] == [6, 6]
+    assert all(result['error'] is None and result['failures'] == [] for result in results)
+    assert {'shard_0.log', 'shard_1.log', 'merged.log', 'request_metrics.csv'} <= set(saved)
+
+    # Shared building created once up front, every room and freezer exactly once by one of the shards
+    storage = server.objects('storage')
+    assert len([node for node in storage if node['name'] == 'Shard Site']) == 1
+    assert sorted(node['name'] for node in storage if node['name'].startswith('Room ')) == [f'Room {room}' for room in range(4)]
+    assert len([node for node in storage if node.get('rankid') == 325]) == 12
+
+    # Metrics of the shards returned to the runner
+    assert all(sum(stats.count for stats in result['metrics'].endpoints.values()) > 0 for result in results)
+
+def test_splitSynonyms(server, spi, config):
+    """ Test whether synonyms share a shard with their accepted names and shared ancestors are created without processing rows """
+    headers = ['Kingdom', 'Phylum', 'Subphylum', 'Class', 'Subclass', 'Order', 'Suborder', 'Superfamily', 'Family',
+               'Genus', 'Species', 'SpeciesAuthor', 'isAccepted', 'AcceptedGenus', 'AcceptedSpecies', 'AcceptedSpeciesAuthor']
+    values = [['Reptilia', 'Squamata', 'Typhlopidae', 'Afrotyphlops', 'lineolatus', 'Yes', '', ''],
+              ['Reptilia', 'Squamata', 'Gampsidae', 'Gampsosteonyx', 'batesi', 'No', 'Afrotyphlops', 'lineolatus'],
+              ['Mammalia', 'Carnivora', 'Otariidae', 'Eumetopias', 'jubatus', 'Yes', '', ''],
+              ['Mammalia', 'Carnivora', 'Felidae', 'Felis', 'catus', 'Yes', '', '']]
+    rows = [dict(zip(headers, ['Shardia', 'Chordata', '', cls, '', order, '', '', family, genus, species, '', accepted, accGenus, accSpecies, '']))
+            for cls, order, family, genus, species, accepted, accGenus, accSpecies in values]
+
+    synonyms = configuration.ToolDescriptor('Import Taxon Synonyms', 'tools.import_synonyms', 'ImportSynonymTool')
+    tool = synonyms.load(spi)
+    shards = shard_runner.ShardRunner(config, synonyms, shards=3).splitRows(tool, headers, list(enumerate(rows, start=1)))
+
+    assert sorted([number for number, _ in shard] for shard in shards) == [[1, 2], [3], [4]]
+
+    # Only the nodes above the families are created up front
+    taxa = [taxon['fullname'] for taxon in server.objects('taxon')]
+    assert all(taxa.count(name) == 1 for name in ('Shardia', 'Chordata', 'Reptilia', 'Squamata', 'Mammalia', 'Carnivora'))
+    assert not {'Typhlopidae', 'Gampsidae', 'Afrotyphlops', 'Gampsosteonyx batesi'} & set(taxa)
+
+def test_splitBlankLevels(server, spi, config):
+    """ Test whether rows whose paths only differ in blank cells or case share a shard, since they create the same nodes """
+    headers = ['Building', 'Room', 'Freezer']
+    rows = [{'Building': 'Blank Site', 'Room': '', 'Freezer': 'Room X'},     # Same path as the start of the next row
+            {'Building': 'Blank Site', 'Room': 'Room X', 'Freezer': '1'},
+            {'Building': 'Blank Site', 'Room': 'Room Y', 'Freezer': '1'},
+            {'Building': 'Blank Site', 'Room': 'ROOM Y', 'Freezer': '2'}]
+
+    tool = descriptor.load(spi)
+    shards = shard_runner.ShardRunner(config, descriptor, shards=2).splitRows(tool, headers, list(enumerate(rows, start=1)))
+
+    assert sorted([number for number, _ in shard] for shard in shards) == [[1, 2], [3, 4]]
+    assert len([node for node in server.objects('storage') if node['name'] == 'Blank Site']) == 1
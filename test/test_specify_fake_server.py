@@ -0,0 +1,258 @@
+import os
+import time
+import pytest
+import requests
+import types
+from concurrent.futures import ThreadPoolExecutor
+import configuration
+import global_settings as app
+import specify_interface as sp
+import specify_fake_server
+import tools.mass_add_storage_nodes
+import tools.merge_duplicate_taxa
+
+server = specify_fake_server.FakeSpecifyServer()
+server.start()
+
+cfg = configuration.ConfigurationHandler()
+cfg.applyConfiguration({'mode': 'fake', 'domain': server.baseURL, 'collection': 'KUFishvoucher',
+                        'username': server.username, 'password': server.password})
+
+spi = sp.SpecifyInterface()
+token = spi.specifyLogin(app.settings['userName'], app.settings['password'], app.settings['collectionId'])
+
+def test_login():
+    """ Test whether logging in to the fake server yields a valid session """
+    assert app.settings['collectionId'] == 4
+    assert token != ''
+    assert spi.verifySession(token)
+    assert not sp.SpecifyInterface().verifySession('')
+
+def test_getSpecifyObjects():
+    """ Test filtering, sorting and paging of object sets """
+    ranks = spi.getSpecifyObjects('taxontreedefitem', limit=5, offset=0, filters={'treedef': 1}, sort='-rankid')
+    assert len(ranks) == 5
+    assert ranks[0]['name'] == 'Subforma'
+    assert ranks[0]['rankid'] > ranks[1]['rankid']
+
+    genera = spi.getSpecifyObjects('taxontreedefitem', filters={'name': 'Genus'})
+    assert len(genera) == 1
+    assert genera[0]['treeentries'].split('=')[1] == str(genera[0]['id'])
+
+    ranks = spi.getSpecifyObjects('taxontreedefitem', limit=100, filters={'rankid__gte': 220, 'rankid__lt': 250})
+    assert [rank['name'] for rank in ranks] == ['Species', 'Subspecies', 'Variety']
+
+def test_failedPage():
+    """ Test whether a page failing to be fetched raises instead of truncating the iteration or counting zero """
+    server.injectFailures('list', [500])
+    with pytest.raises(requests.HTTPError):
+        spi.countSpecifyObjects('taxontreedefitem')
+
+    server.injectFailures('list', [500])
+    with pytest.raises(requests.HTTPError):
+        list(spi.iterateSpecifyObjects('taxontreedefitem', pageSize=5))
+
+def test_postPutDeleteSpecifyObject():
+    """ Test the object life cycle of creating, updating and deleting """
+    genus = spi.getSpecifyObjects('taxontreedefitem', filters={'name': 'Genus'})[0]
+    obj = spi.postSpecifyObject('taxon', {'name': 'Gadus', 'fullname': 'Gadus', 'rankid': 180, 'parent': '/api/specify/taxon/1/',
+                                          'definitionitem': genus['resource_uri']})
+    assert obj['id'] > 1
+    assert obj['definition'] == '/api/specify/taxontreedef/1/'
+
+    obj['author'] = 'Linnaeus, 1758'
+    updated = spi.putSpecifyObject('taxon', obj['id'], obj)
+    assert updated['author'] == 'Linnaeus, 1758'
+    assert updated['version'] == obj['version'] + 1
+
+    # Putting a stale version is rejected
+    assert spi.putSpecifyObject('taxon', obj['id'], obj) is None
+
+    assert spi.deleteSpecifyObject('taxon', obj['id'])
+    assert spi.getSpecifyObject('taxon', obj['id']) is None
+
+def test_mergeAndMoveTreeNodes():
+    """ Test merging and moving tree nodes """
+    source = server.addObject('storage', {'name': 'Room A', 'fullname': 'Room A', 'rankid': 200, 'parent': '/api/specify/storage/1/'})
+    target = server.addObject('storage', {'name': 'Room B', 'fullname': 'Room B', 'rankid': 200, 'parent': '/api/specify/storage/1/'})
+    child = server.addObject('storage', {'name': 'Shelf 1', 'fullname': 'Shelf 1', 'rankid': 350, 'parent': source['resource_uri']})
+
+    response = spi.mergeTreeNodes('storage', source['id'], target['id'])
+    assert response.status_code < 299
+    assert server.getObject('storage', source['id']) is None
+    assert server.getObject('storage', child['id'])['parent'] == target['resource_uri']
+
+    response = spi.moveTreeNode('storage', child['id'], 1)
+    assert response.status_code < 299
+    assert server.getObject('storage', child['id'])['parent'] == '/api/specify/storage/1/'
+
+def test_mergeTimeoutNotResent():
+    """ Test whether a merge timing out is not sent again while it may still be running at the server """
+    source = server.addObject('storage', {'name': 'Room C', 'fullname': 'Room C', 'rankid': 200, 'parent': '/api/specify/storage/1/'})
+    target = server.addObject('storage', {'name': 'Room D', 'fullname': 'Room D', 'rankid': 200, 'parent': '/api/specify/storage/1/'})
+    server.resetCounts()
+    server.injectFailures('merge', [504])
+
+    response = spi.mergeTreeNodes('storage', source['id'], target['id'])
+    assert response.status_code == 504
+    assert server.requestCounts['merge'] == 1
+
+def test_latencyInjection():
+    """ Test whether latency is injected for the configured endpoint only """
+    server.setLatency('get', 0.2)
+    try:
+        start = time.time()
+        spi.getSpecifyObject('collection', 4)
+        assert time.time() - start >= 0.2
+
+        start = time.time()
+        spi.getSpecifyObjects('collection')
+        assert time.time() - start < 0.2
+    finally:
+        server.setLatency('get', 0)
+
+def test_massAddStorageNodes():
+    """ Test running a tool against the fake server """
+    tool = tools.mass_add_storage_nodes.MassAddStorageNodeTool(spi)
+    headers = ['Building', 'Room', 'Freezer']
+    server.resetCounts()
+
+    tool.processRow(headers, {'Building': 'Main Site', 'Room': 'General Collection', 'Freezer': '1'})
+    tool.processRow(headers, {'Building': 'Main Site', 'Room': 'General Collection', 'Freezer': '2'})
+
+    freezers = spi.getSpecifyObjects('storage', filters={'rankid': 325}, sort='name')
+    assert [freezer['name'] for freezer in freezers] == ['1', '2']
+    room = spi.getSpecifyObject('storage', freezers[0]['parent'].split('/')[4])
+    assert room['name'] == 'General Collection'
+    assert freezers[1]['parent'] == freezers[0]['parent']
+    assert server.requestCounts['post'] == 4
+
+def test_treeIndex():
+    """ Test whether a tree tool using the tree index resolves existing nodes without API calls """
+    headers = ['Building', 'Room', 'Freezer']
+    rows = [{'Building': 'Index Site', 'Room': 'Room 1', 'Freezer': '1'}, {'Building': 'Index Site', 'Room': 'Room 1', 'Freezer': '2'}]
+    app.settings['treeIndex'] = True
+    try:
+        tool = tools.mass_add_storage_nodes.MassAddStorageNodeTool(spi)
+    finally:
+        app.settings['treeIndex'] = False
+    assert len(tool.treeIndex) == len([node for node in server.objects('storage') if node.get('definition')])
+
+    server.resetCounts()
+    for row in rows: tool.processRow(headers, row)
+    assert server.requestCounts['post'] == 4
+    assert server.requestCounts['list'] == 0
+
+    # Nodes created are found in the index on the next pass
+    server.resetCounts()
+    for row in rows: tool.processRow(headers, row)
+    assert sum(server.requestCounts.values()) == 0
+    assert len([node for node in server.objects('storage') if node['name'] == 'Room 1']) == 1
+
+    # Names are matched case-insensitively, as the API does
+    tool.processRow(headers, {'Building': 'INDEX SITE', 'Room': 'room 1', 'Freezer': '1'})
+    assert sum(server.requestCounts.values()) == 0
+
+def test_planPaths():
+    """ Test whether a tree tool planning its paths resolves every distinct node of the data file once """
+    tool = tools.mass_add_storage_nodes.MassAddStorageNodeTool(spi)
+    headers = ['Building', 'Room', 'Freezer']
+    rows = [{'Building': 'Trie Site', 'Room': f'Room {room}', 'Freezer': f'{freezer}'} for room in range(2) for freezer in range(5)]
+    rows.append({'Building': 'Trie Site', 'Room': '', 'Freezer': 'Loose'})
+    rows.append({'Building': 'Trie Site', 'Room': 'ROOM 1', 'Freezer': '4'})    # Same path in other case
+
+    server.resetCounts()
+    results = tool.handleRows(headers, iter(rows))
+
+    # 1 building, 2 rooms and 11 freezers looked up and created once instead of 3 nodes per row (plus the tree root)
+    assert server.requestCounts['post'] == 14
+    assert server.requestCounts['list'] == 15
+    assert len(results) == 12 and None not in results
+    assert results[11] == results[9]
+    assert server.getObject('storage', results[4])['parent'] == server.getObject('storage', results[0])['parent']
+    assert server.getObject('storage', results[10])['name'] == 'Loose'
+    assert tool.failures == []
+
+def test_levelConcurrency():
+    """ Test whether the nodes of a tree level are created concurrently """
+    tool = tools.mass_add_storage_nodes.MassAddStorageNodeTool(spi)
+    headers = ['Building', 'Room', 'Freezer']
+    rows = [{'Building': 'Level Site', 'Room': 'Wide Room', 'Freezer': f'{freezer}'} for freezer in range(16)]
+
+    server.setLatency('post', 0.05)
+    app.settings['levelConcurrency'] = 8
+    try:
+        start = time.time()
+        results = tool.handleRows(headers, iter(rows))
+        elapsed = time.time() - start
+    finally:
+        server.setLatency('post', 0)
+        app.settings['levelConcurrency'] = 1
+
+    assert None not in results
+    parent = server.getObject('storage', results[0])['parent']
+    assert len([node for node in server.objects('storage') if node.get('parent') == parent]) == 16
+    # One after the other, the 18 nodes take at least 0.9 seconds to create
+    assert elapsed < 0.6
+
+def test_singleFlight():
+    """ Test whether rows processed concurrently create shared nodes only once """
+    tool = tools.mass_add_storage_nodes.MassAddStorageNodeTool(spi)
+    headers = ['Building', 'Room', 'Freezer']
+    rows = [{'Building': 'Flight Site', 'Room': ('Shared Room', 'shared room')[freezer % 2], 'Freezer': f'{freezer}'} for freezer in range(8)]
+    spi.metrics.reset()
+
+    server.setLatency('post', 0.1)
+    try:
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            list(pool.map(lambda row: tool.processRow(headers, row), rows))
+    finally:
+        server.setLatency('post', 0)
+
+    storage = server.objects('storage')
+    assert len([node for node in storage if node['name'] == 'Flight Site']) == 1
+    assert len([node for node in storage if node['name'].casefold() == 'shared room']) == 1
+    assert spi.metrics.counters['getOrCreateCoalesced'] > 0
+    assert 'getOrCreateCoalesced' in spi.metrics.report()
+
+def test_checkPrecollectedTaxa(tmp_path, monkeypatch):
+    """ Test whether pre-collected taxa are fetched in batches without per-id requests, also after merges, skipping taxa merged away """
+    taxa = [server.addObject('taxon', {'name': f'Precollectus{i}', 'fullname': f'Precollectus{i}', 'rankid': 180,
+                                       'parent': '/api/specify/taxon/1/'}) for i in range(6)]
+    ids = [taxon['id'] for taxon in taxa]
+    monkeypatch.chdir(tmp_path)
+    os.makedirs('data')
+    with open('data/precollected.txt', 'w', encoding='utf-8') as file:
+        file.write('\n'.join(str(id) for id in ids) + '\n')
+
+    handled = []
+    class RecordingTool(tools.merge_duplicate_taxa.MergeDuplicateTaxaTool):
+        def handleSpecifyTaxon(self, specifyTaxon):
+            handled.append(specifyTaxon['id'])
+            if specifyTaxon['id'] == ids[0]:
+                self.mergeTaxa(types.SimpleNamespace(id=ids[1]), types.SimpleNamespace(id=ids[0]))
+
+    tool = RecordingTool(spi)
+    tool.batchSize = 4
+    spi.cache.clear()
+    server.resetCounts()
+    tool.checkPrecollectedTaxa('precollected.txt')
+
+    assert handled == [ids[0]] + ids[2:]
+    assert server.requestCounts['get'] == 0
+    assert server.requestCounts['list'] == 2
+    assert server.requestCounts['merge'] == 1
+
+
+def test_failedMergeNotSkipped():
+    """ Test whether a taxon whose merge failed is not taken for merged away """
+    source, target = [server.addObject('taxon', {'name': f'Failedmergus{i}', 'fullname': f'Failedmergus{i}', 'rankid': 180,
+                                                 'parent': '/api/specify/taxon/1/'}) for i in range(2)]
+    tool = tools.merge_duplicate_taxa.MergeDuplicateTaxaTool(spi)
+    server.injectFailures('merge', [500])
+    tool.mergeTaxa(types.SimpleNamespace(id=source['id']), types.SimpleNamespace(id=target['id']))
+    assert source['id'] not in tool.mergedIds
+    assert server.getObject('taxon', source['id']) is not None
+
+    tool.mergeTaxa(types.SimpleNamespace(id=source['id']), types.SimpleNamespace(id=target['id']))
+    assert source['id'] in tool.mergedIds
@@ -0,0 +1,358 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+import configuration
+import global_settings as app
+import specify_interface as sp
+import async_specify_interface
+import response_cache
+import session_store
+import request_handler
+import request_metrics
+import cassette
+import concurrency_limiter
+import tools.sp7api_tool
+from models.taxon import Taxon
+
+def addStorageNodes(server, count, prefix='Node'):
+    """ Add storage nodes directly to the fake server """
+    return [server.addObject('storage', {'name': f'{prefix} {i}', 'fullname': f'{prefix} {i}', 'rankid': 400,
+                                         'parent': '/api/specify/storage/1/'}) for i in range(count)]
+
+def test_asyncConcurrency(server, spi):
+    """ Test whether the asynchronous interface overlaps latency up to its concurrency limit """
+    nodes = addStorageNodes(server, 8, 'Async')
+    asp = async_specify_interface.AsyncSpecifyInterface(spi, maxConcurrency=4)
+    server.setLatency('get', 0.2)
+    try:
+        start = time.time()
+        results = asp.run(asp.gather(*[asp.getSpecifyObject('storage', node['id']) for node in nodes]))
+        elapsed = time.time() - start
+    finally:
+        server.setLatency('get', 0)
+        asp.close()
+
+    assert [result['id'] for result in results] == [node['id'] for node in nodes]
+    # 8 calls with 4 in flight take two round trips instead of eight
+    assert 0.4 <= elapsed < 1.2
+
+def test_asyncWrite(spi):
+    """ Test whether asynchronous writes share the logged in session """
+    asp = async_specify_interface.AsyncSpecifyInterface(spi, maxConcurrency=2)
+    node = asp.run(asp.postSpecifyObject('storage', {'name': 'Async box', 'fullname': 'Async box', 'rankid': 400,
+                                                      'parent': '/api/specify/storage/1/'}))
+    assert node['id'] > 0
+    assert asp.run(asp.deleteSpecifyObject('storage', node['id']))
+    asp.close()
+
+def test_iterateSpecifyObjects(server, spi):
+    """ Test whether iterating yields all objects page by page and stops at the total count """
+    nodes = addStorageNodes(server, 250, 'Page')
+    server.resetCounts()
+
+    ids = [obj['id'] for obj in spi.iterateSpecifyObjects('storage', {'name__startswith': 'Page '}, pageSize=100)]
+
+    assert ids == [node['id'] for node in nodes]
+    assert server.requestCounts['list'] == 3
+
+def test_iterateSpecifyObjectsPrefetch(server, spi):
+    """ Test whether the next page is fetched while the current page is being consumed """
+    server.setLatency('list', 0.2)
+    try:
+        start = time.time()
+        for obj in spi.iterateSpecifyObjects('storage', {'name__startswith': 'Page '}, pageSize=100):
+            if obj['name'].endswith(' 0') or obj['name'].endswith('00'): time.sleep(0.2) # Consuming page takes time
+        elapsed = time.time() - start
+    finally:
+        server.setLatency('list', 0)
+
+    # Sequential fetching would take 3 x (0.2 + 0.2) seconds
+    assert elapsed < 1.05
+
+def test_iterateSpecifyObjectsKeyset(server, spi):
+    """ Test whether keyset paging does not skip objects when objects already seen are deleted while iterating """
+    nodes = addStorageNodes(server, 250, 'Keyset')
+    server.resetCounts()
+
+    ids = []
+    for obj in spi.iterateSpecifyObjects('storage', {'name__startswith': 'Keyset '}, pageSize=50, keyset=True):
+        ids.append(obj['id'])
+        server.deleteObject('storage', obj['id'])
+
+    assert ids == [node['id'] for node in nodes]
+    assert server.requestCounts['list'] == 5
+
+def test_responseCache(server, spi):
+    """ Test whether objects fetched by primary key are cached and invalidated by writes """
+    node = addStorageNodes(server, 1, 'Cached')[0]
+    spi.cache.clear()
+    server.resetCounts()
+
+    assert spi.getSpecifyObject('storage', node['id'])['name'] == 'Cached 0'
+    obj = spi.getSpecifyObject('storage', node['id'])
+    assert server.requestCounts['get'] == 1
+    assert (spi.cache.hits, spi.cache.misses) == (1, 1)
+
+    # Altering a fetched object does not alter the cache, while putting it does
+    obj['name'] = 'Cached X'
+    assert spi.getSpecifyObject('storage', node['id'])['name'] == 'Cached 0'
+    spi.putSpecifyObject('storage', node['id'], obj)
+    assert spi.getSpecifyObject('storage', node['id'])['name'] == 'Cached X'
+    assert server.requestCounts['get'] == 1
+
+    # Posted objects are cached
+    posted = spi.postSpecifyObject('storage', {'name': 'Cached Y', 'fullname': 'Cached Y', 'rankid': 400, 'parent': node['resource_uri']})
+    assert spi.getSpecifyObject('storage', posted['id'])['name'] == 'Cached Y'
+    assert server.requestCounts['get'] == 1
+
+    # Tree operations invalidate the tree's objects, deletion invalidates the object
+    spi.moveTreeNode('storage', posted['id'], 1)
+    assert spi.getSpecifyObject('storage', posted['id'])['parent'] == '/api/specify/storage/1/'
+    assert server.requestCounts['get'] == 2
+    spi.deleteSpecifyObject('storage', posted['id'])
+    assert spi.getSpecifyObject('storage', posted['id']) is None
+
+def test_responseCacheExpiry():
+    """ Test whether cached objects expire after their time to live """
+    cache = response_cache.ResponseCache(maxSize=2, ttl=0.1)
+    cache.put('taxon', 1, {'id': 1})
+    cache.put('taxon', 2, {'id': 2})
+    cache.put('taxon', 3, {'id': 3})
+    assert cache.get('taxon', 1) is None
+    assert cache.get('taxon', '2') == {'id': 2}
+    time.sleep(0.15)
+    assert cache.get('taxon', 2) is None
+
+def test_getSpecifyObjectsByIds(server, spi):
+    """ Test fetching objects by a list of ids in chunks """
+    nodes = addStorageNodes(server, 250, 'ById')
+    ids = [node['id'] for node in nodes] + [999999]
+    spi.cache.clear()
+    server.resetCounts()
+
+    objects = spi.getSpecifyObjectsByIds('storage', ids, chunkSize=100)
+
+    assert sorted(objects.keys()) == ids[:-1]
+    assert objects[ids[0]]['name'] == 'ById 0'
+    assert server.requestCounts['list'] == 3
+
+    # Objects fetched are cached
+    assert spi.getSpecifyObjectsByIds('storage', ids[:10]) == {id: objects[id] for id in ids[:10]}
+    assert server.requestCounts['list'] == 3
+
+def test_countSpecifyObjects(server, spi):
+    """ Test counting objects without fetching them """
+    parent = server.addObject('taxon', {'name': 'Countus', 'fullname': 'Countus', 'rankid': 180, 'parent': '/api/specify/taxon/1/'})
+    for i in range(30):
+        server.addObject('taxon', {'name': f'sp{i}', 'fullname': f'Countus sp{i}', 'rankid': 220, 'parent': parent['resource_uri']})
+    server.resetCounts()
+
+    assert spi.countSpecifyObjects('taxon', {'parent': parent['id']}) == 30
+    assert spi.countSpecifyObjects('taxon', {'parent': parent['id'], 'name__in': 'sp1,sp2'}) == 2
+
+    assert Taxon(parent['id']).getChildCount(spi) == 30
+    assert server.requestCounts['list'] == 3
+
+def test_persistedSession(server, spi, tmp_path):
+    """ Test whether a persisted session is resumed with a single call and replaced when expired """
+    config = {'mode': 'fake', 'domain': server.baseURL, 'collection': 'KUFishvoucher', 'username': server.username,
+              'password': server.password, 'persistSession': True, 'sessionFile': str(tmp_path.joinpath('sessions.json'))}
+    configuration.ConfigurationHandler().applyConfiguration(config)
+    assert session_store.SessionStore(config['sessionFile']).load(server.baseURL, 'KUFishvoucher')
+
+    server.resetCounts()
+    resumed = configuration.ConfigurationHandler()
+    resumed.applyConfiguration(config)
+    tool = tools.sp7api_tool.Sp7ApiTool(resumed.sp)
+    assert resumed.sp.loggedIn
+    assert server.requestCounts['user'] == 1
+    assert server.requestCounts['login'] == 0
+    assert tool.collection.name == 'KUFishvoucher'
+
+    # Expired sessions fall back to logging in
+    server.sessions.clear()
+    server.resetCounts()
+    expired = configuration.ConfigurationHandler()
+    expired.applyConfiguration(config)
+    assert expired.sp.loggedIn
+    assert server.requestCounts['login'] == 3
+    assert expired.sp.getSpecifyObject('collection', 4)
+
+def test_retryIdempotent(server, spi):
+    """ Test whether transient failures of idempotent requests are retried with backoff """
+    rsp = sp.SpecifyInterface(cacheSize=0, retryPolicy=request_handler.RetryPolicy(backoffBase=0.01))
+    rsp.specifyLogin(app.settings['userName'], app.settings['password'], app.settings['collectionId'])
+    node = addStorageNodes(server, 1, 'Retry')[0]
+    server.resetCounts()
+
+    server.injectFailures('get', [503, None, 502])
+    assert rsp.getSpecifyObject('storage', node['id'])['name'] == 'Retry 0'
+    assert server.requestCounts['get'] == 4
+    assert rsp.requestHandler.retries == 3
+
+    # Failures persisting beyond the maximum number of attempts are returned 
+    server.injectFailures('get', [503] * 4)
+    assert rsp.getSpecifyObject('storage', node['id']) is None
+    assert server.requestCounts['get'] == 8
+
+def test_retriesCountedConcurrently():
+    """ Test whether retries of requests sent by many threads through one handler are all counted """
+    class UnavailableSession():
+        def request(self, method, url, **kwargs):
+            response = request_handler.requests.Response()
+            response.status_code = 503
+            return response
+
+    handler = request_handler.RequestHandler(UnavailableSession(), request_handler.RetryPolicy(maxAttempts=3, backoffBase=0))
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda i: handler.request('GET', f'http://localhost/api/specify/taxon/{i}/'), range(400)))
+    assert handler.retries == 400 * 2
+    assert sum(stats.retries for stats in handler.metrics.endpoints.values()) == 400 * 2
+
+def test_retryPost(server, spi):
+    """ Test whether a failed POST is only sent again if it did not take effect """
+    rsp = sp.SpecifyInterface(retryPolicy=request_handler.RetryPolicy(backoffBase=0.01))
+    rsp.specifyLogin(app.settings['userName'], app.settings['password'], app.settings['collectionId'])
+    fields = {'name': 'Retry box', 'fullname': 'Retry box', 'rankid': 400, 'parent': '/api/specify/storage/1/'}
+
+    # Response lost after the object was created: the object is looked up instead of created twice
+    server.injectFailures('post', [None], applied=True)
+    posted = rsp.postSpecifyObject('storage', dict(fields))
+    assert posted['name'] == 'Retry box'
+    assert len([obj for obj in server.objects('storage') if obj['name'] == 'Retry box']) == 1
+
+    # Failure before the object was created: the POST is sent again 
+    server.injectFailures('post', [502])
+    again = rsp.postSpecifyObject('storage', {**fields, 'name': 'Retry box 2'})
+    assert again['id'] > posted['id']
+
+    # Without lookup fields a failed POST is not sent again 
+    server.resetCounts()
+    server.injectFailures('post', [503])
+    try:
+        rsp.postSpecifyObject('storage', dict(fields), lookupFields=[])
+        assert False
+    except Exception as e:
+        assert '503' in str(e)
+    assert server.requestCounts['post'] == 1
+
+def test_retryTreeActions(server, spi):
+    """ Test whether merging and moving tree nodes recover from responses lost in transit """
+    rsp = sp.SpecifyInterface(retryPolicy=request_handler.RetryPolicy(backoffBase=0.01))
+    rsp.specifyLogin(app.settings['userName'], app.settings['password'], app.settings['collectionId'])
+    source, target, parent = addStorageNodes(server, 3, 'Tree')
+    server.resetCounts()
+
+    server.injectFailures('move', [None], applied=True)
+    assert rsp.moveTreeNode('storage', source['id'], parent['id']).status_code == 204
+    assert server.getObject('storage', source['id'])['parent'] == parent['resource_uri']
+
+    server.injectFailures('merge', [None], applied=True)
+    assert rsp.mergeTreeNodes('storage', source['id'], target['id']).status_code == 204
+    assert server.getObject('storage', source['id']) is None
+    assert (server.requestCounts['move'], server.requestCounts['merge']) == (1, 1)
+
+def test_requestMetrics(server, spi):
+    """ Test whether requests are recorded per endpoint template with latency, bytes and retries """
+    rsp = sp.SpecifyInterface(cacheSize=0, retryPolicy=request_handler.RetryPolicy(backoffBase=0.01))
+    rsp.specifyLogin(app.settings['userName'], app.settings['password'], app.settings['collectionId'])
+    node = addStorageNodes(server, 1, 'Metrics')[0]
+    rsp.metrics.reset()
+
+    server.setLatency('get', 0.05)
+    server.injectFailures('get', [503])
+    try:
+        for i in range(3): rsp.getSpecifyObject('storage', node['id'])
+    finally:
+        server.setLatency('get', 0)
+    rsp.getSpecifyObjects('storage', 10, 0, {'name': 'Metrics 0'})
+    rsp.postSpecifyObject('storage', {'name': 'Metrics 1', 'rankid': 400, 'parent': '/api/specify/storage/1/'})
+
+    rows = {(row['method'], row['endpoint']): row for row in rsp.metrics.summary()}
+    get = rows[('GET', 'api/specify/{table}/{id}/')]
+    assert (get['count'], get['retries'], get['errors'], get['statuses']) == (3, 1, 0, '200:3')
+    assert 0.05 <= get['p50'] <= get['p99'] and get['total'] >= 0.2
+    assert rows[('GET', 'api/specify/{table}/')]['count'] == 1
+    assert rows[('POST', 'api/specify/{table}/')]['requestBytes'] > 0
+    assert rows[('GET', 'api/specify/{table}/')]['responseBytes'] > 0
+
+    # Metrics of several interfaces are combined 
+    combined = request_metrics.RequestMetrics()
+    combined.merge(rsp.metrics)
+    combined.merge(rsp.metrics)
+    assert {row['endpoint']: row['count'] for row in combined.summary()}['api/specify/{table}/{id}/'] == 6
+    assert 'api/specify/{table}/{id}/' in combined.report()
+
+    assert request_metrics.endpointTemplate('https://x.org/api/specify_tree/taxon/12/merge/') == 'api/specify_tree/{tree}/{id}/merge/'
+    assert request_metrics.percentile([1, 2, 3, 4], 0.5) == 2
+
+def test_cassette(server, spi, tmp_path):
+    """ Test whether a recorded run is replayed with the same responses and without network access """
+    path = str(tmp_path.joinpath('run.jsonl.gz'))
+    nodes = addStorageNodes(server, 3, 'Cassette')
+
+    def run(spi):
+        spi.specifyLogin(app.settings['userName'], app.settings['password'], app.settings['collectionId'])
+        names = [spi.getSpecifyObject('storage', node['id'])['name'] for node in nodes]
+        posted = spi.postSpecifyObject('storage', {'name': 'Cassette box', 'rankid': 400, 'parent': '/api/specify/storage/1/'})
+        found = spi.getSpecifyObjects('storage', 10, 0, {'name': 'Cassette box'})
+        return names, posted['id'], [obj['id'] for obj in found]
+
+    recorder = cassette.Cassette(path, 'record')
+    recorded = run(sp.SpecifyInterface(cassette=recorder))
+    recorder.close()
+
+    server.resetCounts()
+    player = cassette.Cassette(path, 'replay')
+    replaying = sp.SpecifyInterface(cassette=player)
+    assert run(replaying) == recorded
+    assert sum(server.requestCounts.values()) == 0
+    assert replaying.loggedIn
+
+    # Requests not recorded are reported as such
+    try:
+        replaying.getSpecifyObjects('storage', 10, 0, {'name': 'Not recorded'})
+        assert False
+    except cassette.CassetteMiss:
+        pass
+
+def test_adaptiveConcurrencyLimiter():
+    """ Test whether the concurrency limit grows with stable latency and backs off on overload and rising latency """
+    limiter = concurrency_limiter.AdaptiveConcurrencyLimiter(initialLimit=4, maxLimit=6, window=10)
+    for i in range(30):
+        limiter.release(limiter.acquire(), 0.01)
+    assert limiter.limit == 6 # Capped at maximum
+
+    # Overload cuts the limit once for requests in flight at the same time
+    tickets = [limiter.acquire() for i in range(6)]
+    for ticket in tickets:
+        limiter.release(ticket, 0.01, overloaded=True)
+    assert limiter.limit == 3
+
+    # Rising latency cuts the limit as well
+    for i in range(10):
+        limiter.release(limiter.acquire(), 0.1)
+    assert limiter.limit == 1
+
+def test_adaptiveConcurrencyRequests(server, spi):
+    """ Test whether requests in flight are bounded by the adaptive limit, which is exposed in the metrics """
+    limiter = concurrency_limiter.AdaptiveConcurrencyLimiter(initialLimit=2, maxLimit=3, window=5)
+    rsp = sp.SpecifyInterface(cacheSize=0, limiter=limiter, retryPolicy=request_handler.RetryPolicy(backoffBase=0.01))
+    rsp.specifyLogin(app.settings['userName'], app.settings['password'], app.settings['collectionId'])
+    nodes = addStorageNodes(server, 12, 'Limited')
+    asp = async_specify_interface.AsyncSpecifyInterface(rsp, maxConcurrency=8)
+    server.setLatency('get', 0.1)
+    server.injectFailures('get', [503])
+    try:
+        start = time.time()
+        results = asp.run(asp.gather(*[asp.getSpecifyObject('storage', node['id']) for node in nodes]))
+        elapsed = time.time() - start
+    finally:
+        server.setLatency('get', 0)
+        asp.close()
+
+    assert [result['id'] for result in results] == [node['id'] for node in nodes]
+    # At most 2-3 of 8 concurrent calls in flight
+    assert elapsed >= 0.4
+    gauge = rsp.metrics.gauges['concurrencyLimit']
+    assert gauge['min'] == 1 and gauge['max'] <= 3
+    assert 'concurrencyLimit' in rsp.metrics.report()
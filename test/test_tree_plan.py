@@ -0,0 +1,64 @@
+import os
+import pytest
+import global_settings as app
+import data_access
+import mirror_sync
+import tools.mass_add_storage_nodes
+from models.tree_plan import TreePlan
+
+def test_planApply(server, spi, tmp_path):
+    """ Test whether planning writes nothing and applying the plan takes exactly the API calls planned """
+    headers = ['Building', 'Room', 'Freezer']
+    tool = tools.mass_add_storage_nodes.MassAddStorageNodeTool(spi)
+    tool.processRow(headers, {'Building': 'Main Site', 'Room': 'General Collection', 'Freezer': '1'})
+    rows = [{'Building': 'Main Site', 'Room': 'Plan Room', 'Freezer': str(number)} for number in range(1, 6)]
+    rows.append({'Building': 'Plan Site', 'Room': 'Room 1', 'Freezer': '1'})
+    tool.planning = True
+    tool.planPath = os.path.join(tmp_path, 'plan.jsonl')
+
+    server.resetCounts()
+    plan = tool.handleRows(headers, rows)
+    assert server.requestCounts['post'] == 0
+    # Nodes beneath a node to create are not looked up
+    assert server.requestCounts['list'] == 4
+    assert plan.header['creates'] == 9 and plan.header['existing'] == 1 and plan.header['levels'] == 3
+
+    tool.planning = False
+    server.resetCounts()
+    ids = tool.applyPlan(TreePlan.read(tool.planPath))
+    assert server.requestCounts['post'] == plan.apiCalls()['POST']
+    assert server.requestCounts['list'] == plan.apiCalls()['GET'] == 2
+    room = next(step for step in plan.steps if step['name'] == 'Plan Room')
+    freezers = spi.getSpecifyObjects('storage', filters={'parent': ids[room['step']]}, sort='name')
+    assert [freezer['name'] for freezer in freezers] == ['1', '2', '3', '4', '5']
+
+    # Applying the plan again finds the nodes created before instead of creating them twice
+    server.resetCounts()
+    assert tool.applyPlan(TreePlan.read(tool.planPath)) == ids
+    assert server.requestCounts['post'] == 0
+
+    # Planned again against a synchronized local mirror, everything exists and no lookups go through the API
+    tool.mirror = data_access.DataAccess('test_plan', inMemory=True)
+    mirror_sync.MirrorSync(spi, tool.mirror).sync('storage')
+    tool.planning = True
+    server.resetCounts()
+    plan = tool.handleRows(headers, rows)
+    assert plan.header['creates'] == 0 and plan.header['existing'] == 10
+    assert server.requestCounts['list'] == 0
+
+    # Nodes missing from the mirror are confirmed through the API instead of being planned for creation
+    roomNode = server.getObject('storage', ids[room['step']])
+    server.addObject('storage', {'name': 'Late Room', 'fullname': 'Late Room', 
+                                 **{key: roomNode[key] for key in ('rankid', 'parent', 'definition', 'definitionitem')}})
+    plan = tool.handleRows(headers, [{'Building': 'Main Site', 'Room': 'Late Room', 'Freezer': '1'}])
+    assert plan.header['creates'] == 1 and plan.header['existing'] == 2
+
+    # Lookups in a mirror never synchronized are refused
+    settings = app.settings['database']
+    app.settings.update(mirrorLookups=True, database={'name': 'test_unsynced', 'in_memory': True})
+    try:
+        with pytest.raises(Exception, match='mirror_sync'):
+            tools.mass_add_storage_nodes.MassAddStorageNodeTool(spi)
+    finally:
+        app.settings.update(mirrorLookups=False, database=settings)
+        data_access.databases.pop('test_unsynced', None)
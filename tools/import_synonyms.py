@@ -16,6 +16,7 @@
 from tools.treenode_tool import TreeNodeTool
 from models.taxon import Taxon
 import specify_interface
+import threading
 import traceback
 import util
 
@@ -27,20 +28,51 @@ class ImportSynonymTool(TreeNodeTool):
     def __init__(self, specifyInterface: specify_interface.SpecifyInterface) -> None:
         self.sptype = 'taxon'
         super().__init__(specifyInterface)
+
+        # Node filters resolved for the row being written by the current thread (see resolveRow) 
+        self.resolved = threading.local()
         
+    def resolveRow(self, headers, row):
+        """
+        Resolve the node filters of the row's taxa, i.e. full names, rank ids and authors, ahead of writing when 
+        streaming rows through the pipeline (see Sp7ApiTool.handleRowsPipelined). Only CPU work: no taxa are looked up, 
+        since they may still be created by earlier rows. Filters failing to resolve are left to be resolved when writing. 
+        CONTRACT 
+            RETURNS dictionary of taxon header to node filters 
+        """
+        taxon_headers = self.extractTaxonHeaders(headers)
+        filters = {}
+        for index, header in enumerate(taxon_headers):
+            try:
+                filters[header] = self.nodeFilters(taxon_headers, row, index)
+            except Exception:
+                pass
+        return filters
+
+    def writeRow(self, headers, row, resolved):
+        """
+        Process the row using the node filters resolved ahead of writing (see resolveRow) 
+        """
+        self.resolved.row, self.resolved.filters = row, resolved or {}
+        try:
+            return self.processRow(headers, row)
+        finally:
+            self.resolved.row, self.resolved.filters = None, {}
+
     def processRow(self, headers, row) -> None:
         """
         Process the data file row by adding its constituent taxa to the tree.
         """
         try:
-            root = self.sp.getSpecifyObjects('taxon', limit=1, filters={'definition': self.tree_definition})[0]
+            root = self.getRootNode()
             taxon_headers = self.extractTaxonHeaders(headers)
             node = self.addChildNodes(taxon_headers, row, root['id'], 0)
             print(".", end='')
         except Exception as e:
-            # Handle exceptions that may occur during processing
+            # Log the row and fail it, so that it is reported and not recorded as completed 
             util.logger.debug(f"Error processing row: {row}. Exception: {e}")   
             traceback.print_exc()
+            raise
 
     def validateRow(self, row) -> bool:
         """
@@ -78,6 +110,12 @@ class ImportSynonymTool(TreeNodeTool):
         
         return valid
 
+    def hierarchyHeaders(self, headers):
+        """
+        The taxon columns make up the hierarchy of a row 
+        """
+        return self.extractTaxonHeaders(headers)
+
     def extractTaxonHeaders(self, headers):
         """
         Extracts the taxon headers from the given headers list.
@@ -97,6 +135,16 @@ class ImportSynonymTool(TreeNodeTool):
         if index >= len(headers):
             return None  # No more headers to process
 
+        filters = self.nodeFilters(headers, row, index)
+
+        return super().addChildNodes(headers, row, parent_id, index, filters)
+
+    def nodeFilters(self, headers, row, index) -> dict:
+        """
+        Filters identifying the taxon of the given column of the row beneath its parent: full name, rank and author if any 
+        """
+        if getattr(self.resolved, 'row', None) is row and headers[index] in self.resolved.filters:
+            return dict(self.resolved.filters[headers[index]])
         filters = {}
         full_name = self.generateFullname(row, headers, index)
         if row.get(headers[index] + 'Author'): 
@@ -104,8 +152,38 @@ class ImportSynonymTool(TreeNodeTool):
             filters['author'] = author
         filters['fullname'] = full_name
         filters['rankid'] = self.getTreeDefItem(headers[index])['rankid']
+        return filters
 
-        return super().addChildNodes(headers, row, parent_id, index, filters)
+    def getOrCreatePath(self, headers, row, depth):
+        """
+        Retrieve or create the taxa of the first taxon columns of a row beneath the root, like processRow does, 
+        but without handling synonymy of the row (see TreeNodeTool.getOrCreatePath) 
+        """
+        parent_id = self.getRootNode()['id']
+        for index in range(depth):
+            if row[headers[index]].strip() == '': continue
+            node = self.getOrCreateTreeNode(headers, row, parent_id, index, self.nodeFilters(headers, row, index))
+            if node is None:
+                raise Exception(f"Could not retrieve or create {headers[index]} {row[headers[index]]}")
+            parent_id = node.id
+        return parent_id
+
+    def rowKeys(self, row):
+        """
+        Taxa of genus rank and below that a row may create, by rank and full name: its own and, for synonyms, those of 
+        the accepted name, which are looked up on full name regardless of their parents (see getOrCreateParentNode). 
+        Rows sharing such a taxon are kept in the same shard (see shard_runner.py). 
+        """
+        genus_rank_id = self.getTreeDefItem('Genus')['rankid']
+        ranks = [item['name'] for item in self.TreeDefItems if item['rankid'] >= genus_rank_id]
+        taxon_headers = [header for header in self.extractTaxonHeaders(list(row)) if header in ranks]
+        keys = [('taxon', header, self.generateFullname(row, taxon_headers, index))
+                for index, header in enumerate(taxon_headers) if row.get(header, '').strip()]
+        if row.get('isAccepted') == 'No':
+            accepted_headers = [f'Accepted{rank}' for rank in ranks if row.get(f'Accepted{rank}', '').strip()]
+            keys += [('taxon', header.replace('Accepted', ''), self.generateFullname(row, accepted_headers, index))
+                     for index, header in enumerate(accepted_headers)]
+        return keys
 
     def createTreeNode(self, headers, row, parent_id, index):
         """
@@ -173,7 +251,7 @@ class ImportSynonymTool(TreeNodeTool):
                 taxon_node.is_hybrid = True
 
             # Double check if the taxon already exists
-            matching_taxa = self.sp.getSpecifyObjects(self.sptype, limit=1, filters={
+            matching_taxa = self.findTreeNodes({
                 'fullname': taxon_node.fullname,
                 'rankid': taxon_node.rank,
                 #'author': taxon_node.author, 
@@ -218,6 +296,7 @@ class ImportSynonymTool(TreeNodeTool):
                 # Create the taxon node in Specify7
                 jsonString = taxon_node.createJsonString()
                 sp7_taxon = self.sp.postSpecifyObject(self.sptype, jsonString)
+                self.indexTreeNode(sp7_taxon)
 
                 # if parent_is_synonym:
                 #     # If the parent was a synonym, we need to reinstate it as a synonym
@@ -379,7 +458,9 @@ class ImportSynonymTool(TreeNodeTool):
         """
         Get the grandparent ID for the accepted taxon.
         """
-        parent = self.sp.getSpecifyObject('taxon', parent_id)
+        parent = self.treeIndex.get(parent_id) if self.treeIndex is not None else None
+        if parent is None:
+            parent = self.sp.getSpecifyObject('taxon', parent_id)
         if parent and 'parent' in parent:
             grandparent_id = parent['parent'].split('/')[4]
             return grandparent_id
@@ -394,18 +475,18 @@ class ImportSynonymTool(TreeNodeTool):
         #parent_author = row.get(f'Accepted{parent_rank_name}Author', '').strip()
         parent_rank_id = self.getTreeDefItem(parent_rank_name)['rankid']
 
-        acc_parent = self.sp.getSpecifyObjects(
-            'taxon',
-            limit=1,
-            filters={
-                'fullname': parent_fullname,
-                'rankid': parent_rank_id,
-                'definition': self.tree_definition
-            }
-        )
-        if not acc_parent:
-            return self.createParentNode(row, parent_rank_name, grandparent_id)
-        return acc_parent[0]
+        def getOrCreate():
+            acc_parent = self.findTreeNodes({
+                    'fullname': parent_fullname,
+                    'rankid': parent_rank_id,
+                    'definition': self.tree_definition
+                })
+            if not acc_parent:
+                return self.createParentNode(row, parent_rank_name, grandparent_id)
+            return acc_parent[0]
+
+        # The parent is looked up regardless of its own parent, so concurrent callers are coalesced likewise
+        return self.singleFlight.do(self.nodeKey(None, parent_fullname, parent_rank_id), getOrCreate)
 
     def createParentNode(self, row, parent_rank_name, grandparent_id):
         """
@@ -439,6 +520,7 @@ class ImportSynonymTool(TreeNodeTool):
 
         jsonString = acc_parent_node.createJsonString()
         acc_parent = self.sp.postSpecifyObject('taxon', jsonString)
+        self.indexTreeNode(acc_parent)
         parent_id = acc_parent['id'] if acc_parent else grandparent_id
         parent_node = self.sp.getSpecifyObject('taxon', parent_id)
         return parent_node
@@ -480,14 +562,20 @@ class ImportSynonymTool(TreeNodeTool):
         }
         if accepted_node.author:
             filters['author'] = accepted_node.author
-        check_acc = self.sp.getSpecifyObjects(self.sptype, limit=1, filters=filters)
 
-        if check_acc:
-            accepted_node.id = check_acc[0]['id']
-            spec_acc = check_acc[0]
-        else:            
+        def getOrCreate():
+            check_acc = self.findTreeNodes(filters)
+            if check_acc:
+                return check_acc[0]
             jsonString = accepted_node.createJsonString()
             spec_acc = self.sp.postSpecifyObject(self.sptype, jsonString)
+            self.indexTreeNode(spec_acc)
+            return spec_acc
+
+        key = self.nodeKey(accepted_node.parent.id, accepted_node.fullname, acc_rank_id, accepted_node.author)
+        spec_acc = self.singleFlight.do(key, getOrCreate)
+        if spec_acc:
+            accepted_node.id = spec_acc['id']
         return spec_acc
     
     def getFamilyId(self, family_name):
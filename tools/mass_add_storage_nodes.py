@@ -31,6 +31,8 @@ class MassAddStorageNodeTool(TreeNodeTool):
     Tool for merging storage nodes upwards towards their nearest parent.
     """
 
+    planPaths = True
+
     def __init__(self, specifyInterface: specify_interface.SpecifyInterface) -> None:
         """
         CONSTRUCTOR
@@ -45,6 +45,7 @@ class MergeDuplicateTaxaTool(Sp7ApiTool):
         self.resultCount = -1    
         self.batchSize = 1000
         self.ambivalentCases = []
+        self.mergedIds = set()   # Primary keys of the taxa merged away, i.e. deleted 
         
         self.gbif = GBIF_interface.GBIFInterface()
         #self.dx = data_exporter.DataExporter()
@@ -67,16 +68,20 @@ class MergeDuplicateTaxaTool(Sp7ApiTool):
 
         #self.handleQualifiedTaxa()
 
+        self.resetMetrics()
         filename = args.get('filename')
         if filename: self.checkPrecollectedTaxa(filename)
         
         print()
         print('(Proceeding with general scan)')
 
-        self.scan()
-        print('Scan complete!')
-        
-        self.SaveAmbivalentCases()
+        try:
+            self.scan()
+            print('Scan complete!')
+            
+            self.SaveAmbivalentCases()
+        finally:
+            self.reportMetrics()
         
         print('----------------------------------')
 
@@ -97,15 +102,19 @@ class MergeDuplicateTaxaTool(Sp7ApiTool):
 
             if len(taxonIds) > 0:
                 print(f'Checking {len(taxonIds)} pre-collected taxa...')
-                for taxonId in taxonIds: 
-                    taxonId = int(taxonId)
-                    #print(f'Fetching taxon with id: {taxonId}')
-                    specifyTaxon = self.sp.getSpecifyObject('taxon', int(taxonId))
-                    if specifyTaxon:
-                        # If 
-                        self.handleSpecifyTaxon(specifyTaxon)
-                    else:
-                        print('#', end='') #[Could not retrieve taxon]   
+                taxonIds = [int(taxonId) for taxonId in taxonIds if taxonId.strip()]
+                for index in range(0, len(taxonIds), self.batchSize):
+                    batch = taxonIds[index:index + self.batchSize]
+                    # Fetch the batch of taxa in a few requests and keep it at hand, since merges invalidate the response cache 
+                    # NOTE Taxa merged away meanwhile are not handled 
+                    taxa = self.sp.getSpecifyObjectsByIds('taxon', batch)
+                    for taxonId in batch: 
+                        specifyTaxon = taxa.get(taxonId) if taxonId not in self.mergedIds else None
+                        if specifyTaxon:
+                            # If 
+                            self.handleSpecifyTaxon(specifyTaxon)
+                        else:
+                            print('#', end='') #[Could not retrieve taxon]   
             else:
                 print('No taxon ids found in the file...')
                 util.logger.info('No taxon ids found in the file...')
@@ -127,7 +136,7 @@ class MergeDuplicateTaxaTool(Sp7ApiTool):
         taxontreedefid = self.collection.discipline.taxontreedefid
 
         # Fetch taxon ranks from selected collection's discipline taxon tree 
-        taxonranks = self.sp.getSpecifyObjects('taxontreedefitem', 100, 0, {"treedef":str(taxontreedefid)})
+        taxonranks = self.sp.getTreeDefItems('taxon', taxontreedefid)
 
         taxonranks_reversed = taxonranks[::-1]  # Reverse the order of the ranks
 
@@ -141,32 +150,22 @@ class MergeDuplicateTaxaTool(Sp7ApiTool):
 
             # Only look at ranks below genera 
             if rankId >= 180:
-                offset = 0
-                resultCount = -1
-                while resultCount != 0:
-                    # Fetch batches from API
-                    util.logger.info(f'Fetching batch with offset: {offset}')
-                    batch = self.sp.getSpecifyObjects('taxon', self.batchSize, offset, {'definition':taxontreedefid, 'rankid':f'{rankId}'})
-                    resultCount = len(batch)
-
-                    util.logger.info(f' - Fetched {resultCount} taxa')
-
-                    # Iterate taxa in batch 
-                    for specifyTaxon in batch:
-                        try:
-                            t = taxon.Taxon(self.collection.id)
-                            t.fill(specifyTaxon)
-                            self.resolveAuthorName(t)
-                            self.handleSpecifyTaxon(specifyTaxon)
-                        except Exception as e:
-                            # Handle any exceptions that occur during the process  
-                            util.logger.error(f'Error handling taxon "{specifyTaxon.get("fullname", "<unknown>")}"...')
-                            util.logger.error(e)
-                            util.logger.error(traceback.format_exc())
-                            print('@', end='') # output token to indicate error 
-
-                    # Prepare for fetching next batch, by increasing offset with batchsize 
-                    offset += self.batchSize
+                # Iterate taxa of rank fetched in batches from API (next batch is prefetched in the background)
+                # NOTE Keyset paging keeps batches equally fast deep into the table and avoids skipping taxa when merges delete rows
+                taxa = self.sp.iterateSpecifyObjects('taxon', {'definition':taxontreedefid, 'rankid':f'{rankId}'}, 
+                                                     pageSize=self.batchSize, keyset=True)
+                for specifyTaxon in taxa:
+                    try:
+                        t = taxon.Taxon(self.collection.id)
+                        t.fill(specifyTaxon)
+                        self.resolveAuthorName(t)
+                        self.handleSpecifyTaxon(specifyTaxon)
+                    except Exception as e:
+                        # Handle any exceptions that occur during the process  
+                        util.logger.error(f'Error handling taxon "{specifyTaxon.get("fullname", "<unknown>")}"...')
+                        util.logger.error(e)
+                        util.logger.error(traceback.format_exc())
+                        print('@', end='') # output token to indicate error 
 
     def SaveAmbivalentCases(self):
         """
@@ -225,8 +224,8 @@ class MergeDuplicateTaxaTool(Sp7ApiTool):
             util.logger.info(f'Handling taxon {fullname} [{specifyTaxonId}] of rank {rankId}')
             
             # Look up taxa with matching fullname & rank
-            taxonLookup = self.sp.getSpecifyObjects('taxon', 100000, 0, 
-                {'definition':str(self.collection.discipline.taxontreedefid), 'rankid':f'{rankId}', 'fullname':f'{fullname}'}) #, 'parent':f'{original.parentid}'})
+            taxonLookup = list(self.sp.iterateSpecifyObjects('taxon',  
+                {'definition':str(self.collection.discipline.taxontreedefid), 'rankid':f'{rankId}', 'fullname':f'{fullname}'})) #, 'parent':f'{original.parentid}'})
             
             if original.fullname == 'Draba incana':
                 pass
@@ -362,9 +361,11 @@ class MergeDuplicateTaxaTool(Sp7ApiTool):
                 print('{', end='')
                 start = time.time()
                 response = self.sp.mergeTreeNodes(self.sptype, source.id, target.id)
-                if response.status_code == "404":
+                if response.status_code < 300:
+                    self.mergedIds.add(int(source.id))
+                elif response.status_code == 404:
                     util.logger.info(' - 404: Taxon already merged.')
-                elif response.status_code == "500":
+                elif response.status_code == 500:
                     util.logger.info(' - 500: Internal Server Error.')
                     print('@', end= '')
                 end = time.time()
@@ -13,6 +13,7 @@
 """
 
 import os
+import csv
 import time
 import traceback
 import datetime
@@ -32,6 +33,9 @@ class MergeTaxonPairsTool(Sp7ApiTool):
     Tool for merging duplicate taxa in Specify7.
     """
 
+    # Pairs are independent apart from shared taxa, which rowKeys takes care of 
+    concurrency = 8
+
     def __init__(self, args) -> None:
         """
         Initialize the tool with necessary arguments.
@@ -42,6 +46,7 @@ class MergeTaxonPairsTool(Sp7ApiTool):
         super().__init__(args)
         
         self.gbif = GBIF_interface.GBIFInterface()
+        self.existingTaxonIds = None
 
     def runTool(self, args):
         """
@@ -58,7 +63,28 @@ class MergeTaxonPairsTool(Sp7ApiTool):
         #self.printLegend()        
         #print('----------------------------------')
 
+        filename = args.get('filename')
+        if filename and os.path.isfile(f'data/{filename}'):
+            self.existingTaxonIds = self.fetchExistingTaxonIds(filename)
+
         super().runTool(args)
+
+    def fetchExistingTaxonIds(self, filename):
+        """
+        Check up front which of the taxa referenced in the data file exist, using batched lookups by id. 
+        This avoids issuing slow merge calls for pairs of which either taxon does not exist. 
+        CONTRACT 
+            filename (String) : name of the data file in the data folder
+            RETURNS set of taxon ids (Integer) found in Specify 
+        """
+        taxonIds = []
+        with open(f'data/{filename}', mode='r', encoding='utf-8') as file:
+            for row in csv.DictReader(file, delimiter=','):
+                taxonIds += [row.get(key) for key in ('from_id', 'to_id') if str(row.get(key)).isdigit()]
+        
+        existing = set(self.sp.getSpecifyObjectsByIds('taxon', taxonIds).keys())
+        print(f"Found {len(existing)} of {len(set(taxonIds))} taxa referenced in {filename}")
+        return existing
     
     def processRow(self, headers, row) -> None:
         """
@@ -67,13 +93,31 @@ class MergeTaxonPairsTool(Sp7ApiTool):
         from_id = row.get('from_id')
         to_id = row.get('to_id')    
         
-        print(f"[{from_id} -> {to_id}]", end='... ')
+        # Printed as a single line, as rows may be processed in parallel 
+        pair = f"[{from_id} -> {to_id}]... "
+
+        if self.existingTaxonIds is not None:
+            missing = [id for id in (from_id, to_id) if int(id) not in self.existingTaxonIds]
+            if missing:
+                print(f'{pair}[skipped: taxon {", ".join(missing)} not found]')
+                util.logger.info(f"Skipped merging {from_id} into {to_id}: taxon {', '.join(missing)} not found")
+                return
+
         start = time.time()
         res = self.sp.mergeTreeNodes("taxon", from_id, to_id)
         end = time.time()
         timeElapsed = end - start
-        print(f'[{res.status_code}]({timeElapsed:.2f}s)')
-        pass
+        print(f'{pair}[{res.status_code}]({timeElapsed:.2f}s)')
+
+        # The source taxon no longer exists after a successful merge 
+        if self.existingTaxonIds is not None and int(res.status_code) < 299:
+            self.existingTaxonIds.discard(int(from_id))
+
+    def rowKeys(self, row):
+        """
+        Pairs sharing a taxon, e.g. chained merges (A -> B, B -> C), are merged in order of the file 
+        """
+        return [row.get('from_id'), row.get('to_id')]
 
     def validateRow(self, row) -> bool:
         """
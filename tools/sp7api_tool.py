@@ -14,18 +14,29 @@
 
 import os
 import csv
+import datetime
+import threading
+import traceback
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
 
 # Internal Dependencies
 import global_settings as app
 import specify_interface
 import util
 import models.collection as coll
+from request_metrics import RequestMetrics
+from checkpoint_journal import CheckpointJournal
+from pipeline import Pipeline, Stage, SKIP
 
 class Sp7ApiTool:
     """
     Generic class for tools that interact with the Specify7 API 
     """
 
+    # Number of rows processed at the same time in parallel mode. Tools with independent rows declare more than one. 
+    concurrency = 1
+
     def __init__(self, specifyInterface: specify_interface.SpecifyInterface) -> None:
         """
         CONSTRUCTOR
@@ -36,28 +47,35 @@ class Sp7ApiTool:
         """
 
         self.sp = specifyInterface
+        self.parallel = False
+        self.failures = []
+        self.journal = None
 
         user_name = app.settings['userName']
         pass_word = app.settings['password']
         coll_id   = app.settings['collectionId']
 
-        self.collection = coll.Collection(coll_id, self.sp)
-        
-        # Log in to Specify API and get CSFR token 
-        token = self.sp.specifyLogin(user_name, pass_word, coll_id)
+        # Log in to Specify API and get CSFR token, unless the injected interface is logged in already 
+        token = self.sp.csrfToken if self.sp.loggedIn else self.sp.specifyLogin(user_name, pass_word, coll_id)
         if token == '': 
             msg = f"Could not log in with these credentials ({user_name}) to collection ({app.settings['collectionName']} : {coll_id})! "
             util.logger.error(msg)
             raise Exception(msg)
 
+        self.collection = coll.Collection(coll_id, self.sp)
+
     def runTool(self, args):
         """
         Execute the tool for operation. 
         CONTRACT 
             args (dict) : Must normally include the following items(s):  
                             1. 'filename': name of the data file (can be omitted depending on tool) 
+                          Optionally: 
+                            2. 'parallel': whether to process rows in parallel (default: 'parallelRows' setting)
         """
 
+        self.resetMetrics()
+
         filename = args.get('filename')
         if not filename:
             raise Exception("No filename provided in args.")
@@ -65,22 +83,351 @@ class Sp7ApiTool:
         if not os.path.isfile(f'data/{filename}'):
             raise Exception(f"File {filename} does not exist.")
 
+        self.parallel = args.get('parallel', app.settings.get('parallelRows', False))
+
         print(f"Processing file: {filename}")
-        self.handleDatafile(filename)
+        try:
+            self.handleDatafile(filename)
+        finally:
+            self.reportMetrics()
 
     def handleDatafile(self, filename):
         """
-        
+        Read the data file and handle its rows, if the headers are valid. 
+        With the 'checkpoint' setting, the rows completed are recorded in a journal (see checkpoint_journal.py), 
+        so that a run restarted on the same data file skips them. 
         """
 
         with open(f'data/{filename}', mode='r', encoding='utf-8') as file:
             csv_reader = csv.DictReader(file, delimiter=',') # TODO Specify delimiter for files 
             headers = csv_reader.fieldnames
             if self.validateHeaders(headers):
-                for row in csv_reader:
-                    if self.validateRow(row):
-                        self.processRow(headers, row)
+                self.failures = []
+                self.journal = self.openJournal(f'data/{filename}')
+                if self.journal is None:
+                    self.handleRows(headers, csv_reader)
+                    return
+                completed = False
+                try:
+                    self.handleRows(headers, self.journal.pending(csv_reader))
+                    completed = not self.failures
+                finally:
+                    self.journal.close(completed)
+                    self.journal = None
+
+    def openJournal(self, path):
+        """
+        Open the checkpoint journal of the tool for the data file, if the 'checkpoint' setting is on, 
+        and let the tool re-use the objects created by an earlier run (see rehydrate) 
+        CONTRACT 
+            path (String) : Path of the data file 
+            RETURNS the journal (CheckpointJournal) or None 
+        """
+        settings = app.settings.get('checkpoint')
+        if not settings: return None
+        settings = settings if isinstance(settings, dict) else {}
+        journal = CheckpointJournal(self.__class__.__name__, path, self.sp.baseURL, app.settings['collectionName'], 
+                                    settings.get('path'), settings.get('batchSize', 100))
+        if journal.resumed:
+            print(f"Resuming earlier run: skipping {len(journal.completed)} rows completed, re-using {len(journal.created)} objects created")
+            self.rehydrate(journal.created)
+        return journal
+
+    def rehydrate(self, created):
+        """
+        Re-use the objects created by an earlier run of the tool on the same data file, e.g. to look them up without API calls. 
+        By default not used. 
+        """
+        pass
+
+    def checkpoint(self, row):
+        """
+        Record a row as completed in the checkpoint journal, if used 
+        """
+        if self.journal is not None and hasattr(row, 'number'):
+            self.journal.complete(row.number)
+
+    def handleRows(self, headers, rows):
+        """
+        Process the valid rows one at a time, or in parallel mode on a pool of 'concurrency' worker threads, 
+        or with the 'pipeline' setting as a stream through the stages of a pipeline (see handleRowsPipelined). 
+        A row fails when processRow raises an exception. Processing rows one at a time, the exception stops the run, 
+        unless the 'skipFailedRows' setting or parallel mode is on; in parallel and pipeline mode, as well as with 
+        'skipFailedRows', a failing row does not stop the run and is not recorded as completed in the checkpoint journal. 
+        Failures are then summarized at the end (see reportFailures). 
+        CONTRACT 
+            headers (list) : Column names of the data file 
+            rows (iterable) : Rows as dictionaries of column name to value 
+            RETURNS list of the results of processRow for the valid rows, in order of the rows (None for failed rows)
+        """
+        if app.settings.get('pipeline'):
+            return self.handleRowsPipelined(headers, rows)
+
+        if not self.parallel or self.concurrency < 2:
+            results = []
+            if not (self.parallel or app.settings.get('skipFailedRows')):
+                for row in rows:
+                    if not self.validateRow(row): continue
+                    results.append(self.processRow(headers, row))
+                    self.checkpoint(row)
+                return results
+
+            failures = []
+            for number, row in enumerate(rows, start=1):
+                if not self.validateRow(row): continue
+                try:
+                    results.append(self.processRow(headers, row))
+                    self.checkpoint(row)
+                except Exception as e:
+                    number = getattr(row, 'number', number)
+                    util.logger.error(f'Row {number} failed: {e}')
+                    util.logger.debug(''.join(traceback.format_exception(e)))
+                    failures.append({'row': number, **row, 'error': str(e)})
+                    results.append(None)
+            self.reportFailures(failures, len(results))
+            return results
+
+        return self.handleRowsParallel(headers, rows)
+
+    def handleRowsParallel(self, headers, rows):
+        """
+        Process the valid rows on a pool of worker threads and collect the results in order of the rows. 
+        Rows sharing a key (see rowKeys) are processed one after the other in order of the file; a row following a 
+        failed row sharing one of its keys is not processed, but fails as well. At most twice as many rows as there are 
+        workers are read ahead of the oldest row not yet collected, so large data files are not held in memory. 
+        A failing row does not stop the run; failures are summarized at the end (see reportFailures). 
+        CONTRACT 
+            headers (list) : Column names of the data file 
+            rows (iterable) : Rows as dictionaries of column name to value 
+            RETURNS list of the results of processRow for the valid rows, in order of the rows (None for failed rows)
+        """
+        util.logger.info(f'Processing rows in parallel on {self.concurrency} workers')
+        self.sp.setPoolSize(self.concurrency)
+
+        results = []
+        failures = []
+        def collect(number, row, future):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                util.logger.error(f'Row {number} failed: {e}')
+                util.logger.debug(''.join(traceback.format_exception(e)))
+                failures.append({'row': number, **row, 'error': str(e)})
+                results.append(None)
+
+        pending = deque()
+        lastByKey = {}
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='sp7row') as pool:
+            for number, row in enumerate(rows, start=1):
+                if not self.validateRow(row): continue
+                number = getattr(row, 'number', number)
+                keys = self.rowKeys(row)
+                dependencies = list({id(lastByKey[key][1]): lastByKey[key] for key in keys if key in lastByKey}.values())
+                future = pool.submit(self.processRowAfter, dependencies, headers, row)
+                for key in keys:
+                    lastByKey[key] = (number, future)
+                pending.append((number, row, future))
+                while len(pending) >= 2 * self.concurrency:
+                    collect(*pending.popleft())
+            while pending:
+                collect(*pending.popleft())
+
+        self.reportFailures(failures, len(results))
+        return results
+
+    def handleRowsPipelined(self, headers, rows):
+        """
+        Stream the rows through the stages parse -> validate -> resolve -> write (see pipeline.py), connected by 
+        bounded queues, so that reading and preparing rows overlaps with writing them to Specify. 
+        The number of workers per stage and the queue size are set by the 'pipeline' setting, e.g. 
+        {"queueSize": 100, "workers": {"resolve": 4, "write": 8}}. Rows are written by as many writers as the tool's 
+        concurrency, unless fewer are set; tools whose rows depend on each other declare a concurrency of one and are 
+        written one row at a time. Rows sharing a key (see rowKeys) are written in order of the file; a row following 
+        a failed row sharing one of its keys is not written, but fails as well, also when the earlier row failed to be 
+        parsed, validated or resolved: such rows are carried on to the write stage with their error, to fail there in order. 
+        Rows found invalid (see validateRow) are left out, as in parallel mode. 
+        A failing row does not stop the run; failures are summarized at the end (see reportFailures). 
+        CONTRACT 
+            headers (list) : Column names of the data file 
+            rows (iterable) : Rows as dictionaries of column name to value 
+            RETURNS list of the results of writeRow for the valid rows, in order of the rows (None for failed rows)
+        """
+        settings = app.settings.get('pipeline')
+        settings = settings if isinstance(settings, dict) else {}
+        workers = settings.get('workers', {})
+        writers = max(1, min(int(workers.get('write', self.concurrency)), self.concurrency))
+        if writers > 1: self.sp.setPoolSize(writers)
+
+        lastByKey = {}
+        def order(item):
+            # Called in order of the rows: a row is written after the last row sharing one of its keys 
+            try:
+                keys = self.rowKeys(item.row)
+            except Exception as e:
+                item.error = item.error or e
+                keys = []
+            item.after = list({id(lastByKey[key]): lastByKey[key] for key in keys if key in lastByKey}.values())
+            for key in keys:
+                lastByKey[key] = item
+
+        def parse(row):
+            item = PipelineRow(row)
+            try:
+                item.row = self.parseRow(row)
+            except Exception as e:
+                item.error = e
+            return item
+
+        def validate(item):
+            if item.error is None:
+                try:
+                    if not self.validateRow(item.row): return SKIP
+                except Exception as e:
+                    item.error = e
+            return item
+
+        def resolve(item):
+            if item.error is None:
+                try:
+                    item.resolved = self.resolveRow(headers, item.row)
+                except Exception as e:
+                    item.error = e
+            return item
+
+        def write(item):
+            try:
+                if item.error is not None: raise item.error
+                for earlier in item.after: earlier.done.wait()
+                if any(earlier.failed for earlier in item.after):
+                    raise Exception("Skipped, since a row sharing objects with it failed")
+                result = self.writeRow(headers, item.row, item.resolved)
+                self.checkpoint(item.row)
+                return result
+            except Exception:
+                item.failed = True
+                raise
+            finally:
+                item.done.set()
+
+        pipeline = Pipeline([Stage('parse', parse, workers.get('parse', 1)), 
+                             Stage('validate', validate, workers.get('validate', 1)), 
+                             Stage('resolve', resolve, workers.get('resolve', 1)), 
+                             Stage('write', write, writers, ordered=True, before=order)], 
+                            settings.get('queueSize', 100), self.sp.metrics)
+        util.logger.info(f'Processing rows through {pipeline}')
+        results = pipeline.run(rows)
+        print(pipeline.report())
+
+        failures = []
+        for failure in pipeline.failures:
+            row = failure['item'].row if isinstance(failure['item'], PipelineRow) else failure['item']
+            failures.append({'row': getattr(row, 'number', failure['number']), **row, 'error': failure['error']})
+        written = dict(results)
+        failed = {failure['number'] for failure in pipeline.failures}
+        self.reportFailures(failures, len(written) + len(failures))
+        return [written.get(number) for number in sorted(set(written) | failed)]
+
+    def parseRow(self, row):
+        """
+        Prepare a row as read from the data file for validation, first stage of the pipeline (see handleRowsPipelined). 
+        By default the row as read. 
+        """
+        return row
+
+    def resolveRow(self, headers, row):
+        """
+        Work that can be done for a row ahead of writing it, e.g. CPU bound preparation or read-only lookups, 
+        stage of the pipeline before writing (see handleRowsPipelined). By default none. 
+        CONTRACT 
+            RETURNS what was resolved, passed on to writeRow 
+        """
+        return None
+
+    def writeRow(self, headers, row, resolved):
+        """
+        Write a row to Specify, last stage of the pipeline (see handleRowsPipelined). By default processed by processRow. 
+        """
+        return self.processRow(headers, row)
+
+    def processRowAfter(self, dependencies, headers, row):
+        """
+        Process row once the rows it depends on have been processed, unless one of them failed 
+        CONTRACT 
+            dependencies (list) : Tuples of row number and future of the rows sharing a key with the row 
+        """
+        wait([future for _, future in dependencies])
+        failed = sorted(number for number, future in dependencies if future.exception() is not None)
+        if failed:
+            raise Exception(f"Skipped, since row {', '.join(str(number) for number in failed)} sharing objects with it failed")
+        result = self.processRow(headers, row)
+        self.checkpoint(row)
+        return result
+
+    def rowKeys(self, row):
+        """
+        Keys of the objects affected by a row, e.g. primary keys. In parallel mode, rows sharing a key are not 
+        processed at the same time, but in order of the file. By default rows are independent. 
+        CONTRACT 
+            RETURNS list of keys 
+        """
+        return []
+
+    def reportFailures(self, failures, total):
+        """
+        Print a summary of the rows failed and save them with their errors to the output folder 
+        CONTRACT 
+            failures (list) : Failed rows as dictionaries including 'row' (row number) and 'error' 
+            total (Integer) : Number of rows processed 
+        """
+        self.failures += failures
+        print(f"{total - len(failures)} of {total} rows processed successfully, {len(failures)} failed")
+        if not failures: return
+
+        for failure in failures[:10]:
+            print(f"  Row {failure['row']}: {failure['error']}")
+        if len(failures) > 10:
+            print(f"  ... and {len(failures) - 10} more")
+
+        os.makedirs('output', exist_ok=True)
+        path = f'output/row_failures_{self.__class__.__name__}_{datetime.datetime.now().strftime("%Y%m%d%H%M%S")}.csv'
+        fields = list(dict.fromkeys(key for failure in failures for key in failure))
+        with open(path, 'w', newline='', encoding='utf-8') as file:
+            writer = csv.DictWriter(file, fieldnames=fields)
+            writer.writeheader()
+            writer.writerows(failures)
+        print(f"Failed rows saved to {path}")
     
+    def resetMetrics(self):
+        """
+        Discard the request metrics recorded before the run (login, startup and earlier runs in the same session), 
+        so that the report of the run covers its own requests and wall time only. 
+        """
+        self.sp.metrics.reset()
+        if hasattr(self, 'gbif'):
+            self.gbif.metrics.reset()
+
+    def reportMetrics(self):
+        """
+        Print the request metrics of the run per endpoint (count, latency percentiles, total time) 
+        and save them to the output folder. 
+        The metrics of further API interfaces used by the tool (e.g. GBIF) are included. 
+        CONTRACT 
+            RETURNS the combined request metrics (RequestMetrics)
+        """
+        metrics = RequestMetrics()
+        metrics.merge(self.sp.metrics)
+        if hasattr(self, 'gbif'):
+            metrics.merge(self.gbif.metrics)
+
+        print(metrics.report())
+
+        os.makedirs('output', exist_ok=True)
+        path = f'output/request_metrics_{self.__class__.__name__}_{datetime.datetime.now().strftime("%Y%m%d%H%M%S")}.csv'
+        metrics.save(path)
+        util.logger.info(f'Request metrics saved to {path}')
+
+        return metrics
+
     def processRow(self, headers, row) -> None:
         """
         Generic empty method for handling individual data file rows
@@ -107,6 +454,19 @@ class Sp7ApiTool:
         """
         return "Sp7ApiTool"
 
+class PipelineRow():
+    """
+    Row of the data file on its way through the pipeline, with what was resolved for it ahead of writing 
+    """
+
+    def __init__(self, row, resolved=None) -> None:
+        self.row = row
+        self.resolved = resolved
+        self.error = None               # Exception raised parsing or resolving the row, raised when it is written 
+        self.after = []                 # Rows (PipelineRow) to be written before this one 
+        self.done = threading.Event()   # Set once the row has been written or failed 
+        self.failed = False
+
 
 
 
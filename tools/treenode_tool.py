@@ -12,11 +12,20 @@
   PURPOSE: Methods for manipulating a given Specify tree through the Specify7 API 
 """
 
+import os
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+
 # Internal Dependencies 
 import specify_interface
 import global_settings as app
+import data_access
 from models.treenode import TreeNode
+from models.tree_index import TreeIndex, fold
+from models.path_trie import PathTrie
+from models.tree_plan import TreePlan
 from tools.sp7api_tool import Sp7ApiTool
+from single_flight import SingleFlight
 import util
 
 class TreeNodeTool(Sp7ApiTool):
@@ -24,6 +33,10 @@ class TreeNodeTool(Sp7ApiTool):
     Generic class for SP7 API tools that handle nodes in one of the Specify tree structures 
     """
 
+    # Whether the rows of the data file are planned as a trie of distinct node paths before writing (see handleRows). 
+    # Tools adding rows through addTreeNode declare this. 
+    planPaths = False
+
     def __init__(self, specifyInterface: specify_interface.SpecifyInterface) -> None:
         """
         CONSTRUCTOR
@@ -35,7 +48,27 @@ class TreeNodeTool(Sp7ApiTool):
         self.tree_definition = self.getTreeDefinition()
 
         self.getTreeDefItems()
-        pass
+
+        # Coordinates looking up or creating nodes, so that concurrent workers do not create the same node twice 
+        self.singleFlight = SingleFlight(self.sp.metrics)
+
+        # Optionally hold the whole tree in memory for looking up existing nodes without API calls 
+        self.treeIndex = None
+        if app.settings.get('treeIndex', False):
+            self.treeIndex = TreeIndex(self.sp, self.sptype, self.tree_definition).load()
+
+        # Optionally look up existing nodes in the local mirror kept up to date by mirror_sync.py 
+        self.mirror = None
+        if app.settings.get('mirrorLookups', False):
+            self.mirror = data_access.getDataAccess()
+            if self.mirror.getSyncState(self.sptype) is None:
+                raise Exception(f"The local mirror holds no {self.sptype} nodes yet; run mirror_sync.py before using 'mirrorLookups'")
+
+        self.planning = False
+        self.planPath = None
+
+        # Nodes created by an earlier run resumed from its checkpoint journal (see rehydrate) 
+        self.resumedNodes = None
 
     def runTool(self, args):
         """
@@ -43,10 +76,223 @@ class TreeNodeTool(Sp7ApiTool):
         CONTRACT 
             args (dict) : Must include the following item(s):
                             1. 'filename': name of the data file 
+                          Optionally, for tools planning their paths: 
+                            2. 'plan': only plan the data file and write the plan to the given path 
+                                       (or to the output folder if True) instead of writing to Specify 
+                            3. 'apply': path of a plan to apply instead of processing a data file 
         """
 
+        if (args.get('plan') or args.get('apply')) and not self.planPaths:
+            raise Exception(f"{self} does not support planning")
+
+        if args.get('apply'):
+            self.resetMetrics()
+            try:
+                self.applyPlan(TreePlan.read(args['apply']))
+            finally:
+                self.reportMetrics()
+            return
+
+        self.planning = bool(args.get('plan'))
+        if self.planning:
+            self.datafile = args.get('filename')
+            self.planPath = args['plan'] if isinstance(args['plan'], str) else \
+                f'output/plan_{self.__class__.__name__}_{datetime.datetime.now().strftime("%Y%m%d%H%M%S")}.jsonl'
+
         super().runTool(args)
 
+    def handleRows(self, headers, rows):
+        """
+        For tools planning their paths, collect the distinct node paths of all valid rows in a trie first and then 
+        resolve the trie breadth-first, looking up or creating every distinct node once instead of once per row. 
+        The nodes of a level only depend on the level above, so with the 'levelConcurrency' setting above one, 
+        each level is resolved on a pool of that many worker threads before proceeding to the next level. 
+        A node failing to resolve fails the rows beneath it; failures are summarized at the end (see reportFailures). 
+        In planning mode nothing is written; instead a plan of the nodes to create is written to file (see planTrie). 
+        Other tools handle their rows one by one (see Sp7ApiTool.handleRows). 
+        CONTRACT 
+            headers (list) : Column names of the data file 
+            rows (iterable) : Rows as dictionaries of column name to value 
+            RETURNS list of the primary keys of the last node of each valid row, in order of the rows (None for failed rows), 
+                    or the plan (TreePlan) in planning mode 
+        """
+        if not self.planPaths:
+            return super().handleRows(headers, rows)
+
+        trie = PathTrie()
+        rowsByNumber = {}
+        for number, row in enumerate(rows, start=1):
+            if not self.validateRow(row): continue
+            number = getattr(row, 'number', number)
+            trie.add(headers, row, number)
+            rowsByNumber[number] = row
+
+        if self.planning:
+            plan = self.planTrie(headers, trie, len(rowsByNumber))
+            os.makedirs(os.path.dirname(self.planPath) or '.', exist_ok=True)
+            plan.write(self.planPath)
+            print(plan)
+            print(f"Plan saved to {self.planPath}")
+            return plan
+
+        levels = trie.levels()
+        util.logger.info(f'Resolving {sum(len(level) for level in levels)} distinct nodes in {len(levels)} levels for {len(rowsByNumber)} rows')
+        self.mapLevels(levels, lambda node: self.resolvePathNode(headers, node))
+
+        results = []
+        failures = []
+        for number, leaf in trie.leaves.items():
+            if leaf.error is None:
+                results.append(leaf.id)
+                self.checkpoint(rowsByNumber[number])
+            else:
+                failures.append({'row': number, **rowsByNumber[number], 'error': leaf.error})
+                results.append(None)
+
+        self.reportFailures(failures, len(rowsByNumber))
+        return results
+
+    def mapLevels(self, levels, function):
+        """
+        Call the function for every item of every level, level by level from the top down. 
+        With the 'levelConcurrency' setting above one, the items of a level are handled on a pool of that many worker threads. 
+        """
+        workers = max(1, int(app.settings.get('levelConcurrency', 1)))
+        if workers > 1:
+            self.sp.setPoolSize(workers)
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='sp7level') as pool:
+                for level in levels:
+                    list(pool.map(function, level))
+        else:
+            for level in levels:
+                for item in level:
+                    function(item)
+
+    def planTrie(self, headers, trie, rowCount):
+        """
+        Plan the creation of the distinct nodes of a trie without writing anything: Every node whose parent exists is 
+        looked up (in the tree index or local mirror if used, otherwise through the API), while the nodes beneath a 
+        node to create are known to be missing and need no lookup. 
+        CONTRACT 
+            headers (list)     : Columns making up the hierarchy 
+            trie (PathTrie)    : Distinct node paths of the data file 
+            rowCount (Integer) : Number of valid rows of the data file 
+            RETURNS the plan (TreePlan) 
+        """
+        plan = TreePlan({'tool': self.__class__.__name__, 'sptype': self.sptype, 'treedef': self.tree_definition, 
+                         'datafile': getattr(self, 'datafile', None), 'rows': rowCount, 
+                         'planned': datetime.datetime.now().isoformat(timespec='seconds')})
+        levels = trie.levels()
+        util.logger.info(f'Planning {sum(len(level) for level in levels)} distinct nodes in {len(levels)} levels for {rowCount} rows')
+        for level in levels:
+            # Look up the nodes of a level at the same time and number their steps in order afterwards 
+            self.mapLevels([level], lambda node: self.planPathNode(headers, node))
+            for node in level:
+                plan.addStep(node.step)
+        return plan
+
+    def planPathNode(self, headers, node):
+        """
+        Plan a trie node as existing node or node to create, once its parent has been planned. 
+        The top node of a path is looked up and created like the parent in getParentId, the nodes below like in addChildNodes. 
+        """
+        parentStep = node.parent.step
+        step = {'action': 'exists', 'level': node.depth - 1, 'name': node.name, 'rows': node.rowNumbers}
+        if parentStep is None:
+            existing = self.findTreeNodes({'fullname': node.name, 'rankid': self.getRankId(headers[node.index])})
+            if existing:
+                step['id'] = existing[0]['id']
+            else:
+                root = self.getRootNode()
+                item = self.getTopLevelDefItem(root)
+                step.update(action='create', fullname=node.name, rankid=item['rankid'], definitionitem=item['id'], 
+                            parent=root['id'], parentStep=None)
+        else:
+            existing = self.getTreeNode(node.name, parentStep['id']) if parentStep['action'] == 'exists' else None
+            if existing:
+                step['id'] = existing.id
+            else:
+                rank = self.getTreeDefItem(headers[node.index])
+                name = node.row[headers[node.index]]
+                step.update(action='create', name=name, fullname=name, rankid=rank['rankid'], definitionitem=rank['id'],
+                            parent=parentStep.get('id'), parentStep=None if parentStep['action'] == 'exists' else parentStep['step'])
+        node.step = step
+
+    def applyPlan(self, plan):
+        """
+        Create the nodes of a plan level by level, the nodes of a level at the same time with the 'levelConcurrency' 
+        setting above one. The number of API requests is known and reported up front. A node failing to be created 
+        fails the nodes and rows beneath it; failures are summarized at the end (see reportFailures). 
+        Nodes to create under an existing node are looked up first, so that applying a plan again (e.g. after a partial 
+        failure) reuses the nodes created before instead of creating them twice. 
+        CONTRACT 
+            plan (TreePlan) : Plan made by planTrie, e.g. read from file 
+            RETURNS dictionary of step number to primary key of the node, for the steps that succeeded 
+        """
+        header = plan.header
+        if header.get('sptype') != self.sptype or str(header.get('treedef')) != str(self.tree_definition):
+            raise Exception(f"Plan was made for the {header.get('sptype')} tree {header.get('treedef')}, not {self.sptype} tree {self.tree_definition}")
+
+        print(f"Applying {plan}")
+        ids = {step['step']: step['id'] for step in plan.steps if step['action'] == 'exists'}
+        errors = {}
+        found = set() # Steps whose node exists already, e.g. created by an earlier application of the plan 
+
+        def applyStep(step):
+            parentStep = step.get('parentStep')
+            if parentStep in errors:
+                errors[step['step']] = errors[parentStep]
+                return
+            try:
+                parentId = step['parent'] if parentStep is None else ids[parentStep]
+                # Nodes under a node created by this application cannot exist yet, others may have been created since planning 
+                if parentStep is None or parentStep in found:
+                    existing = self.getTreeNode(step['name'], parentId)
+                    if existing:
+                        ids[step['step']] = existing.id
+                        found.add(step['step'])
+                        return
+                node = TreeNode(0, step['name'], step['fullname'], parentId, step['rankid'], step['definitionitem'], 
+                                self.tree_definition, self.sptype)
+                sp7_obj = self.sp.postSpecifyObject(self.sptype, node.createJsonString())
+                self.indexTreeNode(sp7_obj)
+                ids[step['step']] = sp7_obj['id']
+            except Exception as e:
+                util.logger.error(f'Creating {self.sptype} node "{step["name"]}" (step {step["step"]}) failed: {e}')
+                errors[step['step']] = str(e)
+
+        self.mapLevels(plan.levels(), applyStep)
+
+        # A row fails with the first failed step on its path 
+        failedRows = {}
+        for step in plan.steps:
+            if step['step'] in errors:
+                for number in step['rows']:
+                    failedRows.setdefault(number, {'row': number, 'step': step['step'], 'name': step['name'], 
+                                                   'error': errors[step['step']]})
+        self.reportFailures([failedRows[number] for number in sorted(failedRows)], header.get('rows', 0))
+        return ids
+
+    def resolvePathNode(self, headers, node):
+        """
+        Look up or create the tree node of a trie node, once its parent has been resolved. 
+        The top node of a path is resolved like the parent in addTreeNode, the nodes below like in addChildNodes. 
+        """
+        if node.parent.error is not None:
+            node.error = node.parent.error
+            return
+
+        try:
+            if node.parent.parent is None:
+                node.id = self.getOrCreateParentId(node.name, headers[node.index])
+                if node.id is None:
+                    raise Exception("Could not retrieve parent node!")
+            else:
+                node.id = self.getOrCreateTreeNode(headers, node.row, node.parent.id, node.index).id
+        except Exception as e:
+            util.logger.error(f'Resolving {self.sptype} node "{node.name}" failed: {e}')
+            node.error = str(e)
+
     def processRow(self, headers, row) -> None:
         """
         Generic empty method for handling individual data file rows
@@ -61,7 +307,7 @@ class TreeNodeTool(Sp7ApiTool):
         # Get parent of tree node 
         parent_rank = headers[0]
         parent_name = row[parent_rank]
-        parent_id = self.getParentId(parent_name, parent_rank)
+        parent_id = self.getOrCreateParentId(parent_name, parent_rank)
                 
         if parent_id is None: 
             raise Exception("Could not retrieve parent node!")        
@@ -69,7 +315,7 @@ class TreeNodeTool(Sp7ApiTool):
         # Start recursive addition of child nodes
         self.addChildNodes(headers, row, parent_id, 1)
 
-    def addChildNodes(self, headers, row, parent_id, index, filters) -> dict:
+    def addChildNodes(self, headers, row, parent_id, index, filters=None) -> dict:
         """
         Recursively add child nodes and return the last child node added.
         """
@@ -84,13 +330,8 @@ class TreeNodeTool(Sp7ApiTool):
         if child_name == '':
             return self.addChildNodes(headers, row, parent_id, index + 1)
 
-        # Attempt to retrieve the child node from Specify7
-        child_node = self.getTreeNode(child_name, parent_id, filters)
-
-        # If no corresponding child node is found, proceed to add new child node
-        if not child_node:
-            # Create a new node if none was found 
-            child_node = self.createTreeNode(headers, row, parent_id, index)
+        # Attempt to retrieve the child node from Specify7 and create a new node if none was found 
+        child_node = self.getOrCreateTreeNode(headers, row, parent_id, index, filters)
         
         # Recursive call for the next child node
         last_child_node = None
@@ -104,6 +345,67 @@ class TreeNodeTool(Sp7ApiTool):
         # Return the current child node if it's the last one added
         return child_node
     
+    def getOrCreatePath(self, headers, row, depth):
+        """
+        Retrieve or create the nodes of the first columns of a row only, without processing the row otherwise, 
+        e.g. to create the nodes shared by shards up front (see shard_runner.py). 
+        CONTRACT 
+            headers (list)  : Columns making up the hierarchy 
+            row (dict)      : Row as dictionary of column name to value 
+            depth (Integer) : Number of columns 
+            RETURNS primary key of the last node of the path 
+        """
+        parent_id = self.getOrCreateParentId(row[headers[0]], headers[0])
+        if parent_id is None:
+            raise Exception("Could not retrieve parent node!")
+        for index in range(1, depth):
+            if row[headers[index]].strip() == '': continue
+            parent_id = self.getOrCreateTreeNode(headers, row, parent_id, index).id
+        return parent_id
+
+    def getOrCreateTreeNode(self, headers, row, parent_id, index, filters=None):
+        """
+        Retrieve the child node for the given column of the row under the parent, or create it if it does not exist. 
+        Concurrent calls for the same node are coalesced (see single_flight.py): one caller looks up or creates the node, 
+        the others wait for its result. 
+        CONTRACT 
+            headers (list)      : Columns making up the hierarchy 
+            row (dict)          : Row as dictionary of column name to value 
+            parent_id (Integer) : Primary key of the parent node 
+            index (Integer)     : Index of the column of the node 
+            filters (dict)      : Further filters identifying the node, e.g. 'fullname', 'rankid', 'author' 
+            RETURNS tree node (TreeNode) or None if it could not be created 
+        """
+        child_name = row[headers[index]].strip()
+        filters = filters or {}
+        key = self.nodeKey(parent_id, filters.get('fullname', child_name), 
+                           filters.get('rankid', self.getRankId(headers[index])), filters.get('author'))
+
+        def getOrCreate():
+            child_node = self.getTreeNode(child_name, parent_id, filters)
+            if not child_node:
+                child_node = self.createTreeNode(headers, row, parent_id, index)
+            return child_node
+
+        return self.singleFlight.do(key, getOrCreate)
+
+    def getOrCreateParentId(self, parent_name, parent_rank):
+        """
+        Retrieve or create the top node of a row (see getParentId), coalescing concurrent calls for the same node 
+        """
+        key = self.nodeKey(None, parent_name, self.getRankId(parent_rank))
+        return self.singleFlight.do(key, self.getParentId, parent_name, parent_rank)
+
+    def nodeKey(self, parent_id, name, rank_id, author=None):
+        """
+        Key of a node for coalescing concurrent calls looking it up or creating it (see single_flight.py). 
+        Names are compared case-insensitively, like the tree index and the mirror look them up (see tree_index.fold). 
+        CONTRACT 
+            parent_id (Integer) : Primary key of the parent node, or None for nodes looked up regardless of their parent 
+            RETURNS key (tuple) 
+        """
+        return (self.sptype, None if parent_id is None else str(parent_id), fold(name), rank_id, author)
+
     def createTreeNode(self, headers, row, parent_id, index) -> dict:
         """
         Generic method for creating tree node 
@@ -120,24 +422,27 @@ class TreeNodeTool(Sp7ApiTool):
         # Post the taxon node to the API
         jsonString = node.createJsonString()
         sp7_obj = self.sp.postSpecifyObject(self.sptype, jsonString)
+        self.indexTreeNode(sp7_obj)
 
         # Assign the ID from the API response
         node.id = sp7_obj['id']
 
         return node
 
-    def getTreeNode(self, child_name, parent_id, filters={}) -> dict:
+    def getTreeNode(self, child_name, parent_id, filters=None) -> dict:
         """ 
         Attempt to fetch tree node instance from Specify7 based on name and parent id. 
         """
 
+        filters = dict(filters or {})
         filters.update({
             'name': child_name,
             'parent': parent_id, 
             'definition': self.tree_definition
         })
 
-        child_dict = self.sp.getSpecifyObjects(self.sptype, 1000, 0, filters)
+        # Only the first matching node is used, so there is no need to fetch more
+        child_dict = self.findTreeNodes(filters, 1, sort='id')
 
         child_nodes = []
         for child in child_dict:
@@ -156,27 +461,99 @@ class TreeNodeTool(Sp7ApiTool):
         """
         # Attempt to retrieve the parent node on name and rank id
         parent_rank_id = self.getRankId(parent_rank)
-        parent_nodes = self.sp.getSpecifyObjects(self.sptype, 1, 0, {'fullname' : parent_name, 'rankid' : parent_rank_id})
+        parent_nodes = self.findTreeNodes({'fullname' : parent_name, 'rankid' : parent_rank_id})
 
         if not parent_nodes:
             # Not found: Create new parent node at tree root 
-            root_parent = self.sp.getSpecifyObjects(self.sptype, 1, 0, {})[0]
-            parent_defitemid = str(root_parent['definitionitem']).split('/')[4]
-            next_child_defitem = self.sp.getSpecifyObjects(f'{self.sptype}treedefitem', 1, 0, 
-                                {'parent':parent_defitemid, 'treedef':self.tree_definition})[0]
+            root_parent = self.getRootNode()
+            next_child_defitem = self.getTopLevelDefItem(root_parent)
             new_parent = TreeNode(0,parent_name, parent_name, 
                                     root_parent['id'], 
-                                    root_parent['rankid'], 
+                                    next_child_defitem['rankid'], 
                                     next_child_defitem['id'], 
                                     self.tree_definition, 
                                     self.sptype)
              
             # Return newly created parent node 
-            return self.sp.postSpecifyObject(self.sptype, new_parent.createJsonString())['id'] 
+            sp7_obj = self.sp.postSpecifyObject(self.sptype, new_parent.createJsonString())
+            self.indexTreeNode(sp7_obj)
+            return sp7_obj['id'] 
         
         # Return retrieved parent node
         return parent_nodes[0]['id']
 
+    def findTreeNodes(self, filters, limit=1, sort=''):
+        """
+        Find the nodes of the tree matching the filters, from the tree index if used and able to answer the query, 
+        otherwise through the API. Nodes not found in the local mirror, if used, are looked up through the API as well, 
+        since the mirror may lag behind Specify. 
+        CONTRACT 
+            filters (dict)  : Filters as key, value pairs, e.g. {'name': 'Shelf 1', 'parent': 12} 
+            limit (Integer) : Maximum number of nodes to return 
+            sort (String)   : Field name to order by when querying the API (the index returns nodes in order of id) 
+            RETURNS list of nodes (dict) 
+        """
+        if self.treeIndex is not None and self.treeIndex.answers(filters):
+            return self.treeIndex.query(filters, limit)
+        if self.resumedNodes is not None and self.resumedNodes.answers(filters):
+            # Only nodes found are certain, others may have existed before the earlier run 
+            nodes = self.resumedNodes.query(filters, limit)
+            if nodes: return nodes
+        if self.mirror is not None and mirrorFilters(filters) is not None:
+            # Only nodes found are certain, others may have been created since the mirror was synchronized 
+            nodes = self.mirror.getObjects(self.sptype, {**mirrorFilters(filters), 'treedefid': int(self.tree_definition)}, limit)
+            if nodes: return nodes
+            nodes = self.sp.getSpecifyObjects(self.sptype, limit, 0, filters, sort=sort)
+            self.mirror.upsertObjects(self.sptype, nodes)
+            return nodes
+        return self.sp.getSpecifyObjects(self.sptype, limit, 0, filters, sort=sort)
+
+    def getRootNode(self):
+        """
+        Get the root node of the tree 
+        """
+        if self.treeIndex is not None and self.treeIndex.root() is not None:
+            return self.treeIndex.root()
+        if self.mirror is not None:
+            roots = self.mirror.getObjects(self.sptype, {'treedefid': int(self.tree_definition), 'parentid': None}, 1)
+            if roots: return roots[0]
+        return self.sp.getSpecifyObjects(self.sptype, 1, 0, {'definition': self.tree_definition})[0]
+
+    def getTopLevelDefItem(self, root_parent):
+        """
+        Get the tree definition item AKA node rank directly below the root, at which the top nodes of rows are created 
+        """
+        parent_defitemid = str(root_parent['definitionitem']).split('/')[4]
+        return [item for item in self.TreeDefItems 
+                if item['parent'] and item['parent'].split('/')[4] == parent_defitemid][0]
+
+    def indexTreeNode(self, sp7_obj):
+        """
+        Add a node created through the API to the tree index and local mirror, if used 
+        """
+        if self.treeIndex is not None and sp7_obj:
+            self.treeIndex.add(sp7_obj)
+        if self.mirror is not None and sp7_obj:
+            self.mirror.upsertObjects(self.sptype, [sp7_obj])
+        if self.journal is not None and sp7_obj:
+            self.journal.create(sp7_obj)
+
+    def openJournal(self, path):
+        """
+        Planning writes nothing to resume, so it is not journaled (see Sp7ApiTool.openJournal) 
+        """
+        return None if self.planning else super().openJournal(path)
+
+    def rehydrate(self, created):
+        """
+        Look up the nodes created by an earlier run resumed from its checkpoint journal without API calls, 
+        unless the tree index (holding them already) is used 
+        """
+        if self.treeIndex is not None or not created: return
+        self.resumedNodes = TreeIndex(self.sp, self.sptype, self.tree_definition)
+        for node in created:
+            self.resumedNodes.add(node)
+
     def validateRow(self, row) -> bool:
         """
         Unfinished method for evaluating whether row format is valid. 
@@ -207,17 +584,26 @@ class TreeNodeTool(Sp7ApiTool):
 
         return valid
 
+    def hierarchyHeaders(self, headers):
+        """
+        Get the headers of the columns making up the hierarchy of a row, from the top down. 
+        Used for splitting data files into shards that do not share tree nodes (see shard_runner.py). 
+        """
+        return list(headers)
+
     def getTreeDefinition(self):
         """
         Retrieve the tree definition for the tree type specified in self.sptype 
         """
         
         if self.sptype != 'storage':
-            collections = self.sp.getSpecifyObjects('collection', 1, 0, {'collectionname': app.settings['collectionName']})
-            if not collections: raise ValueError("No collections found with the specified name.")
-            collection = collections[0]
-            discipline = self.sp.getSpecifyObject('discipline', collection['discipline'].split('/')[4])   
-            treedef_id =  discipline[f'{self.sptype}treedef'].split('/')[4]
+            def fetchTreeDefinition():
+                collections = self.sp.getSpecifyObjects('collection', 1, 0, {'collectionname': app.settings['collectionName']})
+                if not collections: raise ValueError("No collections found with the specified name.")
+                collection = collections[0]
+                discipline = self.sp.getSpecifyObject('discipline', collection['discipline'].split('/')[4])   
+                return discipline[f'{self.sptype}treedef'].split('/')[4]
+            treedef_id = self.sp.getMetadata(f'{self.sptype}treedef', fetchTreeDefinition)
         else:  
             treedef_id = 1
 
@@ -225,10 +611,17 @@ class TreeNodeTool(Sp7ApiTool):
 
     def getTreeDefItems(self):
         """
-        
+        Retrieve the tree definition items AKA node ranks of the tree definition and index them by name and rank id 
         """
         
-        self.TreeDefItems = self.sp.getSpecifyObjects(f"{self.sptype}treedefitem", sort='rankid', filters={"treedef":self.tree_definition})
+        self.TreeDefItems = self.sp.getTreeDefItems(self.sptype, self.tree_definition)
+
+        # The first item of a given name or rank id takes precedence, as when searching the list 
+        self.treeDefItemsByName = {}
+        self.treeDefItemsByRankId = {}
+        for item in self.TreeDefItems:
+            self.treeDefItemsByName.setdefault(item['name'], item)
+            self.treeDefItemsByRankId.setdefault(item['rankid'], item)
 
     def getTreeDefItem(self, header):
         """
@@ -238,9 +631,9 @@ class TreeNodeTool(Sp7ApiTool):
         # Removed "Accepted" prefix if present
         if 'Accepted' in header: header = header.replace('Accepted', '').strip()
 
-        for item in self.TreeDefItems:
-            if item['name'] == header:
-                return item
+        item = self.treeDefItemsByName.get(header)
+        if item is not None:
+            return item
         
         #return None
         raise Exception(f"Tree Def Item '{header}' not found!")
@@ -249,10 +642,14 @@ class TreeNodeTool(Sp7ApiTool):
         """
         Get the rank ID for a given header by looking it up in self.TreeDefItems.
         """
-        for item in self.TreeDefItems:
-            if item['name'] == header:
-                return item['rankid']
-        return 0 
+        item = self.treeDefItemsByName.get(header)
+        return item['rankid'] if item is not None else 0 
+
+    def getTreeDefItemByRankId(self, rank_id):
+        """
+        Get the tree definition item AKA node rank for a given rank id, or None if the tree has no such rank 
+        """
+        return self.treeDefItemsByRankId.get(int(rank_id))
     
     def __str__(self) -> str:
         """
@@ -260,6 +657,17 @@ class TreeNodeTool(Sp7ApiTool):
         """
         return "TreeNodeTool"
 
+def mirrorFilters(filters):
+    """
+    Translate API filters of tree node lookups to the columns of the local mirror (see data_access.py), 
+    or None if the mirror cannot answer them 
+    """
+    columns = {'name': 'name', 'fullname': 'fullname', 'rankid': 'rankid', 'parent': 'parentid', 'author': 'author', 
+               'definition': 'treedefid'}
+    if any(key not in columns for key in filters):
+        return None
+    return {columns[key]: int(value) if key in ('rankid', 'parent', 'definition') else value for key, value in filters.items()}
+
 
 
 